@@ -0,0 +1,134 @@
+import numpy as np
+
+from simulation.batch import batch_dispersions, batch_dynamics_outputs
+from simulation.models.vehicle import build_vehicle, vehicle_inputs, vehicle_outputs, vehicle_states
+from simulation.models.mass import initial_fuel
+from simulation.models.propulsion import engine_states
+from simulation.models.actuators import actuator_states
+from analysis.trim import TrimCache, trim_state, trim_sweep
+
+def perturbations(x_eq, u_eq, eps=1e-6):
+    """
+    Central-difference perturbations of every state and input around a set of operating points.
+
+    Inputs:
+    x_eq: np.array
+        (n_points, n_states) operating point states
+    u_eq: np.array
+        (n_points, n_inputs) operating point inputs
+    eps: float
+        Relative step (scaled by max(1, |value|))
+
+    Returns:
+    tuple
+        X (n_points * 2(n_states + n_inputs), n_states), U (..., n_inputs), state steps, input steps
+    """
+    n_points, n = x_eq.shape
+    m = u_eq.shape[1]
+    hx = eps * np.maximum(1, np.abs(x_eq))
+    hu = eps * np.maximum(1, np.abs(u_eq))
+
+    # rows per point: +x_i, -x_i, +u_j, -u_j
+    dX = np.zeros((n_points, 2 * (n + m), n))
+    dU = np.zeros((n_points, 2 * (n + m), m))
+    i, j = np.arange(n), np.arange(m)
+    dX[:, i, i] = hx
+    dX[:, n + i, i] = -hx
+    dU[:, 2 * n + j, j] = hu
+    dU[:, 2 * n + m + j, j] = -hu
+
+    X = (x_eq[:, None, :] + dX).reshape(-1, n)
+    U = (u_eq[:, None, :] + dU).reshape(-1, m)
+    return X, U, hx, hu
+
+def linearize_batch(x_eq, u_eq, params, eps=1e-6):
+    """
+    State-space matrices of the vehicle at many operating points from one vectorized evaluation.
+
+    Every state and input of every point is perturbed in both directions and all perturbed
+    vehicles are evaluated together by batch_dynamics_outputs.
+
+    Returns:
+    tuple
+        A (n_points, n, n), B (n_points, n, m), C (n_points, p, n), D (n_points, p, m)
+    """
+    x_eq = np.atleast_2d(np.asarray(x_eq, dtype=float))
+    u_eq = np.atleast_2d(np.asarray(u_eq, dtype=float))
+    n_points, n = x_eq.shape
+    m = u_eq.shape[1]
+
+    X, U, hx, hu = perturbations(x_eq, u_eq, eps)
+    Xdot, Y = batch_dynamics_outputs(0, X, U, params, batch_dispersions(len(X), params))
+    Xdot = Xdot.reshape(n_points, 2 * (n + m), -1)
+    Y = Y.reshape(n_points, 2 * (n + m), -1)
+
+    def central(F, start, count, h):
+        # derivative of every output with respect to each perturbed variable, as (n_points, n_out, count)
+        difference = F[:, start:start + count] - F[:, start + count:start + 2 * count]
+        return np.swapaxes(difference / (2 * h[:, :, None]), 1, 2)
+
+    A = central(Xdot, 0, n, hx)
+    B = central(Xdot, 2 * n, m, hu)
+    C = central(Y, 0, n, hx)
+    D = central(Y, 2 * n, m, hu)
+    return A, B, C, D
+
+def linearize_envelope(airspeeds, altitudes, params=None, cache=None, eps=1e-6):
+    """
+    Trim and linearize the vehicle over an airspeed/altitude grid.
+
+    Inputs:
+    airspeeds, altitudes: array-like
+        Grid axes (m/s, m)
+    params: dict, optional
+        Vehicle parameters; defaults to configuration.parameters
+    cache: TrimCache, optional
+        Trim solutions are read from and stored in this cache
+
+    Returns:
+    dict
+        'airspeed', 'altitude', 'trim' (alpha, throttle, elevator), 'x_eq', 'u_eq' and the stacked
+        'A', 'B', 'C', 'D' matrices, one entry per grid point (altitude-major), plus signal labels
+    """
+    vehicle = build_vehicle(params, fused=True)
+    params = vehicle.params
+    cache = TrimCache() if cache is None else cache
+
+    trims = trim_sweep(vehicle, airspeeds, altitudes, cache).reshape(-1, 3)
+    altitude, airspeed = (grid.ravel() for grid in np.meshgrid(altitudes, airspeeds, indexing='ij'))
+
+    fuel = initial_fuel({}, params)
+    x_eq = np.array([trim_state(V, -h, alpha, throttle, vehicle.nstates, fuel, engine_states(1.0, params), actuator_states([elevator, 0], params))
+                     for V, h, (alpha, throttle, elevator) in zip(airspeed, altitude, trims)])
+    u_eq = np.column_stack((trims[:, 2], np.zeros(len(trims)), trims[:, 1])) # elevator, ailerons, throttle
+
+    A, B, C, D = linearize_batch(x_eq, u_eq, params, eps)
+    return {
+        'airspeed': airspeed, 'altitude': altitude, 'trim': trims, 'x_eq': x_eq, 'u_eq': u_eq,
+        'A': A, 'B': B, 'C': C, 'D': D,
+        'states': np.array(vehicle_states(params)), 'inputs': np.array(vehicle_inputs), 'outputs': np.array(vehicle_outputs),
+    }
+
+def save_linear_models(path, models, dtype=np.float64):
+    # Stacked matrices with the operating points and labels in a compressed .npz; the matrices keep
+    # full precision unless a smaller dtype (e.g. np.float32, for storage only) is asked for
+    arrays = {key: value.astype(dtype) if key in ('A', 'B', 'C', 'D') else value for key, value in models.items()}
+    np.savez_compressed(path, **arrays)
+
+def load_linear_models(path):
+    with np.load(path) as data:
+        return {key: data[key] for key in data.files}
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Trim and linearize the vehicle over a flight envelope")
+    parser.add_argument('output', help="output .npz file")
+    parser.add_argument('--airspeeds', type=float, nargs='+', default=[25, 30, 35, 40])
+    parser.add_argument('--altitudes', type=float, nargs='+', default=[0, 500, 1000])
+    parser.add_argument('--trim-cache', default=None, help="JSON file of cached trim solutions")
+    parser.add_argument('--float32', action='store_true', help="store the matrices in single precision (smaller, loses about 8 digits)")
+    args = parser.parse_args()
+
+    models = linearize_envelope(args.airspeeds, args.altitudes, cache=TrimCache(args.trim_cache))
+    save_linear_models(args.output, models, np.float32 if args.float32 else np.float64)
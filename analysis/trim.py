@@ -1,44 +1,235 @@
+import hashlib
+import inspect
+import json
+import os
+import warnings
 import numpy as np
-from scipy.optimize import fsolve
-from scipy.optimize import minimize
+from scipy.optimize import least_squares
+try:
+    import fcntl
+except ImportError: # not on Windows: cache files are then written without a lock
+    fcntl = None
 
-# TODO: make generic trim solver
+from simulation.models.environment import wind_NED
+from simulation.models.mass import initial_fuel
+from simulation.models.propulsion import engine_states
+from simulation.models.actuators import actuator_states
 
-def solve_trim(system, initial_condition):
+# Trim variables: alpha, throttle, elevator (ailerons are held at zero)
+trim_bounds = (
+    [np.radians(-2), 0, np.radians(-29)],
+    [np.radians(14), 1, np.radians(24)],
+)
+default_initial_guess = [np.radians(5), .7, np.radians(0)]
 
+def trim_state(V, z0, alpha, throttle, n_states, fuel=None, engine_scale=1.0, actuators=()):
+    # level flight (theta = alpha) at airspeed V, every engine state at the commanded throttle (then the fuel level and the actuator states)
+    # engine_scale is the engine state at full throttle (rotor speed of thrusters with rotor dynamics)
+    u = V*np.cos(alpha)
+    w = V*np.sin(alpha)
+    theta = alpha # assume level flight
+
+    # Calculate quaternion from pitch angle (theta)
+    q0 = np.cos(theta / 2)
+    q1 = 0  # No roll
+    q2 = np.sin(theta / 2)  # Pitch
+    q3 = 0  # No yaw
+
+    x = np.zeros(n_states)
+    x[:13] = [0, 0, z0, u, 0, w, q0, q1, q2, q3, 0, 0, 0]
+    end = n_states - len(actuators)
+    x[13:end - (fuel is not None)] = throttle * engine_scale
+    if fuel is not None:
+        x[end - 1] = fuel
+    x[end:] = actuators
+    return x
+
+def trim_residuals(system, initial_condition, vars):
+    # Accelerations that must vanish in trimmed level flight: udot, wdot, qdot
     V = initial_condition['airspeed']
     z0 = -initial_condition['altitude']
+    alpha, throttle, elevator = vars
+    ailerons = 0
+
+    x = trim_state(V, z0, alpha, throttle, system.nstates, initial_fuel(initial_condition, system.params), engine_states(1.0, system.params),
+                   actuator_states([elevator, ailerons], system.params))
+    xdot = system.dynamics(0, x, [elevator, ailerons, throttle], system.params)
+    return xdot[[3, 5, 11]]
+
+def trim_jacobian(residual, vars, f0=None, step=1e-6):
+    # Forward-difference Jacobian of the 3x3 trim residual (one dynamics evaluation per trim variable)
+    vars = np.asarray(vars, dtype=float)
+    f0 = residual(vars) if f0 is None else f0
+    J = np.empty((len(f0), len(vars)))
+    for i in range(len(vars)):
+        h = step * max(1, abs(vars[i]))
+        # step towards the interior so the perturbed point stays inside the bounds
+        if vars[i] + h > trim_bounds[1][i]:
+            h = -h
+        perturbed = vars.copy()
+        perturbed[i] += h
+        J[:, i] = (residual(perturbed) - f0) / h
+    return J
+
+def json_value(value):
+    # JSON form of a plain parameter value (numbers, strings, arrays and containers of them);
+    # TypeError for anything else (models, objects)
+    if isinstance(value, (str, bool)) or value is None:
+        return value
+    if isinstance(value, dict):
+        return {str(key): json_value(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [json_value(item) for item in value]
+    value = np.asarray(value)
+    if value.dtype.kind in 'biuf':
+        return value.astype(float).tolist()
+    if value.dtype.kind == 'U':
+        return value.tolist()
+    raise TypeError(f'{type(value).__name__} is not a plain parameter value')
+
+def config_hash(params):
+    # Hash of the configuration the trim solution depends on: every plain (JSON-serialisable)
+    # parameter, e.g. mass properties and the airframe geometry the aerodynamics model reads, plus
+    # the object-valued entries: thrusters, mass table, the wind at the trim time (steady wind, gusts
+    # and turbulence), landing gear and actuators. Callables (the aerodynamics model) are left to
+    # aero_model_hash, other objects are skipped
+    thrusters = [(thruster.name, np.asarray(thruster.position).tolist(), np.asarray(thruster.thrust_direction).tolist(), thruster.max_thrust,
+                  None if thruster.thrust_map is None else hashlib.sha256(thruster.thrust_map.lookup.dependent_vars.tobytes()).hexdigest(),
+                  thruster.max_speed, thruster.rotor_inertia, thruster.spin)
+                 for thruster in params.get('thrusters', [])]
+    mass_table = params.get('mass_table')
+    data = {
+        'mass_table': None if mass_table is None else hashlib.sha256(mass_table.values.tobytes()).hexdigest(),
+        'thrusters': thrusters,
+        'wind': np.asarray(wind_NED(0, params), dtype=float).tolist(),
+        'landing_gear': [(leg.name, np.asarray(leg.position, dtype=float).tolist(), leg.stiffness, leg.damping, leg.rolling_friction,
+                          leg.side_friction) for leg in params.get('landing_gear') or []],
+        'ground_altitude': float(params.get('ground_altitude', 0.0)),
+        'actuators': [(actuator.surface, actuator.natural_frequency, actuator.damping, np.asarray(actuator.position_limits, dtype=float).tolist(),
+                       actuator.rate_limit, actuator.backlash) for actuator in params.get('actuators') or []],
+    }
+    plain = {}
+    for name, value in params.items():
+        if name in data or name == 'environment' or callable(value):
+            continue
+        try:
+            plain[str(name)] = json_value(value)
+        except TypeError:
+            continue
+    data['params'] = plain
+    return hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()[:16]
+
+def aero_model_hash(params):
+    # Hash of a fitted model's content (its `fingerprint()`, e.g. a surrogate), else of the source of
+    # the aerodynamics model module (falls back to its qualified name)
+    model = params.get('aerodynamics_model')
+    if model is None:
+        return 'none'
+    model = inspect.unwrap(model) # e.g. an AerodynamicsMemo of the model
+    if callable(getattr(model, 'fingerprint', None)):
+        return model.fingerprint()[:16]
+    try:
+        source = inspect.getsource(inspect.getmodule(model))
+    except (OSError, TypeError):
+        source = f'{getattr(model, "__module__", "")}.{getattr(model, "__qualname__", repr(model))}'
+    return hashlib.sha256(source.encode()).hexdigest()[:16]
+
+class TrimCache:
+    """
+    Trim solutions keyed by (airspeed, altitude, configuration hash, aero model hash).
+
+    With a path, solutions persist in a JSON file and are shared between runs; without one the
+    cache only lives in memory.
+    """
+    def __init__(self, path=None):
+        self.path = path
+        self.solutions = {}
+        if path is not None and os.path.exists(path):
+            with open(path) as f:
+                self.solutions = json.load(f)
+
+    @staticmethod
+    def key(initial_condition, params):
+        fuel = f"|{initial_condition['fuel']:.6g}" if 'fuel' in initial_condition else ''
+        return f"{initial_condition['airspeed']:.6g}|{initial_condition['altitude']:.6g}{fuel}|{config_hash(params)}|{aero_model_hash(params)}"
+
+    def get(self, initial_condition, params):
+        solution = self.solutions.get(self.key(initial_condition, params))
+        return None if solution is None else np.array(solution)
+
+    def put(self, initial_condition, params, solution):
+        self.solutions[self.key(initial_condition, params)] = np.asarray(solution).tolist()
+        if self.path is not None:
+            # merge with entries written by other processes, then replace the file atomically; the
+            # lock file keeps processes sharing the cache (e.g. runner workers) from dropping each other's entries
+            with open(f'{self.path}.lock', 'w') as lock:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_EX)
+                if os.path.exists(self.path):
+                    with open(self.path) as f:
+                        self.solutions = {**json.load(f), **self.solutions}
+                tmp = f'{self.path}.{os.getpid()}.tmp'
+                with open(tmp, 'w') as f:
+                    json.dump(self.solutions, f)
+                os.replace(tmp, self.path)
+
+def solve_trim(system, initial_condition, initial_guess=None, cache=None, tol=1e-8):
+    """
+    Solve for level-flight trim (alpha, throttle, elevator) at the given airspeed and altitude.
+
+    The trim residuals (udot, wdot, qdot) are solved directly with a bounded least-squares
+    Newton-type method and finite-difference Jacobians.
+
+    Inputs:
+    system: vehicle system (interconnected or fused)
+    initial_condition: dict
+        'airspeed' (m/s) and 'altitude' (m)
+    initial_guess: array-like, optional
+        Warm start, e.g. the trim of a neighboring flight condition
+    cache: TrimCache, optional
+        Cached solutions are returned without solving; new solutions are stored
+
+    Returns:
+    np.array
+        alpha, throttle, elevator
+    """
+    if cache is not None:
+        solution = cache.get(initial_condition, system.params)
+        if solution is not None:
+            return solution
+
+    def residual(vars):
+        return trim_residuals(system, initial_condition, vars)
+
+    x0 = np.clip(default_initial_guess if initial_guess is None else initial_guess, *trim_bounds)
+    result = least_squares(residual, x0, jac=lambda vars: trim_jacobian(residual, vars),
+                           bounds=trim_bounds, method='trf', x_scale='jac', xtol=1e-12, ftol=1e-12, gtol=1e-12)
+
+    # evaluate quality of trim solution
+    if np.max(np.abs(result.fun)) > tol:
+        warnings.warn(f"Trim at {initial_condition} did not converge (max residual {np.max(np.abs(result.fun)):.3g})")
+
+    if cache is not None:
+        cache.put(initial_condition, system.params, result.x)
+    return result.x # alpha, throttle, elevator
+
+def trim_sweep(system, airspeeds, altitudes, cache=None):
+    """
+    Trim map over an airspeed/altitude envelope.
+
+    Points are visited in a serpentine order so every solve is warm-started from the
+    neighboring solved point.
 
-    def cost_function(vars):
-        alpha = vars[0]
-        throttle = vars[1]
-        elevator = vars[2]
-        ailerons = 0
-
-        u = V*np.cos(alpha)
-        w = V*np.sin(alpha)
-        theta = alpha # assume level flight
-
-        # Calculate quaternion from pitch angle (theta)
-        q0 = np.cos(theta / 2)
-        q1 = 0  # No roll
-        q2 = np.sin(theta / 2)  # Pitch
-        q3 = 0  # No yaw
-
-        x = np.array([0, 0, z0, u, 0, w, q0, q1, q2, q3, 0, 0, 0, throttle])
-        # x = np.array([0, 0, -1000, 100, 0, 5, 1, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, throttle])
-        xdot = system.dynamics(0, x, [elevator, ailerons, throttle], system.params)
-        
-        udot = xdot[3]
-        wdot = xdot[5]
-        qdot = xdot[11]
-
-        return udot**2 + wdot**2 + qdot**2
-    
-    bounds = [(np.radians(-2), np.radians(14)), # Bounds for alpha
-              (0, 1),  # Bounds for throttle
-              (np.radians(-29), np.radians(24))]  # Bounds for elevator
-    initial_guess = [np.radians(5), .7, np.radians(0)]
-    result = minimize(cost_function, initial_guess, method='L-BFGS-B', bounds=bounds, tol=1e-6)
-
-# TODO: evaluate quality of trim solution
+    Returns:
+    np.array
+        (len(altitudes), len(airspeeds), 3) alpha, throttle, elevator
+    """
+    trims = np.empty((len(altitudes), len(airspeeds), 3))
+    guess = None
+    for i, altitude in enumerate(altitudes):
+        columns = range(len(airspeeds)) if i % 2 == 0 else reversed(range(len(airspeeds)))
+        for j in columns:
+            initial_condition = {'airspeed': airspeeds[j], 'altitude': altitude}
+            guess = solve_trim(system, initial_condition, initial_guess=guess, cache=cache)
+            trims[i, j] = guess
+    return trims
@@ -0,0 +1,207 @@
+import json
+import platform
+import sys
+import timeit
+import numpy as np
+
+# Bump when the results layout changes
+RESULTS_VERSION = 1
+
+# Relative slowdown beyond which a benchmark counts as a regression
+default_threshold = 0.1
+
+# Benchmark scenario: the mission.py flight condition, a 20^3-point 4-column table and these batch sizes
+condition = {'airspeed': 30, 'altitude': 0}
+table_shape = (20, 20, 20)
+interpolation_batch = 10000
+batch_sizes = (1, 10, 100, 1000)
+
+def measure(function, repeat=5):
+    # best time per call (s) over `repeat` rounds, each round calling `function` for at least 0.2 s
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+def result(value, unit, higher_is_better):
+    return {'value': float(value), 'unit': unit, 'higher_is_better': higher_is_better}
+
+def trimmed_point(vehicle):
+    # state and inputs of the vehicle trimmed at the benchmark condition
+    from analysis.trim import solve_trim
+    from simulation.mission import trimmed_initial_state, vehicle_initial_state
+
+    trim_condition = solve_trim(vehicle, condition)
+    x = vehicle_initial_state(trimmed_initial_state(trim_condition, condition, 0.0), condition, [trim_condition[2], 0.0], vehicle.params)
+    return x, np.array([trim_condition[2], 0.0, trim_condition[1]])
+
+def bench_dynamics(repeat):
+    # right-hand side evaluations per second of both vehicle paths
+    from simulation.models.vehicle import build_vehicle
+
+    results = {}
+    for name, fused in (('interconnect', False), ('fused', True)):
+        vehicle = build_vehicle(fused=fused)
+        x, u = trimmed_point(vehicle)
+        seconds = measure(lambda: vehicle.dynamics(0, x, u), repeat)
+        results[f'dynamics_{name}'] = result(1 / seconds, 'evaluations/s', True)
+    return results
+
+def bench_mission(repeat):
+    # end-to-end time of the mission.py scenario (trim and 20 s of flight) with solve_ivp and with rk4
+    from simulation.mission import run_mission
+
+    return {
+        'mission_solve_ivp': result(measure(lambda: run_mission(), repeat), 's', False),
+        'mission_rk4': result(measure(lambda: run_mission(method='rk4'), repeat), 's', False),
+    }
+
+def bench_trim(repeat):
+    # latency of an uncached trim solution from the default initial guess
+    from analysis.trim import solve_trim
+    from simulation.models.vehicle import build_vehicle
+
+    vehicle = build_vehicle(fused=True)
+    return {'trim': result(measure(lambda: solve_trim(vehicle, condition), repeat), 's', False)}
+
+def bench_interpolation(repeat):
+    # cost of a single query and per point of a batch query on a smooth 3-D table
+    from utilities.interpolation import Interpolator
+
+    axes = [np.linspace(0, 1, n) for n in table_shape]
+    grid = np.stack(np.meshgrid(*axes, indexing='ij'), axis=-1)
+    values = np.stack([np.sin(grid.sum(axis=-1) * k) for k in range(1, 5)], axis=-1)
+    interpolator = Interpolator.from_grid(axes, values)
+    points = np.random.default_rng(0).random((interpolation_batch, len(table_shape)))
+    point = points[0]
+    return {
+        'interpolate_single': result(measure(lambda: interpolator.interpolate(point), repeat), 's/query', False),
+        'interpolate_batch': result(measure(lambda: interpolator.interpolate(points), repeat) / len(points), 's/point', False),
+    }
+
+def bench_batch(repeat):
+    # Monte Carlo throughput (vehicle RK4 steps per second) of 10 steps of a dispersed batch
+    from simulation import configuration
+    from simulation.batch import simulate_batch
+    from simulation.models.vehicle import build_vehicle
+
+    x, u = trimmed_point(build_vehicle(fused=True))
+    T = np.linspace(0, 1, 11)
+    results = {}
+    for n in batch_sizes:
+        rng = np.random.default_rng(0)
+        dispersions = {'mass': configuration.parameters['mass'] * (1 + 0.05 * rng.standard_normal(n))}
+        X0 = np.tile(x, (n, 1))
+        seconds = measure(lambda: simulate_batch(X0, T, u, dispersions=dispersions), repeat)
+        results[f'batch_{n}'] = result(n * (len(T) - 1) / seconds, 'vehicle steps/s', True)
+    return results
+
+benchmarks = {
+    'dynamics': bench_dynamics,
+    'mission': bench_mission,
+    'trim': bench_trim,
+    'interpolation': bench_interpolation,
+    'batch': bench_batch,
+}
+
+def run_benchmarks(names=None, repeat=5):
+    """
+    Run the benchmark suite.
+
+    Inputs:
+    names: list of str, optional
+        Benchmark groups to run (keys of `benchmarks`); all by default
+    repeat: int
+        Timing rounds of each benchmark; the best round is reported
+
+    Returns:
+    dict
+        'version', 'environment' (python, numpy, platform) and 'results': value, unit and
+        direction by benchmark name
+    """
+    results = {}
+    for name in benchmarks if names is None else names:
+        results.update(benchmarks[name](repeat))
+    return {
+        'version': RESULTS_VERSION,
+        'environment': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'processor': platform.processor() or platform.machine(),
+        },
+        'results': results,
+    }
+
+def compare(results, baseline, threshold=default_threshold, thresholds=None):
+    """
+    Compare results against a baseline run (both from run_benchmarks).
+
+    The slowdown of a benchmark is its time ratio to the baseline (the inverse ratio for
+    throughputs); it regresses when the slowdown exceeds 1 + threshold.
+
+    Inputs:
+    threshold: float
+        Allowed relative slowdown
+    thresholds: dict, optional
+        Allowed relative slowdown of individual benchmarks, by name
+
+    Returns:
+    dict
+        baseline, value, slowdown and regressed by name, for the benchmarks present in both runs
+    """
+    thresholds = {} if thresholds is None else thresholds
+    comparison = {}
+    for name, current in results['results'].items():
+        reference = baseline['results'].get(name)
+        if reference is None:
+            continue
+        ratio = current['value'] / reference['value']
+        slowdown = 1 / ratio if current['higher_is_better'] else ratio
+        comparison[name] = {
+            'baseline': reference['value'],
+            'value': current['value'],
+            'slowdown': slowdown,
+            'regressed': slowdown > 1 + thresholds.get(name, threshold),
+        }
+    return comparison
+
+def format_comparison(results, comparison):
+    # one line per benchmark: value, unit and the change from the baseline
+    lines = []
+    for name, current in results['results'].items():
+        line = f"{name:<24}{current['value']:>14.4g} {current['unit']:<16}"
+        if name in comparison:
+            row = comparison[name]
+            line += f"{(row['slowdown'] - 1) * 100:+7.1f}% vs baseline" + ('  REGRESSION' if row['regressed'] else '')
+        lines.append(line)
+    return '\n'.join(lines)
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run the performance benchmarks and compare them against a baseline")
+    parser.add_argument('names', nargs='*', help=f"benchmark groups: {', '.join(benchmarks)} (default: all)")
+    parser.add_argument('--repeat', type=int, default=5, help="timing rounds per benchmark")
+    parser.add_argument('--output', default=None, help="write the results (JSON) to this path")
+    parser.add_argument('--baseline', default=None, help="baseline results (JSON) to compare against")
+    parser.add_argument('--threshold', type=float, default=default_threshold, help="allowed relative slowdown")
+    parser.add_argument('--save-baseline', action='store_true', help="write the results to --baseline instead of comparing")
+    args = parser.parse_args()
+    unknown = set(args.names) - set(benchmarks)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    results = run_benchmarks(args.names or None, args.repeat)
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    comparison = {}
+    if args.baseline is not None and args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+    elif args.baseline is not None:
+        with open(args.baseline) as f:
+            comparison = compare(results, json.load(f), args.threshold)
+    print(format_comparison(results, comparison))
+    sys.exit(1 if any(row['regressed'] for row in comparison.values()) else 0)
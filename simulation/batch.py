@@ -0,0 +1,178 @@
+import numpy as np
+
+from . import configuration
+from .configuration import aero_controls
+from .models.rigid_body import rigid_body_batch
+from .models.aerodynamics import calc_aerodynamics_batch
+from .models.propulsion import calc_propulsion_batch
+from .models.gravity import gravity_body
+from .models.ground import ground_forces_moments
+from .models.airdata import air_data_dcm
+from .models.environment import wind_NED
+from .models.mass import check_fuel_flow, has_fuel, fuel_rate
+from .models.actuators import actuator_set, actuator_offset, actuator_dynamics, vehicle_surfaces
+from utilities.quaternion import quat_to_dcm, dcm_to_euler_zyx
+
+# Batched vehicles use the same state layout as the vehicle model, one row per vehicle:
+# X = (N, n_states) [x, y, z, u, v, w, q0, q1, q2, q3, p, q, r, engine states..., fuel, actuator states...]
+num_aero_controls = len(aero_controls)
+
+def batch_dispersions(n_vehicles, params, dispersions=None):
+    """
+    Expand parameter dispersions into per-vehicle arrays.
+
+    Inputs:
+    n_vehicles: int
+    params: dict
+        Nominal vehicle parameters
+    dispersions: dict, optional
+        'mass': (N,) vehicle mass
+        'inertia': (N, 3, 3) inertia matrix about the c.g.
+        'thrust_scale': (N,) multiplier on the maximum thrust of every thruster
+        'aero_scale': (N, 6) multiplier on the aerodynamic forces and moments
+
+    Returns:
+    dict
+        Per-vehicle mass, inertia, inertia_inv, thrust_scale and aero_scale. With a mass table the
+        mass properties follow each vehicle's fuel state instead, so mass and inertia are not dispersed.
+    """
+    dispersions = {} if dispersions is None else dispersions
+    check_fuel_flow(params)
+
+    thrust_scale = np.broadcast_to(dispersions.get('thrust_scale', 1.0), (n_vehicles,)).astype(float)
+    aero_scale = np.broadcast_to(dispersions.get('aero_scale', 1.0), (n_vehicles, 6)).astype(float)
+    dispersed = {
+        'thrust_scale': thrust_scale,
+        'aero_scale': aero_scale,
+    }
+    if not has_fuel(params):
+        mass = np.broadcast_to(dispersions.get('mass', params['mass']), (n_vehicles,)).astype(float)
+        inertia = np.broadcast_to(dispersions.get('inertia', params['inertia']), (n_vehicles, 3, 3)).astype(float)
+        dispersed.update({
+            'mass': mass,
+            'inertia': inertia,
+            'inertia_inv': np.linalg.inv(inertia), # inverted once for the whole run
+        })
+    return dispersed
+
+def batch_mass_properties(X, params, dispersed):
+    # per-vehicle mass, r_cg, inertia and inverse inertia: from the mass table at each fuel level, else the dispersed constants
+    if has_fuel(params):
+        return params['mass_table'](X[:, 13 + len(params['thrusters'])])
+    return dispersed['mass'], params['r_cg'], dispersed['inertia'], dispersed['inertia_inv']
+
+def batch_forces_moments(t, X, U, params, dispersed, dcm_body_to_NED, mass_props):
+    """
+    Air data and every force/moment source for N vehicles (mass_props from batch_mass_properties).
+
+    Returns:
+    tuple
+        air data (N, 5), aero (F, M), propulsion (F, M), gravity F, ground (F, M), engine state derivatives
+    """
+    surfaces = vehicle_surfaces(X, U[:, :num_aero_controls], params)
+    throttle = U[:, num_aero_controls:]
+
+    # the environment wind is shared, or (N, 3) with one turbulence sequence per vehicle
+    air_data = air_data_dcm(X[:, 3:6], wind_NED(t, params), dcm_body_to_NED, X[:, 2])
+    airspeed, alpha, beta, density = air_data[:, :4].T
+    F_aero, M_aero = calc_aerodynamics_batch(airspeed, alpha, beta, X[:, 10:13], density, surfaces, params)
+    F_aero = F_aero * dispersed['aero_scale'][:, :3]
+    M_aero = M_aero * dispersed['aero_scale'][:, 3:]
+
+    mass, r_cg, _, _ = mass_props
+    engines = X[:, 13:13 + len(params['thrusters'])]
+    engines_dot, F_prop, M_prop = calc_propulsion_batch(engines, throttle, airspeed, density, X[:, 10:13], params, dispersed['thrust_scale'], r_cg)
+    F_grav = gravity_body(dcm_body_to_NED, mass)
+    F_ground, M_ground = ground_forces_moments(X[:, :13], dcm_body_to_NED, r_cg, params)
+
+    return air_data, (F_aero, M_aero), (F_prop, M_prop), F_grav, (F_ground, M_ground), engines_dot
+
+def _batch_evaluate(t, X, U, params, dispersed, outputs):
+    dcm_body_to_NED = quat_to_dcm(X[:, 6:10]) # shared by air data, gravity, kinematics and Euler angles
+    mass_props = batch_mass_properties(X, params, dispersed)
+    air_data, (F_aero, M_aero), (F_prop, M_prop), F_grav, (F_ground, M_ground), engines_dot = batch_forces_moments(t, X, U, params, dispersed, dcm_body_to_NED, mass_props)
+
+    force = F_aero + F_prop + F_grav + F_ground
+    moment = M_aero + M_prop + M_ground
+    mass, _, inertia, inertia_inv = mass_props
+
+    Xdot = np.empty_like(X)
+    Xdot[:, :13] = rigid_body_batch(X[:, :13], force, moment, mass, inertia, inertia_inv, dcm_body_to_NED)
+    Xdot[:, 13:13 + engines_dot.shape[1]] = engines_dot
+    if has_fuel(params):
+        fuel = 13 + engines_dot.shape[1]
+        Xdot[:, fuel] = fuel_rate(X[:, fuel], U[:, num_aero_controls:], params)
+    actuators = actuator_set(params)
+    if actuators is not None:
+        offset = actuator_offset(params)
+        Xdot[:, offset:] = actuator_dynamics(X[:, offset:], U[:, actuators.surface_index], actuators)
+    if not outputs:
+        return Xdot, None
+
+    # same order as vehicle_outputs
+    euler = dcm_to_euler_zyx(dcm_body_to_NED)
+    Y = np.concatenate((X[:, :13], F_aero, M_aero, F_prop, M_prop, F_grav, F_ground, M_ground, force, moment, euler, air_data), axis=1)
+    return Xdot, Y
+
+def batch_dynamics(t, X, U, params, dispersed):
+    # State derivatives of N vehicles at once; U is (N, n_inputs), dispersed comes from batch_dispersions
+    return _batch_evaluate(t, X, U, params, dispersed, outputs=False)[0]
+
+def batch_dynamics_outputs(t, X, U, params, dispersed):
+    # State derivatives and outputs (N, len(vehicle_outputs)) from a single evaluation of the force models
+    return _batch_evaluate(t, X, U, params, dispersed, outputs=True)
+
+def iter_batch(X0, T, U, params=None, dispersions=None, substeps=1, chunk_size=100):
+    """
+    Integrate N vehicles together with a fixed-step RK4 scheme and stream the states.
+
+    Inputs:
+    X0: (N, n_states) np.array
+        Initial states
+    T: (n_times,) np.array
+        Output time points; each interval is split into `substeps` RK4 steps
+    U: np.array
+        Inputs held constant over each interval: (n_inputs,), (N, n_inputs) or (n_times, N, n_inputs)
+    params: dict, optional
+        Vehicle parameters, defaults to configuration.parameters
+    dispersions: dict, optional
+        see batch_dispersions
+
+    Yields:
+    tuple
+        time chunk (n,), state chunk (n, N, n_states)
+    """
+    params = configuration.parameters if params is None else params
+    X = np.array(X0, dtype=float)
+    T = np.asarray(T, dtype=float)
+    n_vehicles, n_states = X.shape
+    U = np.broadcast_to(np.asarray(U, dtype=float), (len(T), n_vehicles, np.shape(U)[-1]))
+    dispersed = batch_dispersions(n_vehicles, params, dispersions)
+
+    chunk = np.empty((min(chunk_size, len(T)), n_vehicles, n_states))
+    chunk[0] = X
+    start, filled = 0, 1
+
+    for k in range(len(T) - 1):
+        h = (T[k + 1] - T[k]) / substeps
+        t = T[k]
+        for _ in range(substeps):
+            k1 = batch_dynamics(t, X, U[k], params, dispersed)
+            k2 = batch_dynamics(t + h/2, X + h/2*k1, U[k], params, dispersed)
+            k3 = batch_dynamics(t + h/2, X + h/2*k2, U[k], params, dispersed)
+            k4 = batch_dynamics(t + h, X + h*k3, U[k], params, dispersed)
+            X = X + h/6*(k1 + 2*k2 + 2*k3 + k4)
+            t += h
+
+        if filled == len(chunk):
+            yield T[start:start + filled], chunk[:filled].copy()
+            start, filled = start + filled, 0
+        chunk[filled] = X
+        filled += 1
+
+    yield T[start:start + filled], chunk[:filled].copy()
+
+def simulate_batch(X0, T, U, params=None, dispersions=None, substeps=1, chunk_size=100):
+    # Integrate N vehicles together and return the time and the stacked (n_times, N, n_states) states
+    chunks = list(iter_batch(X0, T, U, params, dispersions, substeps, chunk_size))
+    return np.asarray(T, dtype=float), np.concatenate([states for _, states in chunks])
@@ -1,7 +1,6 @@
 import numpy as np
 import os, sys
 from contextlib import contextmanager
-from scipy.spatial.transform import Rotation as R
 
 @contextmanager
 def add_sys_path(path):
@@ -12,11 +11,8 @@ def add_sys_path(path):
     finally:
         sys.path = original_sys_path
 
-# Import aerodynamics model
-path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '.artifact'))
-with add_sys_path(path):
-    from aero_model import aerodynamics_model
-    from aero_model import configuration_data as parameters
+# The aerodynamics model lives outside the package and is only imported when parameters are first needed
+aero_model_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '.artifact'))
 
 aero_controls = ['elevator', 'ailerons']
 propulsion_controls = ['throttle']
@@ -30,7 +26,6 @@ r_cg = np.array([-48.8, 0, 0]) # center of gravity
 r_ref_propulsion = np.array([0, 0, 0])
 
 # Other mass properties
-density = 1.225
 mass = 12800
 Ixx = 118800
 Iyy = 5690
@@ -44,10 +39,49 @@ inertia_matrix = [
     [-Ixz, -Iyz, Izz]
 ]
 
-parameters.update({
-    'density': density,
-    'r_ref_propulsion': r_ref_propulsion,
-    'r_cg': r_cg,
-    'mass': mass,
-    'inertia': inertia_matrix,
-})
\ No newline at end of file
+# Fuel burned per second at full throttle (in the fuel-level units of the mass table, kg); must be
+# positive for the mass properties to follow the fuel burn
+fuel_flow = 0.5
+
+def load_aero_model(path=aero_model_path):
+    # Import the external aerodynamics model module (cached by the import system after the first call)
+    with add_sys_path(path):
+        import aero_model
+    return aero_model
+
+def default_parameters():
+    """
+    Build the vehicle parameters (the `config` of build_vehicle) from the external aerodynamics model.
+
+    Returns:
+    dict
+        Aerodynamics configuration data (including 'thrusters'), the aerodynamics model function
+        and the mass properties above. Air density comes from the atmosphere model at the
+        vehicle altitude. When the mass table (data/mass_table.csv) exists, mass, c.g. and
+        inertia follow a fuel state burned at `fuel_flow` instead of the constants; the table
+        is not shipped, so without it the constant mass properties are used.
+    """
+    from .models.mass import mass_data_path, MassTable
+
+    aero_model = load_aero_model()
+    params = dict(aero_model.configuration_data)
+    params.update({
+        'aerodynamics_model': aero_model.aerodynamics_model,
+        'r_ref_propulsion': r_ref_propulsion,
+        'r_cg': r_cg,
+        'mass': mass,
+        'inertia': inertia_matrix,
+    })
+    if os.path.exists(mass_data_path):
+        params['mass_table'] = MassTable()
+        params['fuel_flow'] = fuel_flow
+    return params
+
+def __getattr__(name):
+    # `parameters` and `aerodynamics_model` are resolved on first access so importing this module has no side effects
+    if name == 'parameters':
+        globals()['parameters'] = default_parameters()
+        return globals()['parameters']
+    if name == 'aerodynamics_model':
+        return load_aero_model().aerodynamics_model
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
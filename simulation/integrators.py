@@ -0,0 +1,428 @@
+import numpy as np
+
+from .telemetry import TelemetryWriter, Telemetry
+from .models.ground import contact_function
+from .models.actuators import limit_function
+from .jacobian import JacobianProvider, system_sparsity
+
+# Implicit solvers of scipy.integrate.solve_ivp by simulate() method name
+implicit_methods = {'radau': 'Radau', 'bdf': 'BDF'}
+
+# Dormand-Prince 5(4) tableau with the continuous extension used for dense output
+dp_c = np.array([0, 1/5, 3/10, 4/5, 8/9, 1])
+dp_a = [
+    np.array([]),
+    np.array([1/5]),
+    np.array([3/40, 9/40]),
+    np.array([44/45, -56/15, 32/9]),
+    np.array([19372/6561, -25360/2187, 64448/6561, -212/729]),
+    np.array([9017/3168, -355/33, 46732/5247, 49/176, -5103/18656]),
+]
+dp_b = np.array([35/384, 0, 500/1113, 125/192, -2187/6784, 11/84, 0])
+dp_e = np.array([-71/57600, 0, 71/16695, -71/1920, 17253/339200, -22/525, 1/40]) # 5th minus 4th order weights
+dp_p = np.array([
+    [1, -8048581381/2820520608, 8663915743/2820520608, -12715105075/11282082432],
+    [0, 0, 0, 0],
+    [0, 131558114200/32700410799, -68118460800/10900136933, 87487479700/32700410799],
+    [0, -1754552775/470086768, 14199869525/1410260304, -10690763975/1880347072],
+    [0, 127303824393/49829197408, -318862633887/49829197408, 701980252875/199316789632],
+    [0, -282668133/205662961, 2019193451/616988883, -1453857185/822651844],
+    [0, 40617522/29380423, -110615467/29380423, 69997945/29380423],
+])
+
+def rk4_step(f, t, x, u, h):
+    # One classical Runge-Kutta step with the input held constant
+    k1 = f(t, x, u)
+    k2 = f(t + h/2, x + h/2*k1, u)
+    k3 = f(t + h/2, x + h/2*k2, u)
+    k4 = f(t + h, x + h*k3, u)
+    return x + h/6*(k1 + 2*k2 + 2*k3 + k4)
+
+def rk45_step(f, t, x, u, h, K):
+    """
+    One Dormand-Prince step. K (7, n_states) holds the stage derivatives and must contain
+    f(t, x, u) in K[0] on entry (first same as last: K[6] is f at the new state on return).
+
+    Returns:
+    tuple
+        new state, error estimate
+    """
+    for i in range(1, 6):
+        K[i] = f(t + dp_c[i]*h, x + h*(dp_a[i] @ K[:i]), u)
+    x_new = x + h*(dp_b[:6] @ K[:6])
+    K[6] = f(t + h, x_new, u)
+    return x_new, h*(dp_e @ K)
+
+def rk45_dense(x, h, K, theta):
+    # State at t + theta*h (0 <= theta <= 1) within the last accepted step
+    powers = np.cumprod(np.full(4, theta))
+    return x + h*((dp_p @ powers) @ K)
+
+def hold_segments(U):
+    # (start, end) output indices of the runs where the zero-order-hold input does not change
+    changes = np.flatnonzero(np.any(U[:, 1:] != U[:, :-1], axis=0)) + 1
+    bounds = np.concatenate(([0], changes, [U.shape[1] - 1]))
+    return [(a, b) for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+
+def output_function(system, outputs=None):
+    """
+    Output function evaluating the selected outputs of a system.
+
+    The fused vehicle only computes the output blocks that contain a selected output; other
+    systems evaluate every output and keep the selection.
+
+    Returns:
+    tuple
+        output labels, function(t, x, u) -> np.array
+    """
+    from .models.fused import vehicle_models, fused_output_function
+
+    if outputs is None:
+        return system.output_labels, lambda t, x, u: system.output(t, x, u)
+    outputs = list(outputs)
+    models = vehicle_models(system)
+    if models is not None:
+        selected = fused_output_function(outputs, models)
+        return outputs, lambda t, x, u: selected(t, x, u, system.params)
+    index = [system.output_labels.index(name) for name in outputs]
+    return outputs, lambda t, x, u: system.output(t, x, u)[index]
+
+def simulate(system, T, X0, U=0., method='rk4', outputs=None, decimation=1, substeps=1, rtol=1e-6, atol=1e-8, max_step=np.inf,
+             telemetry=None, chunk_size=1024, contact=None, contact_max_step=np.inf, stats=None):
+    """
+    Simulate an input/output system on a time grid with a built-in Runge-Kutta integrator.
+
+    States and the selected outputs are written into preallocated arrays as the integration
+    advances. Inputs are held constant between the time points (zero-order hold).
+
+    Inputs:
+    system: ct.NonlinearIOSystem or ct.InterconnectedSystem
+    T: (n_times,) np.array
+        Time points (input samples)
+    X0: (n_states,) np.array
+    U: np.array
+        Inputs like ct.input_output_response: scalar, (n_inputs,) or (n_inputs, n_times)
+    method: str
+        'rk4': fixed step, `substeps` steps per time interval (constant cost per step)
+        'rk45': adaptive Dormand-Prince; steps span every interval of constant input and the
+        time points inside a step are filled from the dense output
+        'radau', 'bdf': scipy's implicit solvers for stiff systems (stiff gear, fast engines), with
+        a colored finite-difference Jacobian that is reused until it is invalidated (see jacobian)
+    outputs: list of str, optional
+        Output names to compute and record, defaults to every output of the system
+    decimation: int
+        Record every `decimation`-th time point only (T[::decimation])
+    telemetry: str, optional
+        Directory to stream the recorded points to in chunks of `chunk_size` (see
+        telemetry.TelemetryWriter) instead of keeping them in memory
+    contact: function, optional
+        contact(t, x) -> penetration of every contact point (positive in contact), e.g.
+        ground.contact_function; defaults to event_function of the system's parameters (landing
+        gear and actuator limits), if any. The adaptive methods end their steps exactly at every
+        touchdown and liftoff (and actuator limit); all methods limit the step to
+        `contact_max_step` only while a point is in contact
+    stats: dict, optional
+        Filled with the solver statistics: method, steps, rejected steps, contact events and
+        right-hand side evaluations (e.g. profiling.Profiler.solver); the implicit methods add the
+        Jacobians computed and reused and the LU decompositions
+
+    Returns:
+    ct.TimeResponseData or telemetry.Telemetry
+        recorded time, states, inputs and outputs (named by their labels)
+    """
+    import control as ct
+
+    T = np.asarray(T, dtype=float)
+    U = np.broadcast_to(np.asarray(U, dtype=float).reshape(system.ninputs, -1), (system.ninputs, len(T)))
+    output_labels, output = output_function(system, outputs)
+    if contact is None and isinstance(getattr(system, 'params', None), dict):
+        contact = event_function(system.params)
+
+    if method == 'rk4':
+        stepper = rk4_states(system.dynamics, T, U, X0, substeps, contact, contact_max_step, stats)
+    elif method == 'rk45':
+        stepper = rk45_states(system.dynamics, T, U, X0, rtol, atol, max_step, contact, contact_max_step, stats)
+    elif method in implicit_methods:
+        stepper = implicit_states(system.dynamics, T, U, X0, method, rtol, atol, max_step, contact, contact_max_step, stats,
+                                  system_sparsity(system))
+    else:
+        raise ValueError(f"Unknown integration method '{method}'")
+
+    if telemetry is not None:
+        signals = {'states': system.state_labels, 'inputs': system.input_labels, 'outputs': output_labels}
+        with TelemetryWriter(telemetry, signals, chunk_size=chunk_size) as writer:
+            for k, x in enumerate(stepper):
+                if k % decimation == 0:
+                    writer.append(T[k], x, U[:, k], output(T[k], x, U[:, k]))
+        return Telemetry(telemetry)
+
+    recorded = np.arange(0, len(T), decimation)
+    states = np.empty((system.nstates, len(recorded)))
+    y = np.empty((len(output_labels), len(recorded)))
+    for k, x in enumerate(stepper):
+        if k % decimation == 0:
+            states[:, k // decimation] = x
+            y[:, k // decimation] = output(T[k], x, U[:, k])
+
+    return ct.TimeResponseData(
+        T[recorded], y, states, np.array(U[:, recorded]), output_labels=output_labels, state_labels=system.state_labels,
+        input_labels=system.input_labels, sysname=system.name)
+
+def event_function(params):
+    """
+    Switching functions of a vehicle for the integrator events: the penetration of every contact
+    point of the landing gear (ground.contact_function), then the actuator limits
+    (actuators.limit_function). Only the contact points limit the step to contact_max_step.
+
+    Returns:
+    function or None
+        events(t, x) -> np.array, with `points` contact points first; None without gear or actuators
+    """
+    contact, limits = contact_function(params), limit_function(params)
+    if limits is None:
+        return contact
+    if contact is None:
+        events = limits
+        events.points = 0
+        return events
+
+    def events(t, x):
+        return np.concatenate((contact(t, x), limits(t, x)))
+    events.points = len(params['landing_gear'])
+    return events
+
+def in_contact(contact, values):
+    # whether a contact point is in contact (values of `contact` or their signs); only the first
+    # `contact.points` values are contact points when the function has that attribute
+    return np.any(np.asarray(values)[:getattr(contact, 'points', None)] > 0)
+
+def solver_stats(stats, method):
+    # reset the statistics of a run (a new dict when they are not requested)
+    stats = {} if stats is None else stats
+    stats.update({'method': method, 'steps': 0, 'rejected': 0, 'events': 0, 'evaluations': 0})
+    return stats
+
+def rk4_states(f, T, U, x0, substeps=1, contact=None, contact_max_step=np.inf, stats=None):
+    # State at every time point, with `substeps` fixed RK4 steps per interval (more while in contact)
+    stats = solver_stats(stats, 'rk4')
+    x = np.array(x0, dtype=float)
+    yield x
+    for k in range(len(T) - 1):
+        n = substeps
+        if contact is not None and in_contact(contact, contact(T[k], x)):
+            n = max(substeps, int(np.ceil((T[k + 1] - T[k]) / contact_max_step)))
+        h = (T[k + 1] - T[k]) / n
+        t = T[k]
+        for _ in range(n):
+            x = rk4_step(f, t, x, U[:, k], h)
+            t += h
+        stats['steps'] += n
+        stats['evaluations'] += 4*n
+        yield x
+
+def contact_signs(values):
+    # +1 for contact points in contact, -1 otherwise
+    return np.where(np.asarray(values) > 0, 1.0, -1.0)
+
+# Fraction of a step left between a step stopping at a contact event and the event; the event is
+# then crossed by an Euler step of twice that, so the next step starts in the new mode (the
+# right-hand side may jump there, e.g. gear damping at touchdown or an actuator reaching a limit)
+event_margin = 1e-6
+
+def cross_contact(f, t, x, u, dt, contact, signs, stats):
+    # Euler step across a contact event just ahead; the contact points that changed sign switch mode
+    x = x + dt*f(t, x, u)
+    changed = contact_signs(contact(t + dt, x)) != signs
+    signs[changed] = -signs[changed]
+    stats['evaluations'] += 1
+    stats['events'] += int(np.any(changed))
+    return t + dt, x
+
+def locate_contact(contact, x, h, K, t, signs, values):
+    """
+    Earliest sign change of the contact function within the last step, from its dense output.
+
+    Returns:
+    tuple
+        fraction of the step at the event (None without one), contact points changing mode there
+        (within event_margin of it)
+    """
+    from scipy.optimize import brentq
+
+    changed = np.flatnonzero(contact_signs(values) != signs)
+    if len(changed) == 0:
+        return None, changed
+    g = lambda theta, i: contact(t + theta*h, rk45_dense(x, h, K, theta))[i]
+
+    def root(g, i):
+        try:
+            return brentq(g, 0.0, 1.0, args=(i,), xtol=1e-12)
+        except ValueError:
+            # the change is within roundoff of the end of the step
+            return 1.0
+
+    # a point already on the new side at the start of the step changes mode there
+    roots = np.array([root(g, i) if contact_signs(g(0.0, i)) == signs[i] else 0.0 for i in changed])
+    theta = roots.min()
+    return theta, changed[roots <= theta + event_margin]
+
+def predict_contact(contact, x, h, k, t, signs):
+    # fraction of a step at which a contact function is first expected to change sign, extrapolated
+    # linearly from its value and rate (along the state derivative k) at the start; None well beyond the step
+    values = contact(t, x)
+    rates = (contact(t + 1e-6*h, x + 1e-6*h*k) - values) / (1e-6*h)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        theta = np.where(rates*signs < 0, -values / (rates*h), np.inf)
+    theta = theta.min() if len(theta) else np.inf
+    return theta if 0 < theta < 1.1 else None
+
+def rk45_states(f, T, U, x0, rtol, atol, max_step, contact=None, contact_max_step=np.inf, stats=None, carry=None):
+    # State at every time point from adaptive Dormand-Prince steps and their dense output;
+    # steps end at every contact event and are limited to contact_max_step while in contact.
+    # `carry` keeps the step size for a following run (e.g. the next interval of a closed loop)
+    stats = solver_stats(stats, 'rk45')
+    K = np.empty((7, len(x0)))
+    K_event = np.empty_like(K)
+    h = None if carry is None else carry.get('h')
+    x = np.array(x0, dtype=float)
+    signs = None if contact is None else contact_signs(contact(T[0], x))
+    yield x
+
+    for a, b in hold_segments(U):
+        u = U[:, a]
+        t, t_end = T[a], T[b]
+        K[0] = f(t, x, u)
+        stats['evaluations'] += 1
+        if h is None:
+            # initial step from the size of the state and its derivative
+            scale = atol + rtol*np.abs(x)
+            d0, d1 = np.linalg.norm(x/scale), np.linalg.norm(K[0]/scale)
+            h = 0.01*d0/d1 if min(d0, d1) > 1e-5 else 1e-6
+        k = a + 1 # next time point
+        targeted = False # the step was shortened to stop at a contact event after a rejection
+
+        while k <= b:
+            contacting = signs is not None and in_contact(contact, signs)
+            h = min(h, max_step, contact_max_step if contacting else np.inf, t_end - t)
+            x_new, error = rk45_step(f, t, x, u, h, K)
+            stats['evaluations'] += 6
+            scale = atol + rtol*np.maximum(np.abs(x), np.abs(x_new))
+            error_norm = np.sqrt(np.mean((error/scale)**2))
+            factor = 10 if error_norm == 0 else min(10, max(0.2, 0.9*error_norm**-0.2))
+            if error_norm > 1:
+                # a step across a contact event is retried up to just short of it, located from a sign
+                # change at its end or extrapolated from its start
+                stats['rejected'] += 1
+                event = None
+                if signs is not None and not targeted:
+                    located, _ = locate_contact(contact, x, h, K, t, signs, contact(t + h, x_new))
+                    event = min(filter(None, (located, predict_contact(contact, x, h, K[0], t, signs))), default=None)
+                targeted = event is not None and event > 2*event_margin
+                h *= event - event_margin if targeted else factor
+                continue
+            stats['steps'] += 1
+
+            # time points covered by this step come from the dense output
+            t_new = t_end if h == t_end - t else t + h
+            crossing = targeted
+            targeted = False
+            derivative = K[6]
+            if signs is not None:
+                event, changed = locate_contact(contact, x, h, K, t, signs, contact(t_new, x_new))
+                if event is not None and event <= 2*event_margin:
+                    # the contact points were already on the new side at the start of the step
+                    signs[changed] = -signs[changed]
+                    stats['events'] += 1
+                elif event is not None:
+                    # the step is repeated to end just short of the touchdown/liftoff (more accurate than the dense output)
+                    t_new = t + (event - event_margin)*h
+                    K_event[0] = K[0]
+                    x_new, _ = rk45_step(f, t, x, u, (event - event_margin)*h, K_event)
+                    stats['evaluations'] += 6
+                    derivative = K_event[6]
+                    crossing = True
+            while k <= b and T[k] <= t_new:
+                yield x_new if T[k] == t_new else rk45_dense(x, h, K, (T[k] - t)/h)
+                k += 1
+            t, x = t_new, x_new
+            K[0] = derivative
+            if crossing and t < t_end:
+                t, x = cross_contact(f, t, x, u, min(2*event_margin*h, t_end - t), contact, signs, stats)
+                K[0] = f(t, x, u)
+                stats['evaluations'] += 1
+                while k <= b and T[k] <= t:
+                    yield x
+                    k += 1
+            h *= min(1, factor) if crossing else factor
+
+    if carry is not None:
+        carry['h'] = h
+
+# Penetration (m) within which a contact point is on the ground plane at an event
+contact_tolerance = 1e-9
+
+def contact_events(contact, signs):
+    # terminal solve_ivp events of the contact points changing mode: liftoff of the points in contact, touchdown of the others
+    # an event fires contact_tolerance past the switch, so a point left on it does not fire again
+    def event(i):
+        g = lambda t, x: contact(t, x)[i] + signs[i]*contact_tolerance
+        g.terminal = True
+        g.direction = -signs[i]
+        return g
+    return [event(i) for i in range(len(signs))]
+
+def implicit_states(f, T, U, x0, method, rtol, atol, max_step, contact=None, contact_max_step=np.inf, stats=None, sparsity=None,
+                    carry=None):
+    # State at every time point from an implicit scipy solver, run over every interval of constant
+    # input and restarted at every contact event; the Jacobian provider carries over between runs
+    # (and to a following call with the same `carry`, with the step size)
+    from scipy.integrate import solve_ivp
+
+    stats = solver_stats(stats, method)
+    stats.update({'rejected': None, 'jacobians': 0, 'jacobians_reused': 0, 'decompositions': 0}) # scipy does not report rejected steps
+    x = np.array(x0, dtype=float)
+    signs = None if contact is None else contact_signs(contact(T[0], x))
+    u = U[:, 0]
+    carry = {} if carry is None else carry
+    provider = carry.setdefault('provider', JacobianProvider(None, sparsity))
+    provider.f = lambda t, x: f(t, x, u)
+    counts = provider.evaluations, provider.computed, provider.reused
+    h = carry.get('h')
+    yield x
+
+    for a, b in hold_segments(U):
+        u = U[:, a]
+        t, k = T[a], a + 1
+        while k <= b:
+            provider.restart()
+            contacting = signs is not None and in_contact(contact, signs)
+            events = None if signs is None else contact_events(contact, signs)
+            sol = solve_ivp(provider.rhs, (t, T[b]), x, method=implicit_methods[method], rtol=rtol, atol=atol,
+                            max_step=min(max_step, contact_max_step if contacting else np.inf), first_step=None if not h else min(h, T[b] - t),
+                            jac=provider, events=events, dense_output=True)
+            if sol.status < 0:
+                raise RuntimeError(f"{method} integration failed at t={sol.t[-1]}: {sol.message}")
+            stats['steps'] += len(sol.t) - 1
+            stats['decompositions'] += sol.nlu
+            if len(sol.t) > 1:
+                h = sol.t[-1] - sol.t[-2]
+
+            t_new, x = sol.t[-1], sol.y[:, -1]
+            while k <= b and T[k] <= t_new:
+                yield x if T[k] == t_new else sol.sol(T[k])
+                k += 1
+            t = t_new
+            if sol.status == 1:
+                # contact points changed mode: the points on the ground plane (several touch down
+                # together in a level landing) take the side they are moving to
+                values = contact(t, x)
+                rates = contact(t, x + 1e-6*f(t, x, u)) - values
+                signs = np.where(np.abs(values) > contact_tolerance, contact_signs(values), contact_signs(rates))
+                stats['events'] += 1
+                stats['evaluations'] += 1
+                provider.invalidate()
+
+    stats['evaluations'] += provider.evaluations - counts[0]
+    stats['jacobians'] += provider.computed - counts[1]
+    stats['jacobians_reused'] += provider.reused - counts[2]
+    carry['h'] = h
@@ -0,0 +1,169 @@
+import numpy as np
+
+from .models.mass import has_fuel
+from .models.actuators import actuator_set
+
+def vehicle_sparsity(params, n_states=None):
+    """
+    Structural nonzeros of the Jacobian of the vehicle dynamics with respect to its states.
+
+    Position rates depend on the velocity and the attitude only and the attitude rates on the
+    attitude and the body rates. The accelerations depend on every state but the horizontal
+    position (flat ground, wind uniform in space). Each engine state only follows its own lag and
+    the fuel level only itself. Each actuator depends on its own states only, and the forces and
+    moments only on the surface deflections among them.
+
+    Inputs:
+    params: dict
+        Vehicle parameters
+    n_states: int, optional
+        Defaults to the state count of the configuration
+
+    Returns:
+    np.array
+        (n_states, n_states) bool, True where d(xdot[i])/d(x[j]) can be nonzero
+    """
+    n_engines = len(params['thrusters'])
+    actuators = actuator_set(params)
+    n_actuator_states = 0 if actuators is None else actuators.n_states
+    n_states = 13 + n_engines + has_fuel(params) + n_actuator_states if n_states is None else n_states
+    offset = n_states - n_actuator_states
+    sparsity = np.zeros((n_states, n_states), dtype=bool)
+    sparsity[0:3, 3:10] = True # position kinematics: velocity, attitude
+    sparsity[3:6, 2:offset] = True # forces: altitude (density, ground), velocity, attitude, rates, engines, fuel
+    sparsity[6:10, 6:13] = True # attitude kinematics: attitude, rates
+    sparsity[10:13, 2:offset] = True # moments
+    engines = np.arange(13, 13 + n_engines)
+    sparsity[engines, engines] = True
+    sparsity[13 + n_engines:offset, 13 + n_engines:offset] = True # fuel
+    if actuators is not None:
+        # positions and surface states (the deflections) in the forces and moments; position, rate (and surface) of each actuator together
+        n = len(actuators.surfaces)
+        deflections = offset + np.concatenate((np.arange(n), 2 * n + np.arange(len(actuators.backlash))))
+        sparsity[3:6, deflections] = True
+        sparsity[10:13, deflections] = True
+        actuator = np.concatenate((np.arange(n), np.arange(n), actuators.backlash)) # actuator of every actuator state
+        sparsity[offset:, offset:] = actuator[:, None] == actuator[None, :]
+    return sparsity
+
+def color_columns(sparsity):
+    """
+    Group the columns of a sparsity pattern so the columns of a group share no row.
+
+    All columns of a group can be perturbed in one function evaluation (greedy coloring, densest
+    columns first). Columns without nonzeros are left out.
+
+    Returns:
+    list of np.array
+        Column indices of every group
+    """
+    sparsity = np.asarray(sparsity, dtype=bool)
+    groups, rows = [], []
+    for column in sorted(np.flatnonzero(sparsity.any(axis=0)), key=lambda j: -sparsity[:, j].sum()):
+        for group, used in zip(groups, rows):
+            if not np.any(used & sparsity[:, column]):
+                group.append(column)
+                used |= sparsity[:, column]
+                break
+        else:
+            groups.append([column])
+            rows.append(sparsity[:, column].copy())
+    return [np.array(sorted(group)) for group in groups]
+
+class JacobianProvider:
+    """
+    Finite-difference Jacobian of f(t, x) with a known sparsity pattern, for implicit integrators.
+
+    Columns that share no row are perturbed together (see color_columns), so a Jacobian costs one
+    evaluation per group plus the unperturbed point, which is shared with the last call of `rhs`
+    at the same point. The Jacobian handed out last is handed out again once after `restart()`
+    (a new integration run, e.g. after an input change) until `invalidate()` (e.g. a contact
+    event, where it jumps); integrators ask again whenever their Newton iteration stalls.
+
+    Inputs:
+    f: function
+        f(t, x) -> (n,) np.array
+    sparsity: (n, n) bool np.array, optional
+        Dense without one
+    step: float
+        Relative finite-difference step
+    """
+    def __init__(self, f, sparsity=None, step=np.sqrt(np.finfo(float).eps)):
+        self.f = f
+        self.sparsity = None if sparsity is None else np.asarray(sparsity, dtype=bool)
+        self.groups = None if sparsity is None else color_columns(self.sparsity)
+        self.step = step
+        self.jacobian = None
+        self.reuse = False
+        self.last = None
+        self.evaluations = 0 # of f, by rhs and by the Jacobian
+        self.computed = 0 # Jacobians computed
+        self.reused = 0 # Jacobians handed out again
+
+    def rhs(self, t, x):
+        # f(t, x), remembered for a Jacobian at the same point
+        value = self.f(t, x)
+        self.evaluations += 1
+        self.last = (t, np.array(x), value)
+        return value
+
+    def __call__(self, t, x):
+        if self.reuse and self.jacobian is not None:
+            self.reuse = False
+            self.reused += 1
+            return self.jacobian
+        self.reuse = False
+        self.jacobian = self.compute(t, x)
+        return self.jacobian
+
+    def compute(self, t, x):
+        x = np.asarray(x, dtype=float)
+        if self.last is not None and self.last[0] == t and np.array_equal(self.last[1], x):
+            f0 = self.last[2]
+        else:
+            f0 = self.rhs(t, x)
+        n = len(x)
+        if self.groups is None:
+            self.sparsity = np.ones((n, n), dtype=bool)
+            self.groups = color_columns(self.sparsity)
+
+        # steps of at least the relative step, towards positive values (exactly representable)
+        h = self.step * np.maximum(1.0, np.abs(x))
+        h = (x + h) - x
+        J = np.zeros((n, n))
+        for group in self.groups:
+            perturbed = x.copy()
+            perturbed[group] += h[group]
+            difference = self.f(t, perturbed) - f0
+            self.evaluations += 1
+            for j in group:
+                rows = self.sparsity[:, j]
+                J[rows, j] = difference[rows] / h[j]
+        self.computed += 1
+        return J
+
+    def restart(self):
+        # a new run: forget the last right-hand side value (the inputs may have changed) and offer the Jacobian again
+        self.last = None
+        self.reuse = self.jacobian is not None
+
+    def invalidate(self):
+        self.jacobian = None
+        self.reuse = False
+
+def system_sparsity(system):
+    # Jacobian sparsity of a vehicle system (None for other systems: dense)
+    params = getattr(system, 'params', None)
+    if not isinstance(params, dict) or 'thrusters' not in params:
+        return None
+    return vehicle_sparsity(params, system.nstates)
+
+def solve_ivp_options(system):
+    """
+    solve_ivp keyword arguments with the Jacobian sparsity of a vehicle, for scipy's stiff methods
+    through ct.input_output_response:
+
+        ct.input_output_response(vehicle, T, U, X0, solve_ivp_method='Radau', solve_ivp_kwargs=solve_ivp_options(vehicle))
+    """
+    sparsity = system_sparsity(system)
+    return {} if sparsity is None else {'jac_sparsity': sparsity}
@@ -1,235 +1,157 @@
+import warnings
 import numpy as np
-import control as ct
-import matplotlib.pyplot as plt  # Add this import
 
-from .models.vehicle import vehicle
-from .configuration import parameters, propulsion_controls, aero_controls
+from .configuration import propulsion_controls
+from .models.vehicle import build_vehicle
+from .models.mass import initial_fuel
+from .models.propulsion import engine_states
+from .models.actuators import actuator_states
+from .integrators import simulate
 from analysis.trim import solve_trim
 
 # Simulation parameters
 time = 20
-dt = 0.1  
-
-vehicle.params = parameters
+dt = 0.1
+fused = True # evaluate the vehicle as one fused function instead of the interconnect graph
 
 initial_condition = {
     'altitude': 0,
     'airspeed': 30,
 }
 
-trim_condition = solve_trim(vehicle, initial_condition)
-
-trim_alpha = trim_condition[0]
-trim_throttle = trim_condition[1]
-trim_elevator = trim_condition[2]
-
-V = initial_condition['airspeed']
-alpha = trim_alpha + .01
-elevator = trim_elevator
-ailerons = 0
-throttle = trim_throttle
-
-u = V*np.cos(alpha)
-w = V*np.sin(alpha)
-
-theta = alpha
-
-q0 = np.cos(theta / 2)
-q1 = 0  # No roll
-q2 = np.sin(theta / 2)  # Pitch
-q3 = 0  # No yaw
-
-initial_state = {
-    'x': 0.0,
-    'y': 0.0, 
-    'z': 0,
-    'u': u,
-    'v': 0.0,
-    'w': w,
-    'q0': q0,
-    'q1': q1,
-    'q2': q2,
-    'q3': q3,
-    'p': 0.0,
-    'q': 0.0,
-    'r': 0.0,
-    'throttle': throttle
-}
-
-x0 = np.array([initial_state[key] for key in [
-    'x', 'y', 'z', 'u', 'v', 'w', 'q0', 'q1', 'q2', 'q3', 'p', 'q', 'r'] + propulsion_controls])
-
-time_range = np.arange(0, time + dt, dt)
-
-inputs = np.tile(np.array([elevator, ailerons, throttle]), (len(time_range), 1)).T
-
-timeseries = ct.input_output_response(vehicle, T=time_range, X0=x0, U=inputs)
-
-u = timeseries.inputs
-y = timeseries.outputs
-x = timeseries.states
-t = timeseries.time
-
-# Plot Air Data
-fig, ax1 = plt.subplots()
-line1, = ax1.plot(t, y[vehicle.find_output('airspeed')], label='airspeed')
-ax2 = ax1.twinx()
-line2, = ax2.plot(t, np.degrees(y[vehicle.find_output('alpha')]), label='alpha', color='red')
-line3, = ax2.plot(t, np.degrees(y[vehicle.find_output('beta')]), label='beta')
-ax1.set_xlabel('Time (s)')
-ax1.set_ylabel('m/s')
-ax2.set_ylabel('degrees')
-plt.title('Air Data')
-lines = [line1, line2, line3]
-labels = [line.get_label() for line in lines]
-ax1.legend(lines, labels)
-
-# Plot 3D Vehicle Position
-fig = plt.figure(figsize=(10, 8))
-ax = fig.add_subplot(111, projection='3d')
-
-x_pos = y[vehicle.find_output('x')]
-y_pos = y[vehicle.find_output('y')]
-altitude = -y[vehicle.find_output('z')]
-
-ax.plot(x_pos, y_pos, altitude)
-ax.set_xlabel('X Position (m)')
-ax.set_ylabel('Y Position (m)')
-ax.set_zlabel('Altitude (m)')
-ax.set_title('3D Vehicle Position')
-
-# Add a colorbar to show time progression
-scatter = ax.scatter(x_pos, y_pos, altitude, c=t, cmap='viridis')
-cbar = fig.colorbar(scatter, ax=ax, label='Time (s)')
-
-# Plot Euler Angles
-fig, ax = plt.subplots()
-phi = np.degrees(y[vehicle.find_output('phi')])
-theta = np.degrees(y[vehicle.find_output('theta')])
-psi = np.degrees(y[vehicle.find_output('psi')])
-
-ax.plot(t, phi, label='Roll (φ)')
-ax.plot(t, theta, label='Pitch (θ)')
-ax.plot(t, psi, label='Yaw (ψ)')
-
-ax.set_xlabel('Time (s)')
-ax.set_ylabel('Angle (degrees)')
-ax.set_title('Euler Angles')
-ax.legend()
-plt.grid(True)
-
-# Plot Aerodynamic, Propulsion, and Gravity Forces
-fig, (ax1, ax2, ax3) = plt.subplots(3, 1, figsize=(10, 15), sharex=True)
-
-# Aerodynamic Forces
-Fx_aero = y[vehicle.find_output('Fx_aero')]
-Fy_aero = y[vehicle.find_output('Fy_aero')]
-Fz_aero = y[vehicle.find_output('Fz_aero')]
-
-ax1.plot(t, Fx_aero, label='Fx_aero')
-ax1.plot(t, Fy_aero, label='Fy_aero')
-ax1.plot(t, Fz_aero, label='Fz_aero')
-ax1.set_ylabel('Force (N)')
-ax1.set_title('Aerodynamic Forces')
-ax1.legend()
-ax1.grid(True)
-
-# Propulsion Forces
-Fx_prop = y[vehicle.find_output('Fx_prop')]
-Fy_prop = y[vehicle.find_output('Fy_prop')]
-Fz_prop = y[vehicle.find_output('Fz_prop')]
-
-ax2.plot(t, Fx_prop, label='Fx_prop')
-ax2.plot(t, Fy_prop, label='Fy_prop')
-ax2.plot(t, Fz_prop, label='Fz_prop')
-ax2.set_ylabel('Force (N)')
-ax2.set_title('Propulsion Forces')
-ax2.legend()
-ax2.grid(True)
-
-# Gravity Force
-Fx_grav = y[vehicle.find_output('Fx_grav')]
-Fy_grav = y[vehicle.find_output('Fy_grav')]
-Fz_grav = y[vehicle.find_output('Fz_grav')]
-# F_grav_norm = np.sqrt(Fx_grav**2 + Fy_grav**2 + Fz_grav**2)
-
-ax3.plot(t, Fx_grav, label='Fx_grav')
-ax3.plot(t, Fy_grav, label='Fy_grav')
-ax3.plot(t, Fz_grav, label='Fz_grav')
-ax3.set_xlabel('Time (s)')
-ax3.set_ylabel('Force (N)')
-ax3.set_title('Gravity Forces')
-ax3.legend()
-ax3.grid(True)
-
-# Plot Angular Rates
-fig, ax = plt.subplots(figsize=(10, 5))
-
-p = y[vehicle.find_output('p')]
-q = y[vehicle.find_output('q')]
-r = y[vehicle.find_output('r')]
-
-ax.plot(t, p, label='p (roll rate)')
-ax.plot(t, q, label='q (pitch rate)')
-ax.plot(t, r, label='r (yaw rate)')
-
-ax.set_xlabel('Time (s)')
-ax.set_ylabel('Angular Rate (rad/s)')
-ax.set_title('Angular Rates')
-ax.legend()
-ax.grid(True)
-
-# Plot Velocity Components
-fig, ax = plt.subplots(figsize=(10, 5))
-
-u = y[vehicle.find_output('u')]
-v = y[vehicle.find_output('v')]
-w = y[vehicle.find_output('w')]
-
-ax.plot(t, u, label='u (forward velocity)')
-ax.plot(t, v, label='v (lateral velocity)')
-ax.plot(t, w, label='w (vertical velocity)')
-
-ax.set_xlabel('Time (s)')
-ax.set_ylabel('Velocity (m/s)')
-ax.set_title('Velocity Components')
-ax.legend()
-ax.grid(True)
-
-# Plot Angle of Attack
-fig, ax = plt.subplots(figsize=(10, 5))
-
-w = y[vehicle.find_output('w')]
-u = y[vehicle.find_output('u')]
-
-alpha = np.arctan2(w, u)
-
-ax.plot(t, alpha, label='Angle of Attack')
-
-ax.set_xlabel('Time (s)')
-ax.set_ylabel('Angle (rad)')
-ax.set_title('Angle of Attack')
-ax.legend()
-ax.grid(True)
-
-# Plot Overall Forces
-fig, ax = plt.subplots(figsize=(10, 5))
-
-Fx = y[vehicle.find_output('Fx')]
-Fy = y[vehicle.find_output('Fy')]
-Fz = y[vehicle.find_output('Fz')]
-
-ax.plot(t, Fx, label='Fx')
-ax.plot(t, Fy, label='Fy')
-ax.plot(t, Fz, label='Fz')
-
-ax.set_xlabel('Time (s)')
-ax.set_ylabel('Force (N)')
-ax.set_title('Overall Forces')
-ax.legend()
-ax.grid(True)
-
-plt.tight_layout()
-plt.show()
-
-
+rigid_body_state_names = ['x', 'y', 'z', 'u', 'v', 'w', 'q0', 'q1', 'q2', 'q3', 'p', 'q', 'r']
+state_names = rigid_body_state_names + propulsion_controls
+
+def initial_state_vector(initial_state, params):
+    # rigid-body states followed by every engine state at the initial throttle
+    return np.concatenate(([initial_state[key] for key in rigid_body_state_names], engine_states(initial_state['throttle'], params)))
+
+def vehicle_initial_state(initial_state, initial_condition, surfaces, params):
+    """
+    Full state vector of a vehicle: rigid body and engines (initial_state_vector), the initial fuel
+    level (with a mass table) and the actuators holding the surfaces (with actuators).
+
+    Inputs:
+    initial_state: dict
+        State by name, e.g. from trimmed_initial_state
+    initial_condition: dict
+        Condition giving the fuel level (see mass.initial_fuel)
+    surfaces: (2,) array-like
+        Elevator and ailerons deflections held by the actuators
+    """
+    x0 = initial_state_vector(initial_state, params)
+    fuel = initial_fuel(initial_condition, params)
+    if fuel is not None:
+        x0 = np.append(x0, fuel)
+    return np.concatenate((x0, actuator_states(surfaces, params)))
+
+def trimmed_initial_state(trim_condition, initial_condition, alpha_offset=0.0):
+    # Level-flight state at the trim solution (alpha, throttle, elevator), with an optional angle of attack offset
+    trim_alpha, trim_throttle, trim_elevator = trim_condition
+
+    V = initial_condition['airspeed']
+    alpha = trim_alpha + alpha_offset
+
+    u = V*np.cos(alpha)
+    w = V*np.sin(alpha)
+
+    theta = alpha
+
+    q0 = np.cos(theta / 2)
+    q1 = 0  # No roll
+    q2 = np.sin(theta / 2)  # Pitch
+    q3 = 0  # No yaw
+
+    return {
+        'x': 0.0,
+        'y': 0.0,
+        'z': -initial_condition['altitude'],
+        'u': u,
+        'v': 0.0,
+        'w': w,
+        'q0': q0,
+        'q1': q1,
+        'q2': q2,
+        'q3': q3,
+        'p': 0.0,
+        'q': 0.0,
+        'r': 0.0,
+        'throttle': trim_throttle
+    }
+
+def run_mission(initial_condition=initial_condition, time=time, dt=dt, alpha_offset=.01, fused=fused, config=None, method=None,
+                outputs=None, decimation=1, telemetry=None, profile=None, aero_surrogate=None, tasks=None):
+    """
+    Trim the vehicle, perturb the angle of attack and simulate with the trimmed inputs held constant.
+
+    method: None integrates with ct.input_output_response (solve_ivp); 'rk4', 'rk45' or the stiff
+    'radau' and 'bdf' use simulation.integrators.simulate, which can also compute and record only the
+    selected `outputs` at every `decimation`-th time point, or stream them to a `telemetry`
+    directory (the result is then a telemetry.Telemetry reading it back lazily).
+    profile: a path to write a profiling report of the simulation to (see simulation.profiling).
+    aero_surrogate: a surrogate.AerodynamicsSurrogate (or the path of a saved one) evaluated instead
+    of the configuration's aerodynamics model.
+    tasks: discrete tasks (scheduler.DiscreteTask: sensors, controllers, ...) run in closed loop at
+    their own rates, starting from the trimmed inputs (with method 'rk4' unless another is given).
+
+    Returns:
+    ct.TimeResponseData
+        time, states, inputs and outputs (named by the vehicle signal labels)
+    """
+
+    if aero_surrogate is not None:
+        from .surrogate import surrogate_parameters
+        config = surrogate_parameters(aero_surrogate, config)
+
+    vehicle = build_vehicle(config, fused)
+    trim_condition = solve_trim(vehicle, initial_condition)
+    trim_alpha, trim_throttle, trim_elevator = trim_condition
+
+    elevator = trim_elevator
+    ailerons = 0
+    throttle = trim_throttle
+
+    initial_state = trimmed_initial_state(trim_condition, initial_condition, alpha_offset)
+    x0 = vehicle_initial_state(initial_state, initial_condition, [elevator, ailerons], vehicle.params)
+
+    time_range = np.arange(0, time + dt, dt)
+
+    inputs = np.tile(np.array([elevator, ailerons, throttle]), (len(time_range), 1)).T
+
+    if tasks is not None and (decimation != 1 or telemetry is not None):
+        raise ValueError("Decimation and telemetry are not supported in closed loop")
+    if method is None and tasks is None and (outputs is not None or decimation != 1 or telemetry is not None):
+        raise ValueError("Output selection, decimation and telemetry require a simulation.integrators method")
+    if profile is None:
+        return integrate(vehicle, time_range, x0, inputs, method, outputs, decimation, telemetry, tasks)
+
+    from .profiling import profile as profiled
+    with profiled(vehicle) as profiler:
+        result = integrate(vehicle, time_range, x0, inputs, method, outputs, decimation, telemetry, tasks, profiler.solver)
+    profiler.write(profile)
+    return result
+
+def integrate(vehicle, time_range, x0, inputs, method, outputs, decimation, telemetry, tasks=None, stats=None):
+    import control as ct
+    if tasks is not None:
+        from .scheduler import simulate_closed_loop
+        return simulate_closed_loop(vehicle, time_range, x0, tasks, U0=inputs[:, 0], method=method or 'rk4', outputs=outputs, stats=stats)
+    if method is not None:
+        return simulate(vehicle, time_range, x0, inputs, method=method, outputs=outputs, decimation=decimation, telemetry=telemetry, stats=stats)
+    if stats is not None:
+        warnings.warn("solve_ivp (method=None) reports no solver statistics: choose a simulation.integrators method to collect them")
+    return ct.input_output_response(vehicle, T=time_range, X0=x0, U=inputs)
+
+if __name__ == "__main__":
+    import argparse
+    from .plotting import plot_mission
+
+    parser = argparse.ArgumentParser(description="Trim, simulate and plot a mission")
+    parser.add_argument('--method', choices=['rk4', 'rk45', 'radau', 'bdf'], default=None, help="integrator of simulation.integrators (default: solve_ivp)")
+    parser.add_argument('--telemetry', default=None, help="directory to stream the results to (requires --method)")
+    parser.add_argument('--profile', default=None, help="write a profiling report (JSON, and .folded stacks) to this path")
+    parser.add_argument('--aero-surrogate', default=None, help="saved aerodynamics surrogate to simulate with (see simulation.surrogate)")
+    args = parser.parse_args()
+
+    timeseries = run_mission(method=args.method, telemetry=args.telemetry, profile=args.profile, aero_surrogate=args.aero_surrogate)
+    plot_mission(timeseries)
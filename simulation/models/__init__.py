@@ -0,0 +1,53 @@
+import sys
+import threading
+from collections import OrderedDict
+
+def lazy_subsystems(module_name, builders):
+    """
+    Module-level __getattr__ that builds python-control subsystems on first access.
+
+    Model modules only define functions and signal names at import; the nlsys/interconnect
+    objects (and python-control itself) are created when a subsystem is first used.
+    """
+    def __getattr__(name):
+        if name in builders:
+            subsystem = builders[name]()
+            setattr(sys.modules[module_name], name, subsystem)
+            return subsystem
+        raise AttributeError(f"module {module_name!r} has no attribute {name!r}")
+    return __getattr__
+
+class IdentityCache:
+    """
+    Bounded LRU cache of values built from an object (a configuration, a thruster list, ...),
+    keyed by the identity of the object.
+
+    Each entry keeps its object alive, so the id cannot be reused by another object while the
+    entry exists; beyond `maxsize` entries the least recently used is dropped. Objects must not
+    be mutated in place once their value is built (build a new one instead); `stamp`, a tuple of
+    objects compared by identity, rebuilds the value when one of them is replaced.
+    """
+    def __init__(self, maxsize=32):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, obj, build, key=(), stamp=()):
+        cache_key = (id(obj),) + tuple(key)
+        with self.lock:
+            entry = self.entries.get(cache_key)
+            if (entry is not None and entry[0] is obj and len(entry[1]) == len(stamp)
+                    and all(a is b for a, b in zip(entry[1], stamp))):
+                self.entries.move_to_end(cache_key)
+                return entry[2]
+        value = build(obj) # outside the lock: building a vehicle can take a while
+        with self.lock:
+            self.entries[cache_key] = (obj, tuple(stamp), value)
+            self.entries.move_to_end(cache_key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
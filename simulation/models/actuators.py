@@ -0,0 +1,235 @@
+import numpy as np
+
+from ..configuration import aero_controls
+from .mass import has_fuel
+from . import IdentityCache
+
+# Rate at which the rate state beyond the rate limit is pulled back to it (anti-windup), per rad/s of
+# the actuator natural frequency
+rate_tracking = 100.0
+
+# Rate at which a surface with backlash closes on the edge of the play it is pushed past, per rad/s
+# of the actuator natural frequency
+backlash_tracking = 10.0
+
+class Actuator:
+    """
+    Control surface actuator: second-order response of the actuator to its command, with position
+    and rate limits and optional backlash between the actuator and the surface.
+
+    Inputs:
+    surface: str
+        Control surface driven by the actuator (one of configuration.aero_controls)
+    natural_frequency: float
+        Natural frequency (rad/s)
+    damping: float
+        Damping ratio
+    position_limits: (2,) array-like
+        Lower and upper stops (rad); commands and surface deflections beyond them are clipped
+    rate_limit: float
+        Maximum actuator rate (rad/s)
+    backlash: float
+        Total free play between the actuator and the surface (rad); the surface only follows the
+        actuator once it has taken up the play on one side or the other
+    """
+    def __init__(self, surface, natural_frequency, damping=0.7, position_limits=(-np.inf, np.inf), rate_limit=np.inf, backlash=0.0):
+        if surface not in aero_controls:
+            raise ValueError(f"Unknown control surface '{surface}' (expected one of {aero_controls})")
+        self.surface = surface
+        self.natural_frequency = natural_frequency
+        self.damping = damping
+        self.position_limits = position_limits
+        self.rate_limit = rate_limit
+        self.backlash = backlash
+
+class ActuatorSet:
+    """
+    The actuators of a configuration compiled into arrays, evaluated together for one vehicle or a batch.
+
+    The actuator states are the positions of every actuator, their rates, then the surface states
+    of the actuators with backlash (the deflection of the others follows their position).
+    """
+    def __init__(self, actuators):
+        self.surfaces = [actuator.surface for actuator in actuators]
+        duplicates = {surface for surface in self.surfaces if self.surfaces.count(surface) > 1}
+        if duplicates:
+            raise ValueError(f"Several actuators drive {', '.join(sorted(duplicates))}")
+        self.surface_index = np.array([aero_controls.index(surface) for surface in self.surfaces], dtype=int)
+        frequency = np.array([actuator.natural_frequency for actuator in actuators], dtype=float)
+        damping = np.array([actuator.damping for actuator in actuators], dtype=float)
+        self.stiffness = frequency**2
+        self.damping = 2 * damping * frequency
+        limits = np.array([actuator.position_limits for actuator in actuators], dtype=float).reshape(-1, 2)
+        self.lower, self.upper = limits[:, 0], limits[:, 1]
+        self.rate_limit = np.array([actuator.rate_limit for actuator in actuators], dtype=float)
+        self.rate_tracking = rate_tracking * frequency
+
+        n = len(actuators)
+        gap = np.array([actuator.backlash for actuator in actuators], dtype=float)
+        self.backlash = np.flatnonzero(gap > 0)
+        self.half_gap = 0.5 * gap[self.backlash]
+        self.tracking = backlash_tracking * frequency[self.backlash]
+        self.n_states = 2 * n + len(self.backlash)
+
+        # actuators with finite limits, for the switching functions of limit_function
+        self.rate_limited = np.flatnonzero(np.isfinite(self.rate_limit))
+        self.lower_limited = np.flatnonzero(np.isfinite(self.lower))
+        self.upper_limited = np.flatnonzero(np.isfinite(self.upper))
+
+    def state_names(self):
+        return ([f'actuator[{surface}]' for surface in self.surfaces] + [f'actuator_rate[{surface}]' for surface in self.surfaces]
+                + [f'surface[{self.surfaces[i]}]' for i in self.backlash])
+
+# Compiled actuator sets, keyed by the identity of the actuator list (not to be mutated once used)
+_actuator_set_cache = IdentityCache()
+
+def actuator_set(params):
+    # compiled actuators of the configuration ('actuators', a list of Actuator), None without any
+    actuators = params.get('actuators')
+    if not actuators:
+        return None
+    return _actuator_set_cache.get(actuators, ActuatorSet)
+
+def actuator_offset(params):
+    # index of the first actuator state in the vehicle state (after the engines and the fuel level)
+    return 13 + len(params['thrusters']) + has_fuel(params)
+
+def actuator_state_names(params):
+    actuators = actuator_set(params)
+    return [] if actuators is None else actuators.state_names()
+
+def actuator_states(commands, params):
+    """
+    Steady actuator states holding a set of surface commands.
+
+    Inputs:
+    commands: (..., len(aero_controls)) array-like
+        Commands of every aero control
+
+    Returns:
+    np.array
+        (..., n_states) positions at the (clipped) commands, zero rates and the surfaces at the positions
+    """
+    actuators = actuator_set(params)
+    commands = np.asarray(commands, dtype=float)
+    if actuators is None:
+        return np.zeros(commands.shape[:-1] + (0,))
+    position = np.clip(commands[..., actuators.surface_index], actuators.lower, actuators.upper)
+    return np.concatenate((position, np.zeros_like(position), position[..., actuators.backlash]), axis=-1)
+
+def play_edges(x, actuators):
+    # (..., n_backlash) surface states with backlash and the nearest edge of the play around their actuator
+    n = len(actuators.surfaces)
+    surface, position = x[..., 2 * n:], x[..., actuators.backlash]
+    return surface, np.clip(surface, position - actuators.half_gap, position + actuators.half_gap)
+
+def actuator_dynamics(x, commands, actuators):
+    """
+    State derivatives of every actuator, for one vehicle or a batch (leading axes).
+
+    The actuator accelerates towards its clipped command as a damped spring and moves at its rate
+    clipped to the rate limit. Beyond the limit the rate state is pulled back to it (at rate_tracking
+    times the natural frequency), so it does not wind up while the actuator is rate limited and the
+    actuator leaves the limit as soon as the spring lets go. With backlash the surface state closes on the edge of the play
+    while the actuator pushes it past it (at backlash_tracking times the natural frequency); the
+    deflection is the surface state clipped to the play, so it is exact while pushed.
+
+    The limits clip values rather than holding states on them, so the right-hand side is continuous
+    and no state slides along a limit (which makes implicit solvers chatter); it has kinks where
+    the functions of limit_function cross zero, which the integrators stop at.
+
+    Inputs:
+    x: (..., n_states) np.array
+        Actuator states
+    commands: (..., n_actuators) np.array
+        Command of every actuator
+
+    Returns:
+    np.array
+        (..., n_states) state derivatives
+    """
+    n = len(actuators.surfaces)
+    position, rate = x[..., :n], x[..., n:2 * n]
+    command = np.clip(commands, actuators.lower, actuators.upper)
+
+    xdot = np.empty(np.shape(x))
+    xdot[..., :n] = limited = np.clip(rate, -actuators.rate_limit, actuators.rate_limit)
+    xdot[..., n:2 * n] = (actuators.stiffness * (command - position) - actuators.damping * rate
+                          - actuators.rate_tracking * (rate - limited))
+    if len(actuators.backlash):
+        surface, edge = play_edges(x, actuators)
+        xdot[..., 2 * n:] = actuators.tracking * (edge - surface)
+    return xdot
+
+def actuator_deflections(x, actuators):
+    # (..., n_actuators) surface deflection of every actuator, within its stops
+    n = len(actuators.surfaces)
+    deflection = np.array(x[..., :n], dtype=float)
+    if len(actuators.backlash):
+        deflection[..., actuators.backlash] = play_edges(x, actuators)[1]
+    return np.clip(deflection, actuators.lower, actuators.upper)
+
+def vehicle_surfaces(x, commands, params):
+    """
+    Deflections of the aero controls: the actuator outputs for the surfaces with an actuator, the
+    commands themselves for the others.
+
+    Inputs:
+    x: (..., n_states) np.array
+        Vehicle states
+    commands: (..., len(aero_controls)) np.array
+    """
+    actuators = actuator_set(params)
+    if actuators is None:
+        return commands
+    surfaces = np.array(commands, dtype=float)
+    surfaces[..., actuators.surface_index] = actuator_deflections(x[..., actuator_offset(params):], actuators)
+    return surfaces
+
+def limit_function(params):
+    """
+    Switching functions of the actuator limits as a function of the vehicle state, for integrator events.
+
+    The actuator right-hand side or the deflections have a kink where one of them crosses zero: the
+    rate reaching either limit, the position reaching either stop and, with backlash, the actuator
+    pushing the surface state past either edge of the play.
+
+    Returns:
+    function or None
+        limits(t, x) -> np.array, positive while a limit is reached; None without actuators
+    """
+    actuators = actuator_set(params)
+    if actuators is None:
+        return None
+    offset = actuator_offset(params)
+    n = len(actuators.surfaces)
+
+    def limits(t, x):
+        position, rate = x[offset:offset + n], x[offset + n:offset + 2 * n]
+        play = x[offset + 2 * n:offset + actuators.n_states] - position[actuators.backlash]
+        return np.concatenate((
+            rate[actuators.rate_limited] - actuators.rate_limit[actuators.rate_limited],
+            -actuators.rate_limit[actuators.rate_limited] - rate[actuators.rate_limited],
+            position[actuators.upper_limited] - actuators.upper[actuators.upper_limited],
+            actuators.lower[actuators.lower_limited] - position[actuators.lower_limited],
+            play - actuators.half_gap,
+            -actuators.half_gap - play,
+        ))
+
+    return limits
+
+def calc_actuator_dynamics(t, x, u, params):
+    # u = command of every actuator (in the order of the configuration's actuators)
+    return actuator_dynamics(x, u, actuator_set(params))
+
+def calc_actuator_outputs(t, x, u, params):
+    return actuator_deflections(x, actuator_set(params))
+
+def build_actuators(params):
+    # states from ActuatorSet.state_names; inputs '<surface>_command', outputs the surface deflections
+    import control as ct
+    actuators = actuator_set(params)
+    return ct.nlsys(
+        updfcn=calc_actuator_dynamics, outfcn=calc_actuator_outputs, name='actuators', states=actuators.state_names(),
+        inputs=[f'{surface}_command' for surface in actuators.surfaces], outputs=actuators.surfaces
+    )
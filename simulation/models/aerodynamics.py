@@ -1,11 +1,108 @@
+import threading
+from collections import OrderedDict
 import numpy as np
-import control as ct
-from typing import List
 
-from ..configuration import aerodynamics_model
 from ..configuration import aero_controls
+from . import lazy_subsystems
 
-surfaces_dict = {}
+# Aerodynamics model interface:
+#   model(airspeed, alpha, beta, p, q, r, surfaces, params) -> F, M
+# body-frame force and moment about the c.g.; `surfaces` maps every name of aero_controls to its
+# deflection and params['density'] is the local air density. A scalar model takes floats and
+# returns (3,) arrays. A model marked with @vectorized_aerodynamics takes (N,) arrays (surfaces
+# and density included) and returns (N, 3) arrays; scalar models are looped over by scalar_adapter.
+
+def vectorized_aerodynamics(model):
+    # mark a model as taking and returning arrays
+    model.vectorized = True
+    return model
+
+def is_vectorized(model):
+    return getattr(model, 'vectorized', False)
+
+def scalar_adapter(model):
+    # array interface of a model that only takes scalars (one call per row)
+    def evaluate(airspeed, alpha, beta, p, q, r, surfaces, params):
+        n = len(airspeed)
+        density = np.broadcast_to(params['density'], (n,))
+        F = np.empty((n, 3))
+        M = np.empty((n, 3))
+        for i in range(n):
+            surfaces_i = {name: values[i] for name, values in surfaces.items()}
+            F[i], M[i] = model(airspeed[i], alpha[i], beta[i], p[i], q[i], r[i], surfaces_i, {**params, 'density': density[i]})
+        return F, M
+    evaluate.__wrapped__ = model
+    return vectorized_aerodynamics(evaluate)
+
+def array_model(model):
+    # the model itself when it is vectorized, else its scalar adapter
+    return model if is_vectorized(model) else scalar_adapter(model)
+
+class AerodynamicsMemo:
+    """
+    Quantized least-recently-used memo of an aerodynamics model (itself a vectorized model).
+
+    The inputs (airspeed, alpha, beta, p, q, r, density, surfaces...) are rounded to multiples of
+    `quantum` to form the key, so evaluations closer than one quantum share the result of the
+    first one. The default only merges points that differ by roundoff; a coarser quantum trades
+    accuracy for hits and must stay well below finite-difference steps. The other parameters are
+    not part of the key, so a memo belongs to one configuration. It can be shared between threads.
+
+    Inputs:
+    model: function
+        Scalar or vectorized aerodynamics model
+    quantum: float or array-like
+        Key resolution, one value or one per input (7 + len(aero_controls))
+    maxsize: int
+        Number of evaluations kept
+    """
+    vectorized = True
+
+    def __init__(self, model, quantum=1e-12, maxsize=4096):
+        self.__wrapped__ = model
+        self.model = array_model(model)
+        self.quantum = np.asarray(quantum, dtype=float)
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __call__(self, airspeed, alpha, beta, p, q, r, surfaces, params):
+        columns = [airspeed, alpha, beta, p, q, r, params['density']] + [surfaces[name] for name in aero_controls]
+        inputs = np.column_stack(np.broadcast_arrays(*[np.atleast_1d(np.asarray(column, dtype=float)) for column in columns]))
+        keys = [key.tobytes() for key in np.round(inputs / self.quantum).astype(np.int64)]
+
+        F = np.empty((len(keys), 3))
+        M = np.empty((len(keys), 3))
+        missing = []
+        with self.lock:
+            for i, key in enumerate(keys):
+                entry = self.entries.get(key)
+                if entry is None:
+                    missing.append(i)
+                else:
+                    self.entries.move_to_end(key)
+                    F[i], M[i] = entry
+            self.hits += len(keys) - len(missing)
+            self.misses += len(missing)
+
+        if missing:
+            # the misses are evaluated together, outside the lock
+            rows = inputs[missing]
+            surfaces_rows = {name: rows[:, 7 + j] for j, name in enumerate(aero_controls)}
+            F[missing], M[missing] = self.model(*rows[:, :6].T, surfaces_rows, {**params, 'density': rows[:, 6]})
+            with self.lock:
+                for i in missing:
+                    self.entries[keys[i]] = (F[i].copy(), M[i].copy())
+                while len(self.entries) > self.maxsize:
+                    self.entries.popitem(last=False)
+        return F, M
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = self.misses = 0
 
 def calc_aerodynamics_outputs(t, x, u, params):
     airspeed = u[0]
@@ -14,18 +111,33 @@ def calc_aerodynamics_outputs(t, x, u, params):
     p = u[3]
     q = u[4]
     r = u[5]
-    surfaces = u[6:]
+    density = u[6]
+    surfaces = dict(zip(aero_controls, u[7:])) # built per call, so evaluations are reentrant
 
-    for i, control in enumerate(aero_controls):
-        surfaces_dict[control] = surfaces[i]
-        
-    F, M = aerodynamics_model(airspeed, alpha, beta, p, q, r, surfaces_dict, params)
+    # the model reads the local (altitude-dependent) density from its parameters
+    model = params['aerodynamics_model']
+    if is_vectorized(model):
+        F, M = model(*np.atleast_2d(u[:6]).T, {name: np.atleast_1d(value) for name, value in surfaces.items()}, {**params, 'density': np.atleast_1d(density)})
+        return F[0], M[0]
+    F, M = model(airspeed, alpha, beta, p, q, r, surfaces, {**params, 'density': density})
 
     return F, M
 
+def calc_aerodynamics_batch(airspeed, alpha, beta, omega, density, surfaces, params):
+    # Evaluate the aerodynamics model for a batch of N vehicles: one call of a vectorized model,
+    # or one call per vehicle of a scalar model
+    model = array_model(params['aerodynamics_model'])
+    surfaces = {name: surfaces[:, i] for i, name in enumerate(aero_controls)}
+    return model(airspeed, alpha, beta, omega[:, 0], omega[:, 1], omega[:, 2], surfaces, {**params, 'density': density})
 
-aerodynamics_state_inputs = ['airspeed', 'alpha', 'beta', 'p', 'q', 'r']
+
+aerodynamics_state_inputs = ['airspeed', 'alpha', 'beta', 'p', 'q', 'r', 'density']
 aerodynamics_control_inputs = aero_controls
 aerodynamics_inputs = aerodynamics_state_inputs + aerodynamics_control_inputs
 aerodynamics_outputs = ['Fx_aero', 'Fy_aero', 'Fz_aero', 'Mx_aero', 'My_aero', 'Mz_aero']
-aerodynamics = ct.nlsys(updfcn=None, outfcn=calc_aerodynamics_outputs, inputs=aerodynamics_inputs, outputs=aerodynamics_outputs, name='aerodynamics')
\ No newline at end of file
+
+def build_aerodynamics():
+    import control as ct
+    return ct.nlsys(updfcn=None, outfcn=calc_aerodynamics_outputs, inputs=aerodynamics_inputs, outputs=aerodynamics_outputs, name='aerodynamics')
+
+__getattr__ = lazy_subsystems(__name__, {'aerodynamics': build_aerodynamics})
@@ -1,6 +1,9 @@
-from scipy.spatial.transform import Rotation as R
 import numpy as np
-import control as ct
+
+from utilities.quaternion import quat_to_dcm, rotate_NED_to_body
+from .environment import environment_outputs
+from .atmosphere import atmosphere
+from . import lazy_subsystems
 
 def airdata(V_body, V_wind_NED, quat_body_to_NED):
     """
@@ -14,32 +17,31 @@ def airdata(V_body, V_wind_NED, quat_body_to_NED):
     quat_body_to_NED: 4x1 np.array
         Quaternion (real part first) that expresses a body-frame vector in the NED frame. (R_e2b). Equivalently, it is the 3-2-1 (psi, theta, phi) rotation needed to align the NED frame with the body frame.
 
+    All inputs may also be stacked along a leading batch axis (Nx3, Nx4).
+
     Returns:
     tuple
         airspeed, alpha, beta, Va_body (body frame airspeed vector)
     """
-    quat_body_to_NED = np.roll(quat_body_to_NED, -1) # Rotation package expects quat in (x, y, z, real) format
-    rot_body_to_NED = R.from_quat(quat_body_to_NED)
+    return airdata_dcm(V_body, V_wind_NED, quat_to_dcm(quat_body_to_NED))
 
-    rot_NED_to_body = R.inv(rot_body_to_NED)
 
-    V_wind_body = rot_NED_to_body.apply(V_wind_NED)
+def airdata_dcm(V_body, V_wind_NED, dcm_body_to_NED):
+    # airdata for an already computed body-to-NED DCM (single vehicle or batch)
+    V_wind_body = rotate_NED_to_body(dcm_body_to_NED, V_wind_NED)
 
     # Compute airspeed vector
     Va_body = V_body - V_wind_body
 
     # Compute airspeed magnitude
-    airspeed = np.linalg.norm(Va_body)
+    airspeed = np.linalg.norm(Va_body, axis=-1)
     
     # Compute alpha (angle of attack)
-    alpha = np.arctan2(Va_body[2], Va_body[0])
+    alpha = np.arctan2(Va_body[..., 2], Va_body[..., 0])
     
-    # Compute beta (sideslip angle)
-    if airspeed > 0:
-        # arbitrary value to avoid division by zero
-        beta = np.arcsin(Va_body[1] / airspeed)
-    else:
-        beta = 0
+    # Compute beta (sideslip angle), zero where the airspeed vanishes to avoid division by zero
+    ratio = np.divide(Va_body[..., 1], airspeed, out=np.zeros_like(airspeed), where=airspeed > 0)
+    beta = np.arcsin(ratio)
 
     # from_euler rotates a vector, so expressing a vector in another frame means we use the negative
     # TODO: check correctness of this:
@@ -50,21 +52,35 @@ def airdata(V_body, V_wind_NED, quat_body_to_NED):
     return airspeed, alpha, beta, Va_body
 
 
+def air_data_dcm(V_body, V_wind_NED, dcm_body_to_NED, z):
+    """
+    Air data outputs for an already computed body-to-NED DCM (single vehicle or batch).
+
+    Returns:
+    np.array
+        (..., 5) airspeed, alpha, beta, density (ISA at altitude -z) and Mach number
+    """
+    airspeed, alpha, beta, _ = airdata_dcm(V_body, V_wind_NED, dcm_body_to_NED)
+    density, _, _, speed_of_sound = atmosphere(-np.asarray(z, dtype=float))
+    return np.stack((airspeed, alpha, beta, density, airspeed / speed_of_sound), axis=-1)
+
 def calc_airdata_outputs(t, x, u, params):
     V_body = u[:3]
-    V_wind_NED = np.zeros(3) # TODO: add wind
-    quat_body_to_NED = u[3:]
+    quat_body_to_NED = u[3:7]
+    V_wind_NED = u[7:10]
+    z = u[10]
 
     if np.linalg.norm(quat_body_to_NED) > 0:
         # BUG: due to the way outputs are propagated through the system in python-control 
         # https://github.com/python-control/python-control/issues/1009
-        quat_body_to_NED = quat_body_to_NED / np.linalg.norm(quat_body_to_NED)
-        airspeed, alpha, beta, Va_body = airdata(V_body, V_wind_NED, quat_body_to_NED)
-    else:
-        airspeed, alpha, beta = 0, 0, 0
-    
-    return airspeed, alpha, beta
+        return air_data_dcm(V_body, V_wind_NED, quat_to_dcm(quat_body_to_NED), z)
+    return np.array([0, 0, 0, atmosphere(-z)[0], 0])
+
+airdata_inputs = ['u', 'v', 'w', 'qw', 'qx', 'qy', 'qz'] + environment_outputs + ['z']
+airdata_outputs = ['airspeed', 'alpha', 'beta', 'density', 'mach']
+
+def build_airdata():
+    import control as ct
+    return ct.nlsys(updfcn=None, outfcn=calc_airdata_outputs, inputs=airdata_inputs, outputs=airdata_outputs, name='airdata_calcs')
 
-airdata_inputs = ['u', 'v', 'w', 'qw', 'qx', 'qy', 'qz']
-airdata_outputs = ['airspeed', 'alpha', 'beta']
-airdata_calcs = ct.nlsys(updfcn=None, outfcn=calc_airdata_outputs, inputs=airdata_inputs, outputs=airdata_outputs, name='airdata_calcs')
+__getattr__ = lazy_subsystems(__name__, {'airdata_calcs': build_airdata})
@@ -0,0 +1,75 @@
+import numpy as np
+
+# International Standard Atmosphere (ISA) up to 32 km geopotential altitude
+R_air = 287.05287 # J/(kg K)
+gamma_air = 1.4
+g0 = 9.80665
+
+# layer base altitude (m), base temperature (K), base pressure (Pa), lapse rate (K/m)
+isa_layers = [
+    (0.0, 288.15, 101325.0, -0.0065),
+    (11000.0, 216.65, 22632.06, 0.0),
+    (20000.0, 216.65, 5474.889, 0.001),
+]
+
+def isa(altitude):
+    """
+    ISA properties from the layer formulas.
+
+    Inputs:
+    altitude: float or np.array
+        Geopotential altitude (m); below sea level the troposphere is extrapolated
+
+    Returns:
+    tuple
+        density (kg/m^3), pressure (Pa), temperature (K), speed of sound (m/s)
+    """
+    altitude = np.asarray(altitude, dtype=float)
+    temperature = np.empty_like(altitude)
+    pressure = np.empty_like(altitude)
+    for i, (base, T_base, p_base, lapse) in enumerate(isa_layers):
+        layer = altitude >= base if i > 0 else np.ones_like(altitude, dtype=bool)
+        dh = altitude[layer] - base
+        temperature[layer] = T_base + lapse * dh
+        if lapse == 0:
+            pressure[layer] = p_base * np.exp(-g0 * dh / (R_air * T_base))
+        else:
+            pressure[layer] = p_base * (temperature[layer] / T_base)**(-g0 / (lapse * R_air))
+    density = pressure / (R_air * temperature)
+    speed_of_sound = np.sqrt(gamma_air * R_air * temperature)
+    return density, pressure, temperature, speed_of_sound
+
+# Dense table of the formulas on a uniform altitude grid, interpolated linearly at run time
+table_min_altitude = -1000.0
+table_max_altitude = 32000.0
+table_step = 5.0
+table_altitudes = np.arange(table_min_altitude, table_max_altitude + table_step, table_step)
+atmosphere_table = np.column_stack(isa(table_altitudes))
+atmosphere_slope = np.diff(atmosphere_table, axis=0) # per table step
+table_last = len(table_altitudes) - 1
+
+def atmosphere(altitude):
+    """
+    ISA density, pressure, temperature and speed of sound from the precomputed table.
+
+    The uniform grid is indexed directly (no search), so a lookup costs a few array operations
+    for a single altitude or a whole batch. Altitudes outside the table are clamped to it.
+
+    Inputs:
+    altitude: float or np.array
+        Geopotential altitude (m), e.g. -z
+
+    Returns:
+    tuple
+        density (kg/m^3), pressure (Pa), temperature (K), speed of sound (m/s), shaped like altitude
+    """
+    if np.ndim(altitude) == 0:
+        # scalar fast path for single-vehicle right-hand sides
+        position = min(max((float(altitude) - table_min_altitude) / table_step, 0.0), table_last)
+        i = min(int(position), table_last - 1)
+        return tuple(atmosphere_table[i] + (position - i) * atmosphere_slope[i])
+
+    position = np.clip((np.asarray(altitude, dtype=float) - table_min_altitude) / table_step, 0, table_last)
+    i = np.minimum(position.astype(int), table_last - 1)
+    values = atmosphere_table[i] + (position - i)[..., None] * atmosphere_slope[i]
+    return values[..., 0], values[..., 1], values[..., 2], values[..., 3]
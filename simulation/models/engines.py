@@ -1,16 +1,75 @@
 import numpy as np
 from scipy.spatial.transform import Rotation as R
 
+from utilities.interpolation import Interpolator
+
+class ThrustMap:
+    """
+    Thrust and shaft torque of a thruster tabulated over a regular grid.
+
+    The first axis is the engine state: the throttle (0..1), or the rotor speed (rad/s) for thrusters
+    with rotor dynamics. Queries outside the grid are clamped to it.
+
+    Inputs:
+    engine, airspeed, density: 1-D array-like
+        Grid axes (-, or rad/s; m/s; kg/m^3)
+    thrust, torque: np.array
+        (len(engine), len(airspeed), len(density)) thrust (N) and shaft torque (N*m)
+    """
+    def __init__(self, engine, airspeed, density, thrust, torque=None):
+        self.axes = [np.asarray(axis, dtype=float) for axis in (engine, airspeed, density)]
+        thrust = np.asarray(thrust, dtype=float)
+        torque = np.zeros_like(thrust) if torque is None else np.asarray(torque, dtype=float)
+        self.lookup = Interpolator.from_grid(self.axes, np.stack((thrust, torque), axis=-1), columns=['thrust', 'torque'])
+
+    @classmethod
+    def from_csv(cls, data_file):
+        # CSV columns: engine state, airspeed, density, thrust, torque (a full regular grid, any row order)
+        lookup = Interpolator(3, data_file)
+        shape = [len(axis) for axis in lookup.grid_axes]
+        values = np.asarray(lookup.dependent_vars).reshape(shape + [-1])
+        return cls(*lookup.grid_axes, values[..., 0], values[..., 1])
+
+    @classmethod
+    def linear(cls, max_thrust, max_engine=1.0):
+        # thrust proportional to the engine state, independent of airspeed and density, no torque
+        return cls([0, max_engine], [0], [0], np.array([0, max_thrust], dtype=float).reshape(2, 1, 1))
+
+    def __call__(self, engine, airspeed, density):
+        # (..., 2) thrust and torque
+        points = np.stack(np.broadcast_arrays(engine, airspeed, density), axis=-1)
+        return self.lookup.interpolate(points.reshape(-1, 3)).reshape(points.shape[:-1] + (2,))
+
 class Thruster:
-    def __init__(self, name, position, rotation, time_constant, max_thrust):
+    """
+    Inputs:
+    thrust_map: ThrustMap, optional
+        Thrust and torque tables; without one thrust is max_thrust times the engine state and there is no torque
+    rotor_inertia: float
+        Rotor polar moment of inertia (kg*m^2); with max_speed the engine state is the rotor speed
+    max_speed: float, optional
+        Rotor speed at full throttle (rad/s); the rotor speed follows throttle * max_speed with the time constant
+    spin: int
+        +1 if the rotor spins positively about the thrust direction, -1 otherwise
+    """
+    def __init__(self, name, position, rotation, time_constant, max_thrust, thrust_map=None, rotor_inertia=0.0, max_speed=None, spin=1):
         # orientation
         self.name = name
         self.position = position # vector relative to vehicle datum
         self.rotation = rotation # rotation from body frame to thrust frame (expresses a thrust-frame vector in the body frame)
+        self.thrust_direction = rotation.apply([1, 0, 0]) # unit thrust vector in the body frame
         self.time_constant = time_constant
         self.max_thrust = max_thrust # Newtons
-        # add force map
-        # add rotor inertia
+        # force map and rotor; a thruster set is compiled into arrays by propulsion.thruster_matrices
+        self.thrust_map = thrust_map
+        self.rotor_inertia = rotor_inertia
+        self.max_speed = max_speed
+        self.spin = spin
+
+    @property
+    def engine_scale(self):
+        # engine state at full throttle
+        return 1.0 if self.max_speed is None else self.max_speed
 
 # Assume the propeller frame is constructed to orient thrust in the positive x-direction
 vertically_alighed_engine = R.from_euler('y', 90, degrees=True) # rotates propeller-frame thrust vector (thrust in x-direction) in body frame
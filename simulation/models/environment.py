@@ -1,6 +1,153 @@
-def discrete_gust(V_wind_NED, T_s):
+import numpy as np
+
+from . import lazy_subsystems
+
+# MIL-F-8785C medium/high altitude turbulence length scales (m): L_u = L_v = 2 L_w = 1750 ft
+dryden_length_scale = np.array([533.4, 533.4, 266.7])
+von_karman_length_scale = np.array([762.0, 762.0, 381.0]) # 2500 ft
+
+def discrete_gust(t, amplitude_NED, start, duration):
     """
-    Generate a discrete gust in the NED frame
+    Generate a 1-cosine discrete gust in the NED frame.
+
+    Inputs:
+    t: float or (n,) np.array
+        Time (s)
+    amplitude_NED: 3x1 np.array
+        Peak gust velocity, expressed in the NED frame
+    start, duration: float
+        Gust onset time and length (s)
+
+    Returns:
+    np.array
+        (3,) or (n, 3) gust velocity
     """
-    V_wind_NED = np.array(V_wind_NED)
-    T_s = np.array(T_s)
\ No newline at end of file
+    t = np.asarray(t, dtype=float)
+    phase = np.clip((t - start) / duration, 0, 1)
+    return 0.5 * (1 - np.cos(2 * np.pi * phase))[..., None] * np.asarray(amplitude_NED, dtype=float)
+
+def turbulence_psd(omega, airspeed, intensity, length_scale, model='dryden'):
+    """
+    One-sided power spectral densities of the longitudinal, lateral and vertical turbulence
+    components at temporal frequency omega (rad/s), for a vehicle flying at `airspeed` through
+    frozen turbulence. Each spectrum integrates to intensity**2 over [0, inf).
+
+    Returns:
+    np.array
+        (len(omega), 3)
+    """
+    omega = np.asarray(omega, dtype=float)[:, None]
+    sigma = np.broadcast_to(np.asarray(intensity, dtype=float), (3,))
+    L = np.broadcast_to(np.asarray(length_scale, dtype=float), (3,))
+    scale = sigma**2 * L / (np.pi * airspeed)
+    if model == 'dryden':
+        Omega2 = (L * omega / airspeed)**2
+        longitudinal = 2 / (1 + Omega2)
+        transverse = (1 + 3 * Omega2) / (1 + Omega2)**2
+    elif model == 'von_karman':
+        Omega2 = (1.339 * L * omega / airspeed)**2
+        longitudinal = 2 / (1 + Omega2)**(5/6)
+        transverse = (1 + 8/3 * Omega2) / (1 + Omega2)**(11/6)
+    else:
+        raise ValueError(f"Unknown turbulence model '{model}'")
+    return scale * np.where([True, False, False], longitudinal, transverse)
+
+class Turbulence:
+    """
+    Pre-generated turbulence velocity sequences sampled by linear interpolation in time.
+
+    Unit white noise is shaped in the frequency domain by the square root of the turbulence
+    spectrum, so generating a sequence is a few FFTs and sampling it during integration is an
+    interpolation (no extra states or random draws per step).
+
+    Inputs:
+    duration, dt: float
+        Length and sample period of the sequences (s); sampling beyond `duration` holds the last value
+    airspeed: float
+        Mean airspeed (m/s) converting the spatial turbulence field to time
+    intensity: float or 3x1 np.array
+        RMS turbulence velocity of the longitudinal, lateral and vertical components (m/s)
+    length_scale: 3x1 np.array, optional
+        Turbulence scale lengths (m), defaults to the model's medium/high altitude values
+    model: str
+        'dryden' or 'von_karman'
+    heading: float
+        Mean flight-path heading (rad) aligning the longitudinal component in the NED frame
+    n_series: int, optional
+        Number of independent sequences (e.g. one per Monte Carlo vehicle); sampling then
+        returns (n_series, 3). Only the batched vehicles of simulation.batch take several
+        sequences: build_vehicle rejects an environment with them
+    seed: int or np.random.SeedSequence, optional
+    """
+    def __init__(self, duration, dt, airspeed, intensity, length_scale=None, model='dryden', heading=0.0, n_series=None, seed=None):
+        if length_scale is None:
+            length_scale = dryden_length_scale if model == 'dryden' else von_karman_length_scale
+        self.dt = dt
+        self.n_series = n_series
+        n = int(np.ceil(duration / dt)) + 1
+        self.time = np.arange(n) * dt
+
+        rng = np.random.default_rng(seed)
+        noise = rng.standard_normal((1 if n_series is None else n_series, n, 3))
+        omega = 2 * np.pi * np.fft.rfftfreq(n, dt)
+        # unit-variance white noise has a one-sided PSD of dt/pi over [0, pi/dt]
+        gain = np.sqrt(np.pi / dt * turbulence_psd(omega, airspeed, intensity, length_scale, model))
+        body = np.fft.irfft(np.fft.rfft(noise, axis=1) * gain, n, axis=1)
+
+        # longitudinal/lateral components along the flight path heading, vertical along down
+        cos, sin = np.cos(heading), np.sin(heading)
+        series = np.stack((cos * body[..., 0] - sin * body[..., 1], sin * body[..., 0] + cos * body[..., 1], body[..., 2]), axis=-1)
+        self.series = series[0] if n_series is None else series
+
+    def sample(self, t):
+        # turbulence velocity in the NED frame at time t: (3,) or (n_series, 3)
+        position = np.clip(t / self.dt, 0, len(self.time) - 1)
+        i = min(int(position), len(self.time) - 2)
+        weight = position - i
+        return (1 - weight) * self.series[..., i, :] + weight * self.series[..., i + 1, :]
+
+class Environment:
+    """
+    Wind field: steady wind, 1-cosine discrete gusts and turbulence, all in the NED frame.
+
+    Inputs:
+    wind_NED: 3x1 np.array
+        Steady wind velocity (m/s)
+    gusts: list of dict
+        Discrete gusts with keys 'amplitude' (NED, m/s), 'start' and 'duration' (s)
+    turbulence: Turbulence, optional
+    """
+    def __init__(self, wind_NED=(0, 0, 0), gusts=(), turbulence=None):
+        self.wind_NED = np.asarray(wind_NED, dtype=float)
+        self.gusts = list(gusts)
+        self.turbulence = turbulence
+
+    def wind(self, t):
+        wind = self.wind_NED.copy()
+        for gust in self.gusts:
+            wind = wind + discrete_gust(t, gust['amplitude'], gust['start'], gust['duration'])
+        if self.turbulence is not None:
+            wind = wind + self.turbulence.sample(t)
+        return wind
+
+def wind_series(params):
+    # number of independent wind sequences of the environment in params (None: a single one)
+    environment = params.get('environment')
+    turbulence = None if environment is None else environment.turbulence
+    return None if turbulence is None else turbulence.n_series
+
+def wind_NED(t, params):
+    # Wind velocity from the environment in params (still air without one)
+    environment = params.get('environment')
+    return np.zeros(3) if environment is None else environment.wind(t)
+
+def calc_environment_outputs(t, x, u, params):
+    return wind_NED(t, params)
+
+environment_outputs = ['wind_n', 'wind_e', 'wind_d']
+
+def build_environment():
+    import control as ct
+    return ct.nlsys(updfcn=None, outfcn=calc_environment_outputs, inputs=[], outputs=environment_outputs, name='environment')
+
+__getattr__ = lazy_subsystems(__name__, {'environment': build_environment})
@@ -1,9 +1,11 @@
-import control as ct
 import numpy as np
 
-from .aerodynamics import aerodynamics, aerodynamics_inputs, aerodynamics_outputs
-from .propulsion import propulsion, propulsion_inputs, propulsion_outputs
-from .gravity import gravity, gravity_inputs, gravity_outputs
+from .. import configuration
+from .aerodynamics import build_aerodynamics, aerodynamics_inputs, aerodynamics_outputs
+from .propulsion import build_propulsion, propulsion_inputs, propulsion_outputs
+from .gravity import build_gravity, gravity_inputs, gravity_outputs
+from .ground import build_ground, ground_inputs, ground_outputs
+from . import lazy_subsystems
 
 def summation(t, x, u, params):
 
@@ -12,26 +14,35 @@ def summation(t, x, u, params):
     prop_forces = u[6:9]
     prop_moments = u[9:12]
     gravity_forces = u[12:15]
+    ground_forces = u[15:18]
+    ground_moments = u[18:21]
 
-    forces = aero_forces + prop_forces + gravity_forces
-    moments = aero_moments + prop_moments # Expects moments expressed in the body-fixed frame located at the c.g.
+    forces = aero_forces + prop_forces + gravity_forces + ground_forces
+    moments = aero_moments + prop_moments + ground_moments # Expects moments expressed in the body-fixed frame located at the c.g.
     
     return forces, moments
 
-sum_forces_moments_inputs = aerodynamics_outputs + propulsion_outputs + gravity_outputs
+sum_forces_moments_inputs = aerodynamics_outputs + propulsion_outputs + gravity_outputs + ground_outputs
 sum_forces_moments_outputs = ['Fx', 'Fy', 'Fz', 'Mx', 'My', 'Mz']
-sum_forces_moments = ct.nlsys(updfcn=None, outfcn=summation, inputs=sum_forces_moments_inputs, outputs=sum_forces_moments_outputs, name='sum_forces_moments')
 
-forces_moments_inputs = aerodynamics_inputs + propulsion_inputs + gravity_inputs
-forces_moments_outputs = aerodynamics_outputs + propulsion_outputs + gravity_outputs + sum_forces_moments_outputs
+forces_moments_inputs = list(dict.fromkeys(aerodynamics_inputs + propulsion_inputs + gravity_inputs + ground_inputs)) # shared inputs (fuel, states) listed once
+forces_moments_outputs = aerodynamics_outputs + propulsion_outputs + gravity_outputs + ground_outputs + sum_forces_moments_outputs
 
-forces_moments = ct.interconnect(
-    (sum_forces_moments, aerodynamics, propulsion, gravity), # order matters for systems with states
-    name="forces_moments",
-    inplist = forces_moments_inputs, inputs = forces_moments_inputs,
-    outlist = forces_moments_outputs, outputs = forces_moments_outputs
-)
+def build_forces_moments(params):
+    import control as ct
+    sum_forces_moments = ct.nlsys(updfcn=None, outfcn=summation, inputs=sum_forces_moments_inputs, outputs=sum_forces_moments_outputs, name='sum_forces_moments')
+
+    return ct.interconnect(
+        (sum_forces_moments, build_aerodynamics(), build_propulsion(params), build_gravity(), build_ground()), # order matters for systems with states
+        name="forces_moments",
+        inplist = forces_moments_inputs, inputs = forces_moments_inputs,
+        outlist = forces_moments_outputs, outputs = forces_moments_outputs
+    )
+
+__getattr__ = lazy_subsystems(__name__, {'forces_moments': lambda: build_forces_moments(configuration.parameters)})
 
 # test summation
 if __name__ == "__main__":
+    import control as ct
+    from .forces_moments import forces_moments
     timeseries = ct.input_output_response(forces_moments, T=np.linspace(0, 1, 100))
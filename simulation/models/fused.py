@@ -0,0 +1,179 @@
+from functools import partial
+from types import SimpleNamespace
+import numpy as np
+
+from ..configuration import aero_controls
+from .rigid_body import translation_acceleration, rotation_acceleration, kinematics_rotation, rigid_body_outputs
+from .aerodynamics import calc_aerodynamics_outputs, aerodynamics_outputs
+from .propulsion import engine_dynamics, propulsion_forces_moments, propulsion_outputs, thruster_matrices
+from .mass import has_fuel, mass_properties, fuel_rate
+from .gravity import gravity_body, gravity_outputs
+from .ground import ground_forces_moments, ground_outputs
+from .airdata import air_data_dcm, airdata_outputs
+from .actuators import actuator_set, actuator_offset, actuator_dynamics, vehicle_surfaces
+from .environment import wind_NED
+from .forces_moments import sum_forces_moments_outputs
+from .euler_angles import euler_angles_outputs
+from utilities.quaternion import quat_to_dcm, rotate_body_to_NED, dcm_to_euler_zyx
+
+# Fixed state layout, identical to the state order of the interconnected vehicle
+# x = [x, y, z, u, v, w, q0, q1, q2, q3, p, q, r, engine states..., fuel (with a mass table), actuator states...]
+num_aero_controls = len(aero_controls)
+
+# Output blocks in the order of vehicle_outputs
+output_blocks = [
+    ('rigid_body', rigid_body_outputs),
+    ('aero', aerodynamics_outputs),
+    ('prop', propulsion_outputs),
+    ('grav', gravity_outputs),
+    ('ground', ground_outputs),
+    ('sum', sum_forces_moments_outputs),
+    ('euler', euler_angles_outputs),
+    ('airdata', airdata_outputs),
+]
+force_blocks = {'aero', 'prop', 'grav', 'ground', 'sum'}
+
+# Model functions the fused vehicle calls, passed as `models` so one vehicle can call replacements
+# (e.g. timed ones, see simulation.profiling) without touching this module
+fused_models = SimpleNamespace(
+    mass_properties=mass_properties, air_data_dcm=air_data_dcm, calc_aerodynamics_outputs=calc_aerodynamics_outputs,
+    propulsion_forces_moments=propulsion_forces_moments, engine_dynamics=engine_dynamics, gravity_body=gravity_body,
+    ground_forces_moments=ground_forces_moments, vehicle_surfaces=vehicle_surfaces, actuator_dynamics=actuator_dynamics,
+    translation_acceleration=translation_acceleration, rotation_acceleration=rotation_acceleration,
+    kinematics_rotation=kinematics_rotation, dcm_to_euler_zyx=dcm_to_euler_zyx,
+)
+
+def vehicle_models(system):
+    # model functions of a fused vehicle (its outfcn is fused_outputs, or a partial of it with other models), None for other systems
+    outfcn = getattr(system, 'outfcn', None)
+    if outfcn is fused_outputs:
+        return fused_models
+    if isinstance(outfcn, partial) and outfcn.func is fused_outputs:
+        return outfcn.keywords.get('models', fused_models)
+    return None
+
+def fused_mass_properties(x, params, models=fused_models):
+    # engine states and mass properties (mass, r_cg, inertia, inertia_inv) of the state vector
+    num_engines = len(params['thrusters'])
+    fuel = x[13 + num_engines] if has_fuel(params) else None
+    return x[13:13 + num_engines], fuel, models.mass_properties(fuel, params)
+
+def fused_forces_moments(t, x, u, dcm_body_to_NED, params, engines, mass_props, models=fused_models):
+    """
+    Evaluate the air data and every force/moment source for one vehicle state.
+    The body-to-NED DCM of the state quaternion and the mass properties are computed once by the
+    caller and shared.
+
+    Returns:
+    tuple
+        air data (airspeed, alpha, beta, density, mach), aero (F, M), propulsion (F, M), gravity F, ground (F, M)
+    """
+    omega = x[10:13]
+    surfaces = models.vehicle_surfaces(x, u[:num_aero_controls], params)
+
+    air_data = models.air_data_dcm(x[3:6], wind_NED(t, params), dcm_body_to_NED, x[2])
+    aero_inputs = np.concatenate((air_data[:3], omega, air_data[3:4], surfaces))
+    F_aero, M_aero = models.calc_aerodynamics_outputs(t, None, aero_inputs, params)
+    F_prop, M_prop = models.propulsion_forces_moments(engines, u[num_aero_controls:], air_data[0], air_data[3], omega, mass_props[1], params)
+    F_grav = models.gravity_body(dcm_body_to_NED, mass_props[0])
+    F_ground, M_ground = models.ground_forces_moments(x[:13], dcm_body_to_NED, mass_props[1], params)
+
+    return air_data, (F_aero, M_aero), (F_prop, M_prop), F_grav, (F_ground, M_ground)
+
+def fused_dynamics(t, x, u, params, models=fused_models):
+    # Single right-hand side for the whole vehicle: no signal routing between subsystems
+    x = np.asarray(x, dtype=float)
+    u = np.asarray(u, dtype=float)
+    dcm_body_to_NED = quat_to_dcm(x[6:10])
+    engines, fuel, mass_props = fused_mass_properties(x, params, models)
+    _, (F_aero, M_aero), (F_prop, M_prop), F_grav, (F_ground, M_ground) = fused_forces_moments(t, x, u, dcm_body_to_NED, params, engines, mass_props, models)
+
+    force = F_aero + F_prop + F_grav + F_ground
+    moment = M_aero + M_prop + M_ground # moments are expressed about the c.g.
+    omega = x[10:13]
+    mass, _, inertia, inertia_inv = mass_props
+
+    xdot = np.empty(len(x))
+    xdot[0:3] = rotate_body_to_NED(dcm_body_to_NED, x[3:6])
+    xdot[3:6] = models.translation_acceleration(x[3:6], omega, force, mass)
+    xdot[6:10] = models.kinematics_rotation(t, x[6:10], omega, params)
+    xdot[10:13] = models.rotation_acceleration(omega, moment, inertia, inertia_inv)
+    xdot[13:13 + len(engines)] = models.engine_dynamics(engines, u[num_aero_controls:], thruster_matrices(params))
+    if fuel is not None:
+        xdot[13 + len(engines)] = fuel_rate(fuel, u[num_aero_controls:], params)
+    actuators = actuator_set(params)
+    if actuators is not None:
+        offset = actuator_offset(params)
+        xdot[offset:] = models.actuator_dynamics(x[offset:], u[actuators.surface_index], actuators)
+    return xdot
+
+def fused_outputs(t, x, u, params, models=fused_models):
+    # Outputs are ordered like vehicle_outputs: rigid body, forces/moments, Euler angles, air data
+    x = np.asarray(x, dtype=float)
+    u = np.asarray(u, dtype=float)
+    dcm_body_to_NED = quat_to_dcm(x[6:10])
+    engines, _, mass_props = fused_mass_properties(x, params, models)
+    air_data, (F_aero, M_aero), (F_prop, M_prop), F_grav, (F_ground, M_ground) = fused_forces_moments(t, x, u, dcm_body_to_NED, params, engines, mass_props, models)
+
+    force = F_aero + F_prop + F_grav + F_ground
+    moment = M_aero + M_prop + M_ground
+    euler = models.dcm_to_euler_zyx(dcm_body_to_NED)
+
+    return np.concatenate((x[:13], F_aero, M_aero, F_prop, M_prop, F_grav, F_ground, M_ground, force, moment, euler, air_data))
+
+def fused_output_function(outputs, models=fused_models):
+    """
+    Output function of the fused vehicle restricted to a selection of outputs.
+
+    Only the blocks containing a requested output are evaluated: e.g. position and airspeed
+    skip the force models and the Euler angles entirely, and a single force block (e.g. only
+    Fx_grav) evaluates that source alone. The force and moment sums need every source.
+
+    Inputs:
+    outputs: list of str
+        Output names (any of vehicle_outputs), in the order they are returned
+    models: SimpleNamespace, optional
+        Model functions to call (see fused_models)
+
+    Returns:
+    function
+        output(t, x, u, params) -> np.array of the selected outputs
+    """
+    block_of = {name: (block, i) for block, labels in output_blocks for i, name in enumerate(labels)}
+    unknown = [name for name in outputs if name not in block_of]
+    if unknown:
+        raise ValueError(f"Unknown outputs {unknown}")
+
+    needed = [block for block, _ in output_blocks if any(block_of[name][0] == block for name in outputs)]
+    offsets = dict(zip(needed, np.cumsum([0] + [len(dict(output_blocks)[block]) for block in needed])))
+    index = np.array([offsets[block_of[name][0]] + block_of[name][1] for name in outputs], dtype=int)
+    # force sources to evaluate: those requested, or all of them for the sums
+    sources = {'aero', 'prop', 'grav', 'ground'} if 'sum' in needed else force_blocks.intersection(needed)
+
+    def output(t, x, u, params):
+        x = np.asarray(x, dtype=float)
+        u = np.asarray(u, dtype=float)
+        values = {'rigid_body': x[:13]}
+        if needed != ['rigid_body']:
+            dcm_body_to_NED = quat_to_dcm(x[6:10])
+        if 'airdata' in needed or {'aero', 'prop'} & sources:
+            values['airdata'] = air_data = models.air_data_dcm(x[3:6], wind_NED(t, params), dcm_body_to_NED, x[2])
+        if {'prop', 'grav', 'ground'} & sources:
+            engines, _, mass_props = fused_mass_properties(x, params, models)
+        if 'aero' in sources:
+            surfaces = models.vehicle_surfaces(x, u[:num_aero_controls], params)
+            values['aero'] = np.concatenate(models.calc_aerodynamics_outputs(t, None, np.concatenate((air_data[:3], x[10:13], air_data[3:4], surfaces)), params))
+        if 'prop' in sources:
+            values['prop'] = np.concatenate(models.propulsion_forces_moments(engines, u[num_aero_controls:], air_data[0], air_data[3], x[10:13], mass_props[1], params))
+        if 'grav' in sources:
+            values['grav'] = models.gravity_body(dcm_body_to_NED, mass_props[0])
+        if 'ground' in sources:
+            values['ground'] = np.concatenate(models.ground_forces_moments(x[:13], dcm_body_to_NED, mass_props[1], params))
+        if 'sum' in needed:
+            values['sum'] = np.concatenate((values['aero'][:3] + values['prop'][:3] + values['grav'] + values['ground'][:3],
+                                            values['aero'][3:] + values['prop'][3:] + values['ground'][3:]))
+        if 'euler' in needed:
+            values['euler'] = models.dcm_to_euler_zyx(dcm_body_to_NED)
+        return np.concatenate([values[block] for block in needed])[index]
+
+    return output
@@ -1,24 +1,32 @@
-import control as ct
 import numpy as np
-from scipy.spatial.transform import Rotation as R
+
+from utilities.quaternion import quat_to_dcm
+from .mass import vehicle_mass
+from . import lazy_subsystems
+
+g = 9.81
+
+def gravity_body(dcm_body_to_NED, mass):
+    # gravity force in the body frame: the NED down axis expressed in the body frame is the last row of the DCM
+    return (np.asarray(mass)*g)[..., None] * dcm_body_to_NED[..., 2, :]
 
 def calc_gravity_outputs(t, x, u, params):
     # return the gravity vector in the body frame
+    quat_body_to_NED = u[:4]
+    mass = vehicle_mass(u[4] if len(u) > 4 else None, params)
 
-    g = 9.81
-
-    if np.linalg.norm(u) > 0:
-        quat_body_to_NED = np.roll(u, -1) # quaternion = x, y, z, w (real part last). The Rotation package assumes real part last, but the simulation puts it first.
-        quat_body_to_NED = R.from_quat(quat_body_to_NED) # from vehicle state
-        quat_NED_to_body = quat_body_to_NED.inv()
-        gravity_body = quat_NED_to_body.apply([0,0,g])
+    if np.linalg.norm(quat_body_to_NED) > 0:
+        return gravity_body(quat_to_dcm(quat_body_to_NED), mass) # quaternion from vehicle state
     else:
         # BUG: due to the way outputs are propagated through the system in python-control 
         # https://github.com/python-control/python-control/issues/1009
-        gravity_body = np.array([0,0,0])
-    
-    return params['mass']*gravity_body
+        return np.zeros(3)
 
-gravity_inputs = ['qw', 'qx', 'qy', 'qz']
+gravity_inputs = ['qw', 'qx', 'qy', 'qz', 'fuel']
 gravity_outputs = ['Fx_grav', 'Fy_grav', 'Fz_grav']
-gravity = ct.nlsys(updfcn=None, outfcn=calc_gravity_outputs, inputs=gravity_inputs, outputs=gravity_outputs, name='gravity')
\ No newline at end of file
+
+def build_gravity():
+    import control as ct
+    return ct.nlsys(updfcn=None, outfcn=calc_gravity_outputs, inputs=gravity_inputs, outputs=gravity_outputs, name='gravity')
+
+__getattr__ = lazy_subsystems(__name__, {'gravity': build_gravity})
@@ -0,0 +1,154 @@
+import numpy as np
+
+from utilities.quaternion import quat_to_dcm
+from .mass import has_fuel, mass_properties
+from .rigid_body import rigid_body_outputs
+from . import IdentityCache, lazy_subsystems
+
+# Friction is regularized below this sliding speed (m/s) so it stays continuous through zero velocity
+friction_velocity = 0.1
+
+class GearLeg:
+    """
+    Landing gear leg: a spring-damper between the vehicle and a flat ground, with rolling and
+    side friction at the contact point.
+
+    Inputs:
+    name: str
+    position: 3x1 np.array
+        Contact point of the uncompressed leg relative to the vehicle datum (body frame)
+    stiffness: float
+        Spring constant (N/m)
+    damping: float
+        Damping constant (N*s/m)
+    rolling_friction, side_friction: float
+        Friction coefficients along and across the wheel (the body x-axis projected on the ground)
+    """
+    def __init__(self, name, position, stiffness, damping, rolling_friction=0.02, side_friction=0.8):
+        self.name = name
+        self.position = position
+        self.stiffness = stiffness
+        self.damping = damping
+        self.rolling_friction = rolling_friction
+        self.side_friction = side_friction
+
+class LandingGear:
+    # The legs of a configuration compiled into arrays, evaluated together for one vehicle or a batch
+    def __init__(self, legs):
+        self.positions = np.array([leg.position for leg in legs], dtype=float).reshape(-1, 3)
+        self.stiffness = np.array([leg.stiffness for leg in legs], dtype=float)
+        self.damping = np.array([leg.damping for leg in legs], dtype=float)
+        self.rolling_friction = np.array([leg.rolling_friction for leg in legs], dtype=float)
+        self.side_friction = np.array([leg.side_friction for leg in legs], dtype=float)
+
+# Compiled landing gears, keyed by the identity of the leg list (not to be mutated once used)
+_landing_gear_cache = IdentityCache()
+
+def landing_gear(params):
+    # compiled landing gear of the configuration ('landing_gear', a list of GearLeg), None without one
+    legs = params.get('landing_gear')
+    if not legs:
+        return None
+    return _landing_gear_cache.get(legs, LandingGear)
+
+def contact_points(X, dcm_body_to_NED, r_cg, gear):
+    # NED position (..., n_legs, 3) of every contact point and its body-frame arm about the c.g.
+    arm = gear.positions - np.asarray(r_cg, dtype=float)[..., None, :]
+    position = X[..., None, 0:3] + np.einsum('...ij,...lj->...li', dcm_body_to_NED, arm)
+    return position, arm
+
+def contact_velocity(X, dcm_body_to_NED, arm):
+    # NED velocity (..., n_legs, 3) of every contact point
+    velocity_body = X[..., None, 3:6] + np.cross(X[..., None, 10:13], arm)
+    return np.einsum('...ij,...lj->...li', dcm_body_to_NED, velocity_body)
+
+def penetration(position, params):
+    # depth of the contact points below the ground plane ('ground_altitude', m); positive in contact
+    return position[..., 2] + params.get('ground_altitude', 0.0)
+
+def ground_forces_moments(X, dcm_body_to_NED, r_cg, params):
+    """
+    Ground reaction of the landing gear for one vehicle or a batch (leading axes).
+
+    Each leg in contact pushes along the ground normal with k*depth + c*depth_rate (never pulling)
+    and resists sliding with friction proportional to that normal force.
+
+    Inputs:
+    X: (..., 13+) np.array
+        Vehicle states [x, y, z, u, v, w, q0, q1, q2, q3, p, q, r, ...]
+    dcm_body_to_NED: (..., 3, 3) np.array
+        DCM of the state quaternion
+    r_cg: (3,) or (..., 3) np.array
+
+    Returns:
+    tuple
+        force (..., 3) and moment about the c.g. (..., 3), in the body frame
+    """
+    gear = landing_gear(params)
+    shape = np.shape(X)[:-1] + (3,)
+    if gear is None:
+        return np.zeros(shape), np.zeros(shape)
+
+    position, arm = contact_points(X, dcm_body_to_NED, r_cg, gear)
+    depth = penetration(position, params)
+    if not np.any(depth > 0):
+        # airborne: nothing else to evaluate
+        return np.zeros(shape), np.zeros(shape)
+    velocity = contact_velocity(X, dcm_body_to_NED, arm)
+    normal = np.where(depth > 0, np.maximum(0, gear.stiffness * depth + gear.damping * velocity[..., 2]), 0.0)
+
+    # wheel direction on the ground from the body x-axis, and the direction across it
+    heading = dcm_body_to_NED[..., :2, 0]
+    heading = heading / np.maximum(np.linalg.norm(heading, axis=-1, keepdims=True), 1e-9)
+    across = np.stack((-heading[..., 1], heading[..., 0]), axis=-1)
+    v_along = np.einsum('...lj,...j->...l', velocity[..., :2], heading)
+    v_across = np.einsum('...lj,...j->...l', velocity[..., :2], across)
+    f_along = -gear.rolling_friction * normal * v_along / np.sqrt(v_along**2 + friction_velocity**2)
+    f_across = -gear.side_friction * normal * v_across / np.sqrt(v_across**2 + friction_velocity**2)
+
+    force_NED = np.stack((
+        f_along * heading[..., None, 0] + f_across * across[..., None, 0],
+        f_along * heading[..., None, 1] + f_across * across[..., None, 1],
+        -normal,
+    ), axis=-1)
+    force_body = np.einsum('...ji,...lj->...li', dcm_body_to_NED, force_NED)
+    return force_body.sum(axis=-2), np.cross(arm, force_body).sum(axis=-2)
+
+def contact_function(params):
+    """
+    Penetration of every contact point as a function of the vehicle state, for integrator events.
+
+    Returns:
+    function or None
+        contact(t, x) -> (n_legs,) np.array, positive while a leg is in contact; None without landing gear
+    """
+    gear = landing_gear(params)
+    if gear is None:
+        return None
+    fuel_index = 13 + len(params['thrusters'])
+
+    def contact(t, x):
+        r_cg = mass_properties(x[fuel_index] if has_fuel(params) else None, params)[1]
+        position, _ = contact_points(x[:13], quat_to_dcm(x[6:10]), r_cg, gear)
+        return penetration(position, params)
+
+    return contact
+
+def calc_ground_outputs(t, x, u, params):
+    # u = rigid-body states, fuel level
+    quat_body_to_NED = u[6:10]
+    if np.linalg.norm(quat_body_to_NED) == 0:
+        # outputs evaluated before the signals are propagated (see gravity.calc_gravity_outputs)
+        return np.zeros(6)
+    r_cg = mass_properties(u[13] if len(u) > 13 else None, params)[1]
+    force, moment = ground_forces_moments(u[:13], quat_to_dcm(quat_body_to_NED), r_cg, params)
+    return np.concatenate((force, moment))
+
+ground_inputs = rigid_body_outputs + ['fuel']
+ground_outputs = ['Fx_ground', 'Fy_ground', 'Fz_ground', 'Mx_ground', 'My_ground', 'Mz_ground']
+
+def build_ground():
+    import control as ct
+    return ct.nlsys(updfcn=None, outfcn=calc_ground_outputs, inputs=ground_inputs, outputs=ground_outputs, name='ground')
+
+__getattr__ = lazy_subsystems(__name__, {'ground': build_ground})
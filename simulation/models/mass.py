@@ -1,31 +1,145 @@
-import pandas as pd
 import os
+import numpy as np
 
+from .. import configuration
+from ..configuration import propulsion_controls
 from utilities.interpolation import Interpolator
+from . import IdentityCache, lazy_subsystems
 
 current_dir = os.path.dirname(os.path.abspath(__file__))
 mass_data_path = os.path.join(current_dir, '..', 'data', 'mass_table.csv')
-mass_data = pd.read_csv(mass_data_path)
 
 # Inertia should be expressed in the body-fixed frame located at the c.g. (further processing will be needed for other conventions)
-mass_lookup = Interpolator(1, mass_data_path)
+_mass_lookup = None
+
+def get_mass_lookup():
+    # the table is loaded on first use, not at import
+    global _mass_lookup
+    if _mass_lookup is None:
+        _mass_lookup = Interpolator(1, mass_data_path)
+    return _mass_lookup
+
+def inertia_from_products(Ixx, Iyy, Izz, Ixy, Ixz, Iyz):
+    # inertia matrix from moments and products of inertia, stacked along the last two axes
+    return np.stack([
+        np.stack([Ixx, -Ixy, -Ixz], axis=-1),
+        np.stack([-Ixy, Iyy, -Iyz], axis=-1),
+        np.stack([-Ixz, -Iyz, Izz], axis=-1),
+    ], axis=-2)
 
 def get_mass_properties(fuel_level):
     # all units SI
 
-    if not isinstance(fuel_level, list):
-        fuel_level = [fuel_level]
-    
-    interpolated_values = mass_lookup.interpolate([fuel_level])
+    interpolated_values = get_mass_lookup().interpolate(fuel_level)
     mass = interpolated_values[0]
     cg_location = interpolated_values[1:4]
-    Ixx, Iyy, Izz, Ixy, Ixz, Iyz  = interpolated_values[4:10]
-    inertia_matrix = [
-        [Ixx, -Ixy, -Ixz],
-        [-Ixy, Iyy, -Iyz],
-        [-Ixz, -Iyz, Izz]
-    ]
-    inertia = inertia_matrix
+    inertia = inertia_from_products(*interpolated_values[4:10])
     return mass, cg_location, inertia
 
+class MassTable:
+    """
+    Mass, c.g. location, inertia and inverse inertia as functions of the fuel level.
+
+    The inverse inertia is computed once per table row and interpolated like the other columns,
+    so evaluating the mass properties never inverts a matrix.
+
+    Inputs:
+    lookup: Interpolator, optional
+        1-D table of fuel level -> mass, cg_x, cg_y, cg_z, Ixx, Iyy, Izz, Ixy, Ixz, Iyz
+        (defaults to mass_table.csv)
+    """
+    def __init__(self, lookup=None):
+        lookup = get_mass_lookup() if lookup is None else lookup
+        self.fuel = np.asarray(lookup.grid_axes[0], dtype=float)
+        values = np.asarray(lookup.dependent_vars, dtype=float)
+        inertia = inertia_from_products(*values[:, 4:10].T)
+        self.values = np.column_stack((values[:, :4], inertia.reshape(-1, 9), np.linalg.inv(inertia).reshape(-1, 9)))
+
+    @property
+    def fuel_min(self):
+        return self.fuel[0]
+
+    @property
+    def fuel_max(self):
+        return self.fuel[-1]
+
+    def __call__(self, fuel):
+        """
+        Returns:
+        tuple
+            mass, r_cg, inertia, inertia_inv; scalar fuel gives (), (3,), (3, 3), (3, 3) and an
+            (N,) fuel array gives (N,), (N, 3), (N, 3, 3), (N, 3, 3)
+        """
+        fuel = np.clip(fuel, self.fuel[0], self.fuel[-1])
+        i = np.clip(np.searchsorted(self.fuel, fuel, side='right') - 1, 0, len(self.fuel) - 2)
+        weight = ((fuel - self.fuel[i]) / (self.fuel[i + 1] - self.fuel[i]))[..., None]
+        values = (1 - weight) * self.values[i] + weight * self.values[i + 1]
+        shape = np.shape(fuel)
+        return values[..., 0], values[..., 1:4], values[..., 4:13].reshape(shape + (3, 3)), values[..., 13:22].reshape(shape + (3, 3))
+
+# Inverse of constant inertia matrices, keyed by the identity of the matrix (not to be mutated once used)
+_inverse_inertia_cache = IdentityCache()
+
+def inverse_inertia(inertia):
+    return _inverse_inertia_cache.get(inertia, lambda inertia: np.linalg.inv(np.asarray(inertia, dtype=float)))
+
+def has_fuel(params):
+    # the fuel state and varying mass properties only exist with a mass table
+    return params.get('mass_table') is not None
+
+def check_fuel_flow(params):
+    # with a mass table the fuel must burn ('fuel_flow' > 0), or the mass properties never change
+    if has_fuel(params) and not params.get('fuel_flow', 0.0) > 0:
+        raise ValueError(f"A mass table needs a positive 'fuel_flow' (fuel burned per second at full throttle), got {params.get('fuel_flow')!r}")
+
+def mass_properties(fuel, params):
+    """
+    Mass properties of the vehicle.
+
+    Inputs:
+    fuel: float, np.array or None
+        Fuel level (ignored without a mass table)
+    params: dict
+        'mass_table' (MassTable), or the constant 'mass', 'r_cg' and 'inertia'
+
+    Returns:
+    tuple
+        mass, r_cg, inertia, inertia_inv
+    """
+    if not has_fuel(params):
+        return params['mass'], params['r_cg'], params['inertia'], inverse_inertia(params['inertia'])
+    return params['mass_table'](fuel)
+
+def initial_fuel(initial_condition, params):
+    # fuel level of an initial condition ('fuel', full tank by default); None without a mass table
+    if not has_fuel(params):
+        return None
+    return initial_condition.get('fuel', params['mass_table'].fuel_max)
+
+def vehicle_mass(fuel, params):
+    # mass only, for consumers that need nothing else
+    return params['mass'] if not has_fuel(params) else params['mass_table'](fuel)[0]
+
+def fuel_rate(fuel, throttle, params):
+    # fuel flow at full throttle ('fuel_flow', per second) scaled by the mean throttle command; stops when the tank is empty
+    flow = params['fuel_flow'] * np.mean(np.clip(throttle, 0, 1), axis=-1)
+    return np.where(fuel > params['mass_table'].fuel_min, -flow, 0.0)
+
+def calc_mass_dynamics(t, x, u, params):
+    return np.atleast_1d(fuel_rate(x[0], u, params))
+
+def calc_mass_outputs(t, x, u, params):
+    # without a mass table the fuel signal is a placeholder for the consumers of mass properties
+    return x[:1] if len(x) else np.zeros(1)
+
+mass_inputs = propulsion_controls
+mass_outputs = ['fuel']
+
+def build_mass(params):
+    import control as ct
+    check_fuel_flow(params)
+    if has_fuel(params):
+        return ct.nlsys(updfcn=calc_mass_dynamics, outfcn=calc_mass_outputs, inputs=mass_inputs, outputs=mass_outputs, states=['fuel'], name='mass')
+    return ct.nlsys(updfcn=None, outfcn=calc_mass_outputs, inputs=mass_inputs, outputs=mass_outputs, name='mass')
 
+__getattr__ = lazy_subsystems(__name__, {'mass': lambda: build_mass(configuration.parameters)})
@@ -1,35 +1,159 @@
-import control as ct
 import numpy as np
-from scipy.spatial.transform import Rotation as R
 
-from ..configuration import propulsion_controls, parameters
+from .. import configuration
+from ..configuration import propulsion_controls
+from .mass import mass_properties
+from .engines import ThrustMap
+from utilities.interpolation import Interpolator
+from . import IdentityCache, lazy_subsystems
 
-def calc_propulsion_dynamics(t, x, u, params):
-    # u = throttle
-    xdot  = np.array([(1/thruster.time_constant) * (-x[index] + u[index]) for index, thruster in enumerate(params['thrusters'])])
-    return xdot
+class ThrusterMatrices:
+    """
+    A set of thrusters compiled into arrays.
 
-def calc_propulsion_outputs(t, x, u, params):
+    mixing (6, N) maps the thrust of every thruster (N) to the body force and the moment about the
+    vehicle datum; the moment about the c.g. follows as M_datum - r_cg x F, so the matrix stays valid
+    when the c.g. moves. torque_axes (3, N) maps the shaft torque of every rotor to its reaction
+    moment on the vehicle. The thrust maps of all thrusters are stacked into one table with the
+    thruster index as its first axis, so a single interpolation evaluates every thruster of every vehicle.
+    """
+    def __init__(self, thrusters):
+        directions = np.array([thruster.thrust_direction for thruster in thrusters], dtype=float).reshape(-1, 3)
+        positions = np.array([thruster.position for thruster in thrusters], dtype=float).reshape(-1, 3)
+        self.mixing = np.vstack((directions.T, np.cross(positions, directions).T))
+        self.max_thrust = np.array([thruster.max_thrust for thruster in thrusters], dtype=float)
+        self.inv_time_constant = 1 / np.array([thruster.time_constant for thruster in thrusters], dtype=float)
+        self.engine_scale = np.array([thruster.engine_scale for thruster in thrusters], dtype=float)
+
+        spin = np.array([thruster.spin for thruster in thrusters], dtype=float)
+        self.torque_axes = -(spin[:, None] * directions).T
+        self.rotor_inertia = np.array([thruster.rotor_inertia if thruster.max_speed is not None else 0.0 for thruster in thrusters], dtype=float)
+        self.rotors = bool(np.any(self.rotor_inertia))
+
+        mapped = any(thruster.thrust_map is not None for thruster in thrusters)
+        self.thrust_table = stacked_thrust_table(thrusters) if mapped else None
+
+    def thrust_torque(self, engines, airspeed, density):
+        """
+        Thrust and shaft torque of every thruster.
+
+        Inputs:
+        engines: (..., N) np.array
+            Engine states
+        airspeed, density: float or (...,) np.array
+
+        Returns:
+        tuple
+            thrust (..., N), torque (..., N) or None when no thruster has a thrust map
+        """
+        if self.thrust_table is None:
+            return self.max_thrust * engines, None
+        engines = np.asarray(engines, dtype=float)
+        index = np.broadcast_to(np.arange(engines.shape[-1], dtype=float), engines.shape)
+        airspeed = np.broadcast_to(np.asarray(airspeed, dtype=float)[..., None], engines.shape)
+        density = np.broadcast_to(np.asarray(density, dtype=float)[..., None], engines.shape)
+        points = np.stack((index, engines, airspeed, density), axis=-1).reshape(-1, 4)
+        values = self.thrust_table.interpolate(points).reshape(engines.shape + (2,))
+        return values[..., 0], values[..., 1]
+
+def stacked_thrust_table(thrusters):
+    # Every thrust map (linear ones for thrusters without) resampled on the union of the grid axes.
+    # Multilinear interpolation on a refined grid that contains the original nodes is exact.
+    maps = [thruster.thrust_map if thruster.thrust_map is not None else ThrustMap.linear(thruster.max_thrust, thruster.engine_scale)
+            for thruster in thrusters]
+    axes = [np.unique(np.concatenate([thrust_map.axes[k] for thrust_map in maps])) for k in range(3)]
+    grid = np.meshgrid(*axes, indexing='ij')
+    values = np.stack([thrust_map(*grid) for thrust_map in maps])
+    return Interpolator.from_grid([np.arange(len(maps))] + axes, values, columns=['thrust', 'torque'])
+
+# Compiled thruster sets, keyed by the identity of the thruster list (not to be mutated once used)
+_thruster_matrices_cache = IdentityCache()
+
+def thruster_matrices(params):
+    return _thruster_matrices_cache.get(params['thrusters'], ThrusterMatrices)
 
-    # TODO: map the state to thrust vector
-    thruster_force = np.zeros(3)
-    thruster_moment = np.zeros(3)
+def engine_states(throttle, params):
+    # steady engine states at a throttle setting (rotor speeds for thrusters with rotor dynamics)
+    return throttle * thruster_matrices(params).engine_scale
 
-    for index, thruster in enumerate(params['thrusters']):
-        thrust_vector = thruster.max_thrust * thruster.rotation.apply(np.array([x[index], 0, 0]))
-        thruster_force += thrust_vector
-        thruster_moment += np.cross(thruster.position - params["r_cg"], thrust_vector)
-        
-    
+def engine_dynamics(x, throttle, matrices):
+    # first-order lag of every engine state towards the throttle command (shared, or one per thruster)
+    return matrices.inv_time_constant * (throttle * matrices.engine_scale - x)
+
+def thruster_forces_moments(x, xdot, airspeed, density, omega, r_cg, matrices, scale=1.0):
+    """
+    Body force and moment about the c.g. of a thruster set, for one vehicle or a batch (leading axes).
+
+    Inputs:
+    x, xdot: (..., N) np.array
+        Engine states and their derivatives
+    airspeed, density: float or (...,) np.array
+    omega: (..., 3) np.array
+        Body rates (gyroscopic moments of the rotors)
+    r_cg: (3,) or (..., 3) np.array
+    scale: float or (...,) np.array
+        Thrust and torque scale factor
+
+    Returns:
+    tuple
+        force (..., 3), moment (..., 3)
+    """
+    thrust, torque = matrices.thrust_torque(x, airspeed, density)
+    scale = np.asarray(scale, dtype=float)[..., None]
+    thrust = scale * thrust
+    thruster_force = thrust @ matrices.mixing[:3].T
+    thruster_moment = thrust @ matrices.mixing[3:].T - np.cross(r_cg, thruster_force)
+    if torque is not None:
+        thruster_moment = thruster_moment + (scale * torque) @ matrices.torque_axes.T
+    if matrices.rotors:
+        # reaction of the rotor spin-up and gyroscopic moment of the rotor angular momentum
+        thruster_moment = thruster_moment + (matrices.rotor_inertia * xdot) @ matrices.torque_axes.T
+        thruster_moment = thruster_moment + np.cross(omega, (matrices.rotor_inertia * x) @ matrices.torque_axes.T)
     return thruster_force, thruster_moment
 
-propulsion_state_inputs = []
+def calc_propulsion_dynamics(t, x, u, params):
+    # u = airspeed, density, p, q, r, throttle (shared by every thruster or one command per thruster), fuel level
+    controls = u[len(propulsion_state_inputs):len(propulsion_state_inputs) + len(propulsion_controls)]
+    return engine_dynamics(x, controls, thruster_matrices(params))
+
+def propulsion_forces_moments(x, throttle, airspeed, density, omega, r_cg, params):
+    # body force and moment about the c.g. from the engine states and the throttle command
+    matrices = thruster_matrices(params)
+    xdot = engine_dynamics(x, throttle, matrices) if matrices.rotors else None
+    return thruster_forces_moments(x, xdot, airspeed, density, omega, r_cg, matrices)
+
+def calc_propulsion_outputs(t, x, u, params):
+    # u = airspeed, density, p, q, r, throttle, fuel level (moments are taken about the current c.g.)
+    airspeed, density = u[0], u[1]
+    omega = u[2:5]
+    n_inputs = len(propulsion_state_inputs) + len(propulsion_controls)
+    controls = u[len(propulsion_state_inputs):n_inputs]
+    fuel = u[n_inputs] if len(u) > n_inputs else None
+    return propulsion_forces_moments(x, controls, airspeed, density, omega, mass_properties(fuel, params)[1], params)
+
+def calc_propulsion_batch(x, u, airspeed, density, omega, params, thrust_scale, r_cg):
+    # Vectorized propulsion for a batch of N vehicles
+    # x is (N, num_engines), u is (N, 1) or (N, num_engines), airspeed and density are (N,), omega is (N, 3),
+    # thrust_scale is (N,), r_cg is (3,) or (N, 3)
+    # returns the state derivative (N, num_engines), force and moment (N, 3)
+    matrices = thruster_matrices(params)
+    xdot = engine_dynamics(x, u, matrices)
+    thruster_force, thruster_moment = thruster_forces_moments(x, xdot, airspeed, density, omega, r_cg, matrices, thrust_scale)
+    return xdot, thruster_force, thruster_moment
+
+propulsion_state_inputs = ['airspeed', 'density', 'p', 'q', 'r']
 propulsion_control_inputs = propulsion_controls
-propulsion_inputs = propulsion_state_inputs + propulsion_control_inputs
+propulsion_mass_inputs = ['fuel']
+propulsion_inputs = propulsion_state_inputs + propulsion_control_inputs + propulsion_mass_inputs
 propulsion_outputs=['Fx_prop', 'Fy_prop', 'Fz_prop', 'Mx_prop', 'My_prop', 'Mz_prop']
 
-num_engines = len(parameters['thrusters'])
-propulsion = ct.nlsys(updfcn=calc_propulsion_dynamics, outfcn=calc_propulsion_outputs, inputs=propulsion_inputs, outputs=propulsion_outputs, states=num_engines, name='propulsion')
+def build_propulsion(params):
+    # one first-order engine state (throttle or rotor speed) per thruster of the configuration
+    import control as ct
+    num_engines = len(params['thrusters'])
+    return ct.nlsys(updfcn=calc_propulsion_dynamics, outfcn=calc_propulsion_outputs, inputs=propulsion_inputs, outputs=propulsion_outputs, states=num_engines, name='propulsion')
+
+__getattr__ = lazy_subsystems(__name__, {'propulsion': lambda: build_propulsion(configuration.parameters)})
 
 #
 # test propulsion subsystem
@@ -1,22 +1,33 @@
-import control as ct
 import numpy as np
-from scipy.spatial.transform import Rotation as R
 
-from .forces_moments import forces_moments
+from utilities.quaternion import quat_to_dcm, rotate_body_to_NED
+from .mass import mass_properties, vehicle_mass
+from . import lazy_subsystems
+
+def translation_acceleration(V_body, omega, force, mass):
+    # body-frame acceleration (single vehicle or batch)
+    return force / np.asarray(mass)[..., None] - np.cross(omega, V_body)
+
+def rotation_acceleration(omega, moment, inertia, inertia_inv):
+    # Euler's equations J omega_dot = M - omega x J omega (single vehicle or batch)
+    J_omega = np.einsum('...ij,...j->...i', inertia, omega)
+    return np.einsum('...ij,...j->...i', inertia_inv, moment - np.cross(omega, J_omega))
 
 def dynamics_translation(t, x, u, params):
     # x is the velocity state
     # u[1:3] is the force vector
     # u[4:6] is the rotational rate
+    # u[7] is the fuel level
 
     if len(u) < 4:
         omega = np.zeros(3)
     else:
-        omega = u[3:]  
+        omega = u[3:6]
 
-    force = u[:3]   
+    force = u[:3]
+    mass = vehicle_mass(u[6] if len(u) > 6 else None, params)
 
-    return force / params['mass'] - np.cross(omega, x)
+    return translation_acceleration(x, omega, force, mass)
 
 def kinematics_translation(t, x, u, params):
     # x is the position state 
@@ -24,17 +35,16 @@ def kinematics_translation(t, x, u, params):
 
     V_body = u[:3]
     quat_body_to_NED = u[3:]
-    quat_body_to_NED = np.roll(quat_body_to_NED, -1) # Rotation package expects quat in (x, y, z, real) format
-    R_body_to_NED = R.from_quat(quat_body_to_NED)
 
-    return R_body_to_NED.apply(V_body)
+    return rotate_body_to_NED(quat_to_dcm(quat_body_to_NED), V_body)
 
 def dynamics_rotation(t, x, u, params):
     # x is the angular rates
     # u[1:3] are the moments
+    # u[4] is the fuel level
 
-    J = params['inertia']
-    return np.linalg.inv(J) @ u - np.cross(x, J @ x)
+    _, _, J, J_inv = mass_properties(u[3] if len(u) > 3 else None, params)
+    return rotation_acceleration(x, u[:3], J, J_inv)
 
 def kinematics_rotation(t, x, u, params):
     # x is the quaternion
@@ -45,23 +55,55 @@ def kinematics_rotation(t, x, u, params):
                     [u[2], u[1], -u[0], 0]])
     return .5*Q @ x
 
-translation_dynamics = ct.nlsys(dynamics_translation, outfcn=None, states=3, inputs=['Fx', 'Fy', 'Fz', 'p', 'q', 'r'], outputs=['u', 'v', 'w'], name='translation_dynamics')
-translation_kinematics = ct.nlsys(kinematics_translation, outfcn=None, states=3, inputs=['u', 'v', 'w', 'qw', 'qx', 'qy', 'qz'], outputs=['x', 'y', 'z'], name='translation_kinematics')
-rotation_dynamics = ct.nlsys(dynamics_rotation, outfcn=None, states=3, inputs=['Mx', 'My', 'Mz'], outputs=['p', 'q', 'r'], name='rotation_dynamics')
-rotation_kinematics = ct.nlsys(kinematics_rotation, outfcn=None, states=4, inputs=['p', 'q', 'r'], outputs=['qw', 'qx', 'qy', 'qz'], name='rotation_kinematics')
+def rigid_body_batch(X, force, moment, mass, inertia, inertia_inv, dcm_body_to_NED):
+    # Vectorized rigid-body derivatives for a batch of N vehicles
+    # X is (N, 13) [x, y, z, u, v, w, q0, q1, q2, q3, p, q, r], force and moment are (N, 3)
+    # mass is (N,), inertia, inertia_inv and dcm_body_to_NED (of the X quaternions) are (N, 3, 3)
+    V_body = X[:, 3:6]
+    quat = X[:, 6:10]
+    omega = X[:, 10:13]
+
+    Xdot = np.empty_like(X)
+
+    Xdot[:, 0:3] = rotate_body_to_NED(dcm_body_to_NED, V_body)
+
+    Xdot[:, 3:6] = translation_acceleration(V_body, omega, force, mass)
+
+    q0, q1, q2, q3 = quat.T
+    p, q, r = omega.T
+    Xdot[:, 6] = .5*(-p*q1 - q*q2 - r*q3)
+    Xdot[:, 7] = .5*(p*q0 + r*q2 - q*q3)
+    Xdot[:, 8] = .5*(q*q0 - r*q1 + p*q3)
+    Xdot[:, 9] = .5*(r*q0 + q*q1 - p*q2)
 
-rigid_body_inputs = ['Fx', 'Fy', 'Fz', 'Mx', 'My', 'Mz']
+    Xdot[:, 10:13] = rotation_acceleration(omega, moment, inertia, inertia_inv)
+
+    return Xdot
+
+rigid_body_inputs = ['Fx', 'Fy', 'Fz', 'Mx', 'My', 'Mz', 'fuel']
 rigid_body_outputs = ['x', 'y', 'z', 'u', 'v', 'w', 'qw', 'qx', 'qy', 'qz', 'p', 'q', 'r']
 
-rigid_body = ct.interconnect(
-    (translation_kinematics, translation_dynamics, rotation_kinematics, rotation_dynamics), # states are placed in this order
-    name="rigid_body",
-    inplist=rigid_body_inputs, inputs=rigid_body_inputs,
-    outlist=rigid_body_outputs, outputs=rigid_body_outputs, # actual outer-system outputs
-)
+def build_rigid_body():
+    import control as ct
+    translation_dynamics = ct.nlsys(dynamics_translation, outfcn=None, states=3, inputs=['Fx', 'Fy', 'Fz', 'p', 'q', 'r', 'fuel'], outputs=['u', 'v', 'w'], name='translation_dynamics')
+    translation_kinematics = ct.nlsys(kinematics_translation, outfcn=None, states=3, inputs=['u', 'v', 'w', 'qw', 'qx', 'qy', 'qz'], outputs=['x', 'y', 'z'], name='translation_kinematics')
+    rotation_dynamics = ct.nlsys(dynamics_rotation, outfcn=None, states=3, inputs=['Mx', 'My', 'Mz', 'fuel'], outputs=['p', 'q', 'r'], name='rotation_dynamics')
+    rotation_kinematics = ct.nlsys(kinematics_rotation, outfcn=None, states=4, inputs=['p', 'q', 'r'], outputs=['qw', 'qx', 'qy', 'qz'], name='rotation_kinematics')
+
+    return ct.interconnect(
+        (translation_kinematics, translation_dynamics, rotation_kinematics, rotation_dynamics), # states are placed in this order
+        name="rigid_body",
+        inplist=rigid_body_inputs, inputs=rigid_body_inputs,
+        outlist=rigid_body_outputs, outputs=rigid_body_outputs, # actual outer-system outputs
+    )
+
+__getattr__ = lazy_subsystems(__name__, {'rigid_body': build_rigid_body})
 
 # test rigid_body_dynamics
 if __name__ == "__main__":
+    import control as ct
+    rigid_body = build_rigid_body()
+
     initial_state = {
         'x': 0.0,  # Initial x position
         'y': 0.0,  # Initial y position
@@ -85,7 +127,7 @@ if __name__ == "__main__":
     # quaternion convention is to give the rotation of the NED frame to the body frame. In other words, the quaternion rotates a vector in the NED frame to align with a vector in the body frame. To express an NED vector in the body frame, use the inverse rotation.
     
     time_range = np.linspace(0, 1, 100)
-    timeseries = ct.input_output_response(rigid_body, U=np.ones((6, len(time_range)))*0.5, T=time_range, X0=x0)
+    timeseries = ct.input_output_response(rigid_body, U=np.ones((7, len(time_range)))*0.5, T=time_range, X0=x0)
 
     import matplotlib.pyplot as plt
 
@@ -1,26 +1,91 @@
-import control as ct
 import numpy as np
 
+from .. import configuration
 from .aerodynamics import aerodynamics_control_inputs
 from .propulsion import propulsion_control_inputs
-from .rigid_body import rigid_body
-from .forces_moments import forces_moments
-from .euler_angles import euler_angles_calc, euler_angles_outputs
-from .airdata import airdata_calcs, airdata_outputs
-from .rigid_body import rigid_body_outputs
-from .forces_moments import forces_moments_outputs
+from .rigid_body import build_rigid_body, rigid_body_outputs
+from .forces_moments import build_forces_moments, forces_moments_outputs
+from .euler_angles import build_euler_angles, euler_angles_outputs
+from .airdata import build_airdata, airdata_outputs
+from .environment import build_environment, wind_series
+from .mass import build_mass, check_fuel_flow, has_fuel
+from .actuators import actuator_set, actuator_state_names, build_actuators
+from .fused import fused_dynamics, fused_outputs
+from . import IdentityCache
 
 vehicle_inputs = aerodynamics_control_inputs + propulsion_control_inputs
 vehicle_outputs = rigid_body_outputs + forces_moments_outputs + euler_angles_outputs + airdata_outputs
 
-vehicle = ct.interconnect(
-    (rigid_body, forces_moments, euler_angles_calc, airdata_calcs), # subsystems with states are listed first
-    name="vehicle",
-    inplist=vehicle_inputs, inputs=vehicle_inputs,
-    outlist=vehicle_outputs, outputs=vehicle_outputs
-)
+# Built vehicles, keyed by the identity of their configuration; the most recently used are kept
+_vehicle_cache = IdentityCache(maxsize=16)
+
+def vehicle_states(config):
+    # rigid-body states followed by one engine state per thruster, the fuel level (with a mass table) and the actuator states
+    return (rigid_body_outputs + [f'engine[{i}]' for i in range(len(config['thrusters']))] + (['fuel'] if has_fuel(config) else [])
+            + actuator_state_names(config))
+
+def build_vehicle(config=None, fused=False):
+    """
+    Build the vehicle system for a configuration, or return the one already built for it.
+
+    Systems are cached by the identity of the configuration (the 16 most recently used). A
+    configuration must not be changed after it is built: an entry that is replaced or added
+    rebuilds the vehicle, but arrays or lists changed in place are not detected. Use a new
+    dict ({**config, ...}) for a different vehicle.
+
+    Inputs:
+    config: dict, optional
+        Vehicle parameters (see configuration.default_parameters); defaults to configuration.parameters.
+        The configuration is also assigned to the system's params.
+    fused: bool
+        Evaluate the vehicle as one fused function (same states, inputs and outputs) instead of
+        the interconnection of subsystems.
+
+    Returns:
+    ct.InterconnectedSystem or ct.NonlinearIOSystem
+    """
+    config = configuration.parameters if config is None else config
+    if wind_series(config) is not None:
+        raise ValueError("Turbulence with n_series sequences is for batched vehicles (simulation.batch); "
+                         "a single vehicle needs one sequence (n_series=None)")
+    check_fuel_flow(config)
+    return _vehicle_cache.get(config, lambda config: _build(config, fused), key=(fused,), stamp=tuple(config) + tuple(config.values()))
+
+def _build(config, fused):
+    import control as ct
+
+    if fused:
+        # Same vehicle evaluated by one fused right-hand side
+        system = ct.nlsys(
+            fused_dynamics, fused_outputs, name="vehicle",
+            states=vehicle_states(config), inputs=vehicle_inputs, outputs=vehicle_outputs
+        )
+    else:
+        # with actuators the surface commands drive the actuators, whose outputs (named like the
+        # surfaces) drive the aerodynamics
+        actuators = actuator_set(config)
+        actuated = [] if actuators is None else actuators.surfaces
+        system = ct.interconnect(
+            (build_rigid_body(), build_forces_moments(config), build_mass(config)) + ((build_actuators(config),) if actuated else ())
+            + (build_euler_angles(), build_airdata(), build_environment()), # subsystems with states are listed first
+            name="vehicle",
+            inplist=[f'actuators.{name}_command' if name in actuated else name for name in vehicle_inputs], inputs=vehicle_inputs,
+            outlist=vehicle_outputs, outputs=vehicle_outputs
+        )
+    system.params = config
+    return system
+
+def __getattr__(name):
+    # `vehicle` and `vehicle_fused` are built on first access so importing this module has no side effects
+    if name == 'vehicle':
+        return build_vehicle()
+    if name == 'vehicle_fused':
+        return build_vehicle(fused=True)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 if __name__ == "__main__":
+    import control as ct
+    vehicle = build_vehicle()
     time_range = np.linspace(0, 1, 100)
     timeseries = ct.input_output_response(vehicle, T=time_range, X0=x0)
     # U=np.ones(len(time_range))*0.5, X0=x0)
@@ -0,0 +1,178 @@
+import numpy as np
+
+def signal(result, name):
+    # time history of a named output of a simulation result
+    return result.outputs[result.output_labels.index(name)]
+
+def plot_mission(result, show=True):
+    """
+    Plot air data, position, attitude, forces, rates and velocities of a mission result.
+    matplotlib is imported here so the simulation itself never depends on it.
+    """
+    import matplotlib.pyplot as plt
+
+    t = result.time
+
+    # Plot Air Data
+    fig, ax1 = plt.subplots()
+    line1, = ax1.plot(t, signal(result, 'airspeed'), label='airspeed')
+    ax2 = ax1.twinx()
+    line2, = ax2.plot(t, np.degrees(signal(result, 'alpha')), label='alpha', color='red')
+    line3, = ax2.plot(t, np.degrees(signal(result, 'beta')), label='beta')
+    ax1.set_xlabel('Time (s)')
+    ax1.set_ylabel('m/s')
+    ax2.set_ylabel('degrees')
+    plt.title('Air Data')
+    lines = [line1, line2, line3]
+    labels = [line.get_label() for line in lines]
+    ax1.legend(lines, labels)
+
+    # Plot 3D Vehicle Position
+    fig = plt.figure(figsize=(10, 8))
+    ax = fig.add_subplot(111, projection='3d')
+
+    x_pos = signal(result, 'x')
+    y_pos = signal(result, 'y')
+    altitude = -signal(result, 'z')
+
+    ax.plot(x_pos, y_pos, altitude)
+    ax.set_xlabel('X Position (m)')
+    ax.set_ylabel('Y Position (m)')
+    ax.set_zlabel('Altitude (m)')
+    ax.set_title('3D Vehicle Position')
+
+    # Add a colorbar to show time progression
+    scatter = ax.scatter(x_pos, y_pos, altitude, c=t, cmap='viridis')
+    cbar = fig.colorbar(scatter, ax=ax, label='Time (s)')
+
+    # Plot Euler Angles
+    fig, ax = plt.subplots()
+    phi = np.degrees(signal(result, 'phi'))
+    theta = np.degrees(signal(result, 'theta'))
+    psi = np.degrees(signal(result, 'psi'))
+
+    ax.plot(t, phi, label='Roll (φ)')
+    ax.plot(t, theta, label='Pitch (θ)')
+    ax.plot(t, psi, label='Yaw (ψ)')
+
+    ax.set_xlabel('Time (s)')
+    ax.set_ylabel('Angle (degrees)')
+    ax.set_title('Euler Angles')
+    ax.legend()
+    plt.grid(True)
+
+    # Plot Aerodynamic, Propulsion, and Gravity Forces
+    fig, (ax1, ax2, ax3) = plt.subplots(3, 1, figsize=(10, 15), sharex=True)
+
+    # Aerodynamic Forces
+    Fx_aero = signal(result, 'Fx_aero')
+    Fy_aero = signal(result, 'Fy_aero')
+    Fz_aero = signal(result, 'Fz_aero')
+
+    ax1.plot(t, Fx_aero, label='Fx_aero')
+    ax1.plot(t, Fy_aero, label='Fy_aero')
+    ax1.plot(t, Fz_aero, label='Fz_aero')
+    ax1.set_ylabel('Force (N)')
+    ax1.set_title('Aerodynamic Forces')
+    ax1.legend()
+    ax1.grid(True)
+
+    # Propulsion Forces
+    Fx_prop = signal(result, 'Fx_prop')
+    Fy_prop = signal(result, 'Fy_prop')
+    Fz_prop = signal(result, 'Fz_prop')
+
+    ax2.plot(t, Fx_prop, label='Fx_prop')
+    ax2.plot(t, Fy_prop, label='Fy_prop')
+    ax2.plot(t, Fz_prop, label='Fz_prop')
+    ax2.set_ylabel('Force (N)')
+    ax2.set_title('Propulsion Forces')
+    ax2.legend()
+    ax2.grid(True)
+
+    # Gravity Force
+    Fx_grav = signal(result, 'Fx_grav')
+    Fy_grav = signal(result, 'Fy_grav')
+    Fz_grav = signal(result, 'Fz_grav')
+    # F_grav_norm = np.sqrt(Fx_grav**2 + Fy_grav**2 + Fz_grav**2)
+
+    ax3.plot(t, Fx_grav, label='Fx_grav')
+    ax3.plot(t, Fy_grav, label='Fy_grav')
+    ax3.plot(t, Fz_grav, label='Fz_grav')
+    ax3.set_xlabel('Time (s)')
+    ax3.set_ylabel('Force (N)')
+    ax3.set_title('Gravity Forces')
+    ax3.legend()
+    ax3.grid(True)
+
+    # Plot Angular Rates
+    fig, ax = plt.subplots(figsize=(10, 5))
+
+    p = signal(result, 'p')
+    q = signal(result, 'q')
+    r = signal(result, 'r')
+
+    ax.plot(t, p, label='p (roll rate)')
+    ax.plot(t, q, label='q (pitch rate)')
+    ax.plot(t, r, label='r (yaw rate)')
+
+    ax.set_xlabel('Time (s)')
+    ax.set_ylabel('Angular Rate (rad/s)')
+    ax.set_title('Angular Rates')
+    ax.legend()
+    ax.grid(True)
+
+    # Plot Velocity Components
+    fig, ax = plt.subplots(figsize=(10, 5))
+
+    u = signal(result, 'u')
+    v = signal(result, 'v')
+    w = signal(result, 'w')
+
+    ax.plot(t, u, label='u (forward velocity)')
+    ax.plot(t, v, label='v (lateral velocity)')
+    ax.plot(t, w, label='w (vertical velocity)')
+
+    ax.set_xlabel('Time (s)')
+    ax.set_ylabel('Velocity (m/s)')
+    ax.set_title('Velocity Components')
+    ax.legend()
+    ax.grid(True)
+
+    # Plot Angle of Attack
+    fig, ax = plt.subplots(figsize=(10, 5))
+
+    w = signal(result, 'w')
+    u = signal(result, 'u')
+
+    alpha = np.arctan2(w, u)
+
+    ax.plot(t, alpha, label='Angle of Attack')
+
+    ax.set_xlabel('Time (s)')
+    ax.set_ylabel('Angle (rad)')
+    ax.set_title('Angle of Attack')
+    ax.legend()
+    ax.grid(True)
+
+    # Plot Overall Forces
+    fig, ax = plt.subplots(figsize=(10, 5))
+
+    Fx = signal(result, 'Fx')
+    Fy = signal(result, 'Fy')
+    Fz = signal(result, 'Fz')
+
+    ax.plot(t, Fx, label='Fx')
+    ax.plot(t, Fy, label='Fy')
+    ax.plot(t, Fz, label='Fz')
+
+    ax.set_xlabel('Time (s)')
+    ax.set_ylabel('Force (N)')
+    ax.set_title('Overall Forces')
+    ax.legend()
+    ax.grid(True)
+
+    plt.tight_layout()
+
+    if show:
+        plt.show()
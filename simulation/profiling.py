@@ -0,0 +1,148 @@
+import json
+import threading
+import time
+from array import array
+from contextlib import contextmanager
+from functools import partial
+from types import SimpleNamespace
+import numpy as np
+
+# Bump when the report layout changes
+PROFILE_VERSION = 1
+
+# Model functions called by the fused vehicle, timed under these names
+fused_components = {
+    'mass_properties': 'mass',
+    'air_data_dcm': 'airdata',
+    'calc_aerodynamics_outputs': 'aerodynamics',
+    'propulsion_forces_moments': 'propulsion',
+    'engine_dynamics': 'propulsion',
+    'gravity_body': 'gravity',
+    'ground_forces_moments': 'ground',
+    'vehicle_surfaces': 'actuators',
+    'actuator_dynamics': 'actuators',
+    'translation_acceleration': 'rigid_body',
+    'rotation_acceleration': 'rigid_body',
+    'kinematics_rotation': 'rigid_body',
+    'dcm_to_euler_zyx': 'euler_angles',
+}
+
+class Profiler:
+    """
+    Call counts and timings of instrumented functions, with their call stacks.
+
+    Every call is timed; the report gives per-function totals and percentiles, and the self time of
+    every call stack in the collapsed format of flamegraph tools ("a;b;c <microseconds>").
+    Solver statistics (steps, rejected steps, events, ...) are collected in `solver` (see
+    integrators.simulate(stats=...)).
+    """
+    def __init__(self):
+        self.samples = {}
+        self.stacks = {}
+        self.solver = {}
+        self.local = threading.local()
+        self.lock = threading.Lock()
+
+    def timed(self, name, function):
+        # wrapper of `function` recording its calls under `name`
+        def wrapper(*args, **kwargs):
+            local = self.local
+            if not hasattr(local, 'stack'):
+                local.stack, local.children = [], []
+            local.stack.append(name)
+            local.children.append(0.0)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                key = ';'.join(local.stack)
+                local.stack.pop()
+                children = local.children.pop()
+                if local.children:
+                    local.children[-1] += elapsed
+                with self.lock:
+                    self.samples.setdefault(name, array('d')).append(elapsed)
+                    self.stacks[key] = self.stacks.get(key, 0.0) + elapsed - children
+        wrapper.__wrapped__ = function
+        return wrapper
+
+    def report(self):
+        """
+        Returns:
+        dict
+            'functions': calls, total, mean, p50, p90, p99 and max (s) by name, slowest total first;
+            'solver': solver statistics; 'stacks': self time (s) by call stack
+        """
+        functions = {}
+        for name, samples in self.samples.items():
+            samples = np.frombuffer(samples, dtype=float)
+            p50, p90, p99 = np.percentile(samples, [50, 90, 99])
+            functions[name] = {
+                'calls': len(samples), 'total': samples.sum(), 'mean': samples.mean(),
+                'p50': p50, 'p90': p90, 'p99': p99, 'max': samples.max(),
+            }
+        functions = dict(sorted(functions.items(), key=lambda item: -item[1]['total']))
+        return {
+            'version': PROFILE_VERSION,
+            'functions': {name: {key: float(value) if key != 'calls' else value for key, value in stats.items()} for name, stats in functions.items()},
+            'solver': dict(self.solver),
+            'stacks': dict(self.stacks),
+        }
+
+    def folded(self):
+        # collapsed stacks with the self time in integer microseconds
+        return ''.join(f'{key} {round(seconds * 1e6)}\n' for key, seconds in sorted(self.stacks.items()))
+
+    def write(self, path):
+        # JSON report at `path` and the collapsed stacks next to it (`path` with a .folded suffix)
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=2)
+        stem = path[:-5] if path.endswith('.json') else path
+        with open(stem + '.folded', 'w') as f:
+            f.write(self.folded())
+
+def subsystems(system):
+    # the system and every subsystem of an interconnection, depth first
+    yield system
+    for subsystem in getattr(system, 'syslist', []):
+        yield from subsystems(subsystem)
+
+@contextmanager
+def profile(system, profiler=None):
+    """
+    Instrument a system for the duration of the block.
+
+    The dynamics and output evaluations of the system and of every subsystem are timed under
+    '<name>.update' and '<name>.output'; for the fused vehicle the model functions it calls are
+    timed under the subsystem they belong to (see fused_components). Only this system is
+    instrumented (other vehicles, and the fused model module, are left alone), and only for the
+    duration of the block, so profiling adds no cost when it is not used.
+
+    Yields:
+    Profiler
+    """
+    from .models import fused
+
+    profiler = Profiler() if profiler is None else profiler
+    patched = []
+    for subsystem in subsystems(system):
+        for method, kind in (('_rhs', 'update'), ('_out', 'output')):
+            patched.append((subsystem, method, subsystem.__dict__.get(method)))
+            setattr(subsystem, method, profiler.timed(f'{subsystem.name}.{kind}', getattr(subsystem, method)))
+    models = fused.vehicle_models(system)
+    if models is not None:
+        # the vehicle's own dynamics and outputs call timed copies of the model functions
+        timed = SimpleNamespace(**{function: profiler.timed(fused_components[function], model) if function in fused_components else model
+                                   for function, model in vars(models).items()})
+        for attribute, function in (('updfcn', fused.fused_dynamics), ('outfcn', fused.fused_outputs)):
+            patched.append((system, attribute, system.__dict__.get(attribute)))
+            setattr(system, attribute, partial(function, models=timed))
+    try:
+        yield profiler
+    finally:
+        for target, attribute, original in reversed(patched):
+            if original is None:
+                delattr(target, attribute)
+            else:
+                setattr(target, attribute, original)
@@ -0,0 +1,156 @@
+import argparse
+import itertools
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+from .mission import trimmed_initial_state, vehicle_initial_state
+from analysis.trim import solve_trim, TrimCache
+
+# Scenario keys (all optional):
+#   'airspeed', 'altitude': initial/trim condition
+#   'alpha_offset', 'elevator_offset', 'throttle_offset', 'ailerons': offsets applied to the trim solution
+#   'schedule': {input name: (breakpoint times, values)} added to the trimmed inputs (linear between breakpoints)
+#   'state_noise': {state name: standard deviation} of a seeded perturbation of the initial state
+default_scenario = {
+    'airspeed': 30,
+    'altitude': 0,
+    'alpha_offset': 0.0,
+    'elevator_offset': 0.0,
+    'throttle_offset': 0.0,
+    'ailerons': 0.0,
+    'schedule': {},
+    'state_noise': {},
+}
+
+# Per-process state: the vehicle is built once per worker and trims are solved once per flight condition
+_vehicle = None
+_trim_cache = None
+
+def scenario_grid(**axes):
+    # Cartesian product of scenario values, e.g. scenario_grid(airspeed=[25, 30], altitude=[0, 500])
+    names = list(axes)
+    return [dict(zip(names, values)) for values in itertools.product(*axes.values())]
+
+def scenario_seed(seed, index):
+    # Reproducible per-scenario seed: depends only on the run seed and the scenario index, not on the worker
+    return np.random.SeedSequence(seed, spawn_key=(index,))
+
+def _init_worker(fused, trim_cache_path):
+    global _vehicle, _trim_cache
+    from .models.vehicle import build_vehicle
+
+    _vehicle = build_vehicle(fused=fused)
+    _trim_cache = TrimCache(trim_cache_path)
+
+def _trim(airspeed, altitude):
+    return solve_trim(_vehicle, {'airspeed': airspeed, 'altitude': altitude}, cache=_trim_cache)
+
+def run_scenario(vehicle, scenario, trim_condition, time_range, rng):
+    import control as ct
+
+    scenario = {**default_scenario, **scenario}
+    trim_alpha, trim_throttle, trim_elevator = trim_condition
+
+    initial_state = trimmed_initial_state(trim_condition, scenario, scenario['alpha_offset'])
+    for name, sigma in sorted(scenario['state_noise'].items()):
+        initial_state[name] += sigma * rng.standard_normal()
+
+    trim_inputs = {
+        'elevator': trim_elevator + scenario['elevator_offset'],
+        'ailerons': scenario['ailerons'],
+        'throttle': trim_throttle + scenario['throttle_offset'],
+    }
+    initial_state['throttle'] = trim_inputs['throttle']
+    x0 = vehicle_initial_state(initial_state, scenario, [trim_inputs['elevator'], trim_inputs['ailerons']], vehicle.params)
+
+    inputs = np.tile(np.array([trim_inputs[key] for key in vehicle.input_labels])[:, None], len(time_range))
+    for name, (times, values) in scenario['schedule'].items():
+        inputs[vehicle.find_input(name)] += np.interp(time_range, times, values)
+
+    return ct.input_output_response(vehicle, T=time_range, X0=x0, U=inputs)
+
+def run_shard(shard_index, indexed_scenarios, output_dir, time_range, seed):
+    # Run a list of (index, scenario) pairs in one worker and write them to a single shard file
+    states, outputs, inputs, trims = [], [], [], []
+    for index, scenario in indexed_scenarios:
+        scenario = {**default_scenario, **scenario}
+        rng = np.random.default_rng(scenario_seed(seed, index))
+        trim_condition = _trim(scenario['airspeed'], scenario['altitude'])
+        timeseries = run_scenario(_vehicle, scenario, trim_condition, time_range, rng)
+
+        states.append(timeseries.states)
+        outputs.append(timeseries.outputs)
+        inputs.append(timeseries.inputs)
+        trims.append(trim_condition)
+
+    path = os.path.join(output_dir, f'shard_{shard_index:04d}.npz')
+    np.savez(path, index=np.array([index for index, _ in indexed_scenarios]), time=time_range,
+             states=np.array(states), outputs=np.array(outputs), inputs=np.array(inputs), trim=np.array(trims))
+    return path
+
+def merge_shards(paths, output_dir, remove=True):
+    # Merge the shard files of a run (the paths returned by run_shard) into results.npz, ordered by scenario index
+    if not paths:
+        raise ValueError("No shard files to merge")
+    shards = []
+    for path in paths:
+        with np.load(path) as shard:
+            shards.append({key: shard[key] for key in shard.files})
+
+    index = np.concatenate([shard['index'] for shard in shards])
+    order = np.argsort(index)
+    results = {key: np.concatenate([shard[key] for shard in shards])[order] for key in ('index', 'states', 'outputs', 'inputs', 'trim')}
+    results['time'] = shards[0]['time']
+
+    np.savez(os.path.join(output_dir, 'results.npz'), **results)
+    if remove:
+        for path in paths:
+            os.remove(path)
+    return results
+
+def run_scenarios(scenarios, output_dir, time=20, dt=0.1, seed=0, max_workers=None, n_shards=None, fused=True, trim_cache_path=None):
+    """
+    Run scenarios in parallel across a process pool.
+
+    Each worker builds the vehicle once and caches trim solutions (persisted to
+    trim_cache_path when given, so later runs skip the solves). Scenarios are split into
+    shards (one per worker by default), each written to its own file and merged at the end.
+
+    Returns:
+    dict
+        Merged results: index, time, states, outputs, inputs (stacked over scenarios) and trim
+    """
+    if not scenarios:
+        raise ValueError("No scenarios to run")
+    os.makedirs(output_dir, exist_ok=True)
+    max_workers = max_workers or os.cpu_count()
+    n_shards = min(n_shards or max_workers, len(scenarios))
+    time_range = np.arange(0, time + dt, dt)
+
+    indexed_scenarios = list(enumerate(scenarios))
+    shards = [indexed_scenarios[k::n_shards] for k in range(n_shards)]
+
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(fused, trim_cache_path)) as executor:
+        futures = [executor.submit(run_shard, k, shard, output_dir, time_range, seed) for k, shard in enumerate(shards)]
+        paths = [future.result() for future in futures]
+
+    return merge_shards(paths, output_dir)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Run a grid of trimmed scenarios in parallel')
+    parser.add_argument('--airspeed', type=float, nargs='+', default=[30])
+    parser.add_argument('--altitude', type=float, nargs='+', default=[0])
+    parser.add_argument('--alpha-offset', type=float, nargs='+', default=[0.0])
+    parser.add_argument('--time', type=float, default=20)
+    parser.add_argument('--dt', type=float, default=0.1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--output', default='results')
+    parser.add_argument('--trim-cache', default=None, help='JSON file of cached trim solutions')
+    args = parser.parse_args()
+
+    scenarios = scenario_grid(airspeed=args.airspeed, altitude=args.altitude, alpha_offset=args.alpha_offset)
+    results = run_scenarios(scenarios, args.output, time=args.time, dt=args.dt, seed=args.seed, max_workers=args.workers,
+                            trim_cache_path=args.trim_cache)
+    print(f"{len(scenarios)} scenarios written to {os.path.join(args.output, 'results.npz')}")
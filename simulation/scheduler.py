@@ -0,0 +1,250 @@
+from fractions import Fraction
+import numpy as np
+
+from .integrators import event_function, implicit_methods, implicit_states, output_function, rk4_states, rk45_states
+from .jacobian import system_sparsity
+
+class DiscreteTask:
+    """
+    Discrete-time block (sensor, controller, actuator logic, ...) run by the scheduler at its own rate.
+
+    At every run the task reads the latest values of its inputs, publishes
+    outputs = output(t, x, u, params) and advances its state x = update(t, x, u, params), like a
+    discrete-time ct.nlsys. The outputs are held until its next run (sample and hold).
+
+    Inputs:
+    name: str
+    period: float
+        Time between runs (s), e.g. 1/400
+    output: function
+        output(t, x, u, params) -> (len(outputs),) array-like
+    inputs, outputs: list of str
+        Signal names. Inputs are vehicle outputs or outputs of other tasks; outputs named like
+        vehicle inputs drive the vehicle
+    update: function, optional
+        update(t, x, u, params) -> next state; stateless without one
+    initial_state: array-like
+    initial_outputs: array-like, optional
+        Values held before the first run; zeros by default (vehicle inputs start at U0 instead)
+    offset: float
+        Time of the first run after t = 0 (s, a multiple of the scheduler tick)
+    params: dict, optional
+    """
+    def __init__(self, name, period, output, inputs, outputs, update=None, initial_state=(), initial_outputs=None, offset=0.0, params=None):
+        self.name = name
+        self.period = period
+        self.output = output
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.update = update
+        self.initial_state = np.array(initial_state, dtype=float)
+        self.initial_outputs = None if initial_outputs is None else np.array(initial_outputs, dtype=float)
+        self.offset = offset
+        self.params = {} if params is None else params
+
+    @classmethod
+    def from_system(cls, system, initial_state=None, offset=0.0):
+        # task running a discrete-time ct.nlsys at its sampling time
+        if not system.dt or system.dt is True:
+            raise ValueError(f"System '{system.name}' needs a sampling time (dt > 0) to run as a task")
+        initial_state = np.zeros(system.nstates) if initial_state is None else initial_state
+        return cls(system.name, system.dt, lambda t, x, u, params: system.output(t, x, u, params), system.input_labels,
+                   system.output_labels, lambda t, x, u, params: system.dynamics(t, x, u, params), initial_state,
+                   offset=offset, params=system.params)
+
+def ticks(seconds, tick):
+    # whole number of scheduler ticks in a period or offset
+    count = Fraction(seconds).limit_denominator(10**9) / tick
+    if count.denominator != 1:
+        raise ValueError(f"{seconds} s is not a multiple of the scheduler tick ({float(tick)} s)")
+    return int(count)
+
+class Scheduler:
+    """
+    Runs the discrete tasks of a closed loop around a vehicle.
+
+    The tick is the greatest common divisor of the task periods. At every tick the due tasks run in
+    list order (e.g. sensors, then controllers, then actuators), reading vehicle outputs sampled at
+    the start of the tick; the vehicle inputs are held between ticks.
+
+    Inputs:
+    tasks: list of DiscreteTask
+    system: vehicle system
+    U0: float or (n_inputs,) array-like
+        Vehicle inputs held until a task writes them
+    """
+    def __init__(self, tasks, system, U0=0.):
+        self.tasks = list(tasks)
+        self.system = system
+        self.tick = Fraction(0)
+        for task in self.tasks:
+            self.tick = _gcd(self.tick, Fraction(task.period).limit_denominator(10**9))
+        self.periods = [ticks(task.period, self.tick) for task in self.tasks]
+        self.offsets = [ticks(task.offset, self.tick) for task in self.tasks]
+
+        # signal store: vehicle inputs, then the task outputs that are not vehicle inputs
+        self.signals = list(system.input_labels)
+        writers = {}
+        for task in self.tasks:
+            for name in task.outputs:
+                if name in writers:
+                    raise ValueError(f"Signal '{name}' is written by tasks '{writers[name]}' and '{task.name}'")
+                writers[name] = task.name
+                if name not in self.signals:
+                    self.signals.append(name)
+        self.values = np.zeros(len(self.signals))
+        self.values[:system.ninputs] = np.broadcast_to(np.asarray(U0, dtype=float), (system.ninputs,))
+        for task in self.tasks:
+            if task.initial_outputs is not None:
+                self.values[[self.signals.index(name) for name in task.outputs]] = task.initial_outputs
+
+        # vehicle outputs read by the tasks, sampled once per tick when a due task reads one
+        self.sampled = [name for task in self.tasks for name in task.inputs if name not in self.signals]
+        self.sampled = list(dict.fromkeys(self.sampled))
+        unknown = set(self.sampled) - set(system.output_labels)
+        if unknown:
+            raise ValueError(f"Task inputs are neither vehicle outputs nor task outputs: {', '.join(sorted(unknown))}")
+        _, self.sample_outputs = output_function(system, self.sampled) if self.sampled else (None, None)
+        self.samples = np.zeros(len(self.sampled))
+
+        # every task input as an index into signals + samples, every output into signals
+        names = self.signals + self.sampled
+        self.input_index = [np.array([names.index(name) for name in task.inputs], dtype=int) for task in self.tasks]
+        self.output_index = [np.array([self.signals.index(name) for name in task.outputs], dtype=int) for task in self.tasks]
+        self.reads_vehicle = [any(name in self.sampled for name in task.inputs) for task in self.tasks]
+        self.states = [task.initial_state.copy() for task in self.tasks]
+        self.runs = 0
+
+    def tick_times(self, t0, t_end):
+        # scheduler ticks in [t0, t_end] as tick numbers and times
+        first = int(np.ceil(Fraction(t0).limit_denominator(10**9) / self.tick))
+        last = int(np.floor(Fraction(t_end).limit_denominator(10**9) / self.tick))
+        numbers = np.arange(first, last + 1)
+        return numbers, numbers * float(self.tick)
+
+    def run(self, number, t, x):
+        # run the tasks due at tick `number` (time t) with the vehicle at state x
+        sampled = False
+        for i, task in enumerate(self.tasks):
+            if (number - self.offsets[i]) % self.periods[i] or number < self.offsets[i]:
+                continue
+            if self.reads_vehicle[i] and not sampled:
+                self.samples = np.asarray(self.sample_outputs(t, x, self.vehicle_inputs()), dtype=float)
+                sampled = True
+            u = np.concatenate((self.values, self.samples))[self.input_index[i]]
+            self.values[self.output_index[i]] = task.output(t, self.states[i], u, task.params)
+            if task.update is not None:
+                self.states[i] = np.asarray(task.update(t, self.states[i], u, task.params), dtype=float)
+            self.runs += 1
+
+    def vehicle_inputs(self):
+        return self.values[:self.system.ninputs].copy()
+
+def _gcd(a, b):
+    # greatest common divisor of two non-negative fractions
+    while b:
+        a, b = b, a % b
+    return a
+
+def accumulate_stats(total, run):
+    # add the statistics of one integrator run to the totals of a closed-loop run
+    for key, value in run.items():
+        if key not in total or isinstance(value, str) or value is None or total[key] is None:
+            total[key] = value
+        else:
+            total[key] += value
+
+def simulate_closed_loop(system, T, X0, tasks, U0=0., method='rk4', outputs=None, substeps=1, rtol=1e-6, atol=1e-8, max_step=np.inf,
+                         contact=None, contact_max_step=np.inf, stats=None):
+    """
+    Simulate a vehicle in closed loop with discrete tasks running at their own rates.
+
+    The continuous integrator runs from tick to tick (and to the recording times in between) with
+    the vehicle inputs held; the tasks run between the integrator runs, never inside their stages.
+    The integrators are those of simulation.integrators.simulate; the adaptive ones keep their step
+    size (and Jacobian) from one interval to the next.
+
+    Inputs:
+    system: vehicle system
+    T: (n_times,) np.array
+        Recording times
+    X0: (n_states,) np.array
+    tasks: list of DiscreteTask
+    U0: float or (n_inputs,) array-like
+        Vehicle inputs until a task writes them
+    method, substeps, rtol, atol, max_step, contact, contact_max_step:
+        see integrators.simulate
+    outputs: list of str, optional
+        Vehicle outputs to record, defaults to every output
+    stats: dict, optional
+        Filled with the integrator statistics, the ticks and the task runs
+
+    Returns:
+    ct.TimeResponseData
+        recorded states, vehicle inputs and the selected vehicle outputs followed by the task outputs
+        that are not vehicle inputs
+    """
+    import control as ct
+
+    T = np.asarray(T, dtype=float)
+    scheduler = Scheduler(tasks, system, U0)
+    output_labels, output = output_function(system, outputs)
+    if contact is None and isinstance(getattr(system, 'params', None), dict):
+        contact = event_function(system.params)
+    f = system.dynamics
+    carry = {}
+
+    # integration points: the ticks, and the recording times that do not fall on one
+    tolerance = 1e-9 * float(scheduler.tick)
+    numbers, tick_times = scheduler.tick_times(T[0] - tolerance, T[-1] + tolerance)
+    on_tick = np.zeros(len(T), dtype=bool)
+    if len(tick_times):
+        nearest = np.minimum(np.searchsorted(tick_times, T - tolerance), len(tick_times) - 1)
+        on_tick = np.abs(tick_times[nearest] - T) <= tolerance
+    points = np.concatenate((tick_times, T[~on_tick]))
+    tick_number = np.concatenate((numbers, np.full(np.count_nonzero(~on_tick), -1)))
+    order = np.argsort(points, kind='stable')
+    points, tick_number = points[order], tick_number[order]
+    recorded = np.searchsorted(points, T - tolerance)
+
+    states = np.empty((system.nstates, len(T)))
+    inputs = np.empty((system.ninputs, len(T)))
+    task_signals = scheduler.signals[system.ninputs:]
+    y = np.empty((len(output_labels) + len(task_signals), len(T)))
+    total = {}
+    x = np.array(X0, dtype=float)
+    r = 0
+    for k, t in enumerate(points):
+        if tick_number[k] >= 0:
+            scheduler.run(tick_number[k], t, x)
+        u = scheduler.vehicle_inputs()
+        while r < len(T) and recorded[r] == k:
+            states[:, r] = x
+            inputs[:, r] = u
+            y[:len(output_labels), r] = output(T[r], x, u)
+            y[len(output_labels):, r] = scheduler.values[system.ninputs:]
+            r += 1
+        if k == len(points) - 1:
+            break
+
+        interval, U = points[k:k + 2], np.column_stack((u, u))
+        run = {}
+        if method == 'rk4':
+            stepper = rk4_states(f, interval, U, x, substeps, contact, contact_max_step, run)
+        elif method == 'rk45':
+            stepper = rk45_states(f, interval, U, x, rtol, atol, max_step, contact, contact_max_step, run, carry)
+        elif method in implicit_methods:
+            stepper = implicit_states(f, interval, U, x, method, rtol, atol, max_step, contact, contact_max_step, run,
+                                      system_sparsity(system), carry)
+        else:
+            raise ValueError(f"Unknown integration method '{method}'")
+        for x in stepper:
+            pass
+        accumulate_stats(total, run)
+
+    if stats is not None:
+        stats.update(total)
+        stats.update({'ticks': len(numbers), 'task_runs': scheduler.runs})
+    return ct.TimeResponseData(
+        T, y, states, inputs, output_labels=output_labels + task_signals, state_labels=system.state_labels,
+        input_labels=system.input_labels, sysname=system.name)
@@ -0,0 +1,416 @@
+import hashlib
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from .configuration import aero_controls
+from .models.aerodynamics import array_model
+from utilities.interpolation import Interpolator
+
+# Bump when the saved surrogate layout changes
+SURROGATE_VERSION = 1
+
+# Inputs of the aerodynamics model (see models.aerodynamics), one column per input
+model_inputs = ['airspeed', 'alpha', 'beta', 'p', 'q', 'r', 'density'] + aero_controls
+
+# The surrogate fits the force and moment divided by the dynamic pressure as functions of these
+# features: rates divided by the airspeed (rad/m, the nondimensional rates without their reference
+# lengths), and the airspeed and density for what dynamic pressure scaling does not capture
+features = ['alpha', 'beta', 'p_hat', 'q_hat', 'r_hat'] + aero_controls + ['airspeed', 'density']
+
+# Sampled envelope: (low, high) of every model input (m/s, rad, rad/s, kg/m^3)
+default_envelope = {
+    'airspeed': (15.0, 60.0),
+    'alpha': (np.radians(-4), np.radians(16)),
+    'beta': (np.radians(-10), np.radians(10)),
+    'p': (-0.5, 0.5),
+    'q': (-0.5, 0.5),
+    'r': (-0.5, 0.5),
+    'density': (0.9, 1.23),
+    'elevator': (np.radians(-30), np.radians(25)),
+    'ailerons': (np.radians(-25), np.radians(25)),
+}
+
+# Table grid: number of points along each feature (a single point holds the feature at mid-range)
+default_grid = {'alpha': 13, 'beta': 5, 'p_hat': 3, 'q_hat': 3, 'r_hat': 3, 'elevator': 7, 'ailerons': 5, 'airspeed': 2, 'density': 1}
+
+# Airspeed floor of the rate features
+min_airspeed = 1e-3
+
+def dynamic_pressure(inputs):
+    return 0.5 * inputs[:, 6] * inputs[:, 0]**2
+
+def input_features(inputs):
+    # (N, len(features)) features of rows of model inputs
+    airspeed = np.maximum(inputs[:, 0], min_airspeed)
+    return np.column_stack((inputs[:, 1:3], inputs[:, 3:6] / airspeed[:, None], inputs[:, 7:], inputs[:, 0], inputs[:, 6]))
+
+def feature_inputs(values):
+    # (N, len(model_inputs)) model inputs of rows of features
+    airspeed = values[:, -2]
+    return np.column_stack((airspeed, values[:, 0:2], values[:, 2:5] * airspeed[:, None], values[:, -1], values[:, 5:-2]))
+
+def envelope_bounds(envelope):
+    # lower and upper model inputs of an envelope (missing inputs from default_envelope)
+    envelope = {**default_envelope, **(envelope or {})}
+    unknown = set(envelope) - set(model_inputs)
+    if unknown:
+        raise ValueError(f"Unknown envelope inputs: {', '.join(sorted(unknown))}")
+    lower, upper = np.array([envelope[name] for name in model_inputs], dtype=float).T
+    if lower[0] <= 0 or np.any(lower > upper):
+        raise ValueError("The envelope needs a positive airspeed and low <= high for every input")
+    return lower, upper
+
+def feature_bounds(envelope):
+    # range of every feature over the envelope (the rate features are extreme at its corners)
+    corners = np.array(list(itertools.product(*zip(*envelope_bounds(envelope)))))
+    values = input_features(corners)
+    return values.min(axis=0), values.max(axis=0)
+
+def sample_inputs(envelope, n_samples, seed=0):
+    # uniformly distributed model inputs in the envelope
+    lower, upper = envelope_bounds(envelope)
+    return lower + (upper - lower) * np.random.default_rng(seed).random((n_samples, len(model_inputs)))
+
+def evaluate_model(params, inputs):
+    # (N, 6) force and moment of the aerodynamics model of `params` at rows of model inputs
+    model = array_model(params['aerodynamics_model'])
+    surfaces = {name: inputs[:, 7 + j] for j, name in enumerate(aero_controls)}
+    F, M = model(*inputs[:, :6].T, surfaces, {**params, 'density': inputs[:, 6]})
+    return np.hstack((F, M))
+
+# Per-process parameters of the sampling workers
+_params = None
+
+def _init_worker(params):
+    global _params
+    from . import configuration
+
+    _params = configuration.parameters if params is None else params
+
+def _evaluate_chunk(inputs):
+    return evaluate_model(_params, inputs)
+
+def sample_model(inputs, params=None, max_workers=None, chunk_size=2000):
+    """
+    Evaluate the aerodynamics model at many points across a process pool.
+
+    Inputs:
+    inputs: (N, len(model_inputs)) np.array
+    params: dict, optional
+        Vehicle parameters with the model; defaults to configuration.parameters. They are sent to
+        every worker, so the model must be importable there (e.g. a module-level function).
+    max_workers: int, optional
+        Number of processes (all cores by default); 1 evaluates in this process
+
+    Returns:
+    np.array
+        (N, 6) force and moment
+    """
+    chunks = [inputs[i:i + chunk_size] for i in range(0, len(inputs), chunk_size)]
+    if max_workers == 1:
+        _init_worker(params)
+        return np.concatenate([_evaluate_chunk(chunk) for chunk in chunks])
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(params,)) as executor:
+        return np.concatenate(list(executor.map(_evaluate_chunk, chunks)))
+
+def polynomial_exponents(active, degree):
+    # exponents (n_terms, len(features)) of every monomial of the active features up to the total degree
+    exponents = [np.zeros(len(features), dtype=int)]
+    for total in range(1, degree + 1):
+        for combination in itertools.combinations_with_replacement(np.flatnonzero(active), total):
+            exponent = np.zeros(len(features), dtype=int)
+            np.add.at(exponent, list(combination), 1)
+            exponents.append(exponent)
+    return np.array(exponents)
+
+class AerodynamicsSurrogate:
+    """
+    Vectorized aerodynamics model fitted offline to another model (see fit_surrogate).
+
+    The force and moment divided by the dynamic pressure are a polynomial of the features, or a
+    multilinear table over a grid of them. Queries outside the fitted envelope are clamped to it.
+    error_max and error_rms are the errors (per force and moment component, divided by the dynamic
+    pressure) measured on points of the envelope that were not used for the fit.
+
+    Inputs:
+    kind: str
+        'polynomial' or 'table'
+    envelope: dict
+        Model input ranges the surrogate was fitted over
+    lower, upper: np.array
+        Feature bounds
+    exponents, coefficients: np.array
+        Polynomial terms (n_terms, len(features)) and their coefficients (n_terms, 6) in features
+        scaled to [-1, 1]
+    grid_axes, values: list of np.array, np.array
+        Table axes of every feature and the (..., 6) values at the grid points
+    """
+    vectorized = True
+
+    def __init__(self, kind, envelope, lower, upper, exponents=None, coefficients=None, grid_axes=None, values=None,
+                 error_max=None, error_rms=None):
+        if kind not in ('polynomial', 'table'):
+            raise ValueError(f"Unknown surrogate kind '{kind}'")
+        self.kind = kind
+        self.envelope = {name: tuple(float(value) for value in bounds) for name, bounds in envelope.items()}
+        self.lower = np.asarray(lower, dtype=float)
+        self.upper = np.asarray(upper, dtype=float)
+        self.center = (self.lower + self.upper) / 2
+        half_width = (self.upper - self.lower) / 2
+        self.half_width = np.where(half_width > 0, half_width, 1.0)
+        self.exponents = None if exponents is None else np.asarray(exponents, dtype=int)
+        if self.exponents is not None:
+            # every term is a lower term (its exponents less one of the last feature) times that feature
+            index = {tuple(exponent): term for term, exponent in enumerate(self.exponents)}
+            self.factors = [(0, 0)]
+            for exponent in self.exponents[1:]:
+                feature = np.flatnonzero(exponent)[-1]
+                lower = exponent.copy()
+                lower[feature] -= 1
+                self.factors.append((index[tuple(lower)], feature))
+        self.coefficients = None if coefficients is None else np.asarray(coefficients, dtype=float)
+        self.grid_axes = None if grid_axes is None else [np.asarray(axis, dtype=float) for axis in grid_axes]
+        self.values = None if values is None else np.asarray(values, dtype=float)
+        self.table = None
+        if kind == 'table':
+            # features with a single grid point are held constant, so the table only spans the others
+            self.table_features = [i for i, axis in enumerate(self.grid_axes) if len(axis) > 1]
+            shape = [len(self.grid_axes[i]) for i in self.table_features]
+            self.table = Interpolator.from_grid([self.grid_axes[i] for i in self.table_features], self.values.reshape(shape + [6]))
+        self.error_max = np.full(6, np.nan) if error_max is None else np.asarray(error_max, dtype=float)
+        self.error_rms = np.full(6, np.nan) if error_rms is None else np.asarray(error_rms, dtype=float)
+
+    def basis(self, values):
+        # (N, n_terms) monomials of the features scaled to [-1, 1], each the product of a lower term and one feature
+        scaled = (values - self.center) / self.half_width
+        scaled = np.ascontiguousarray(scaled.T)
+        basis = np.empty((len(self.exponents), len(values)))
+        basis[0] = 1.0
+        for term, (parent, feature) in enumerate(self.factors[1:], 1):
+            np.multiply(basis[parent], scaled[feature], out=basis[term])
+        return basis.T
+
+    def predict(self, inputs):
+        # (N, 6) force and moment divided by the dynamic pressure at rows of model inputs
+        values = np.clip(input_features(inputs), self.lower, self.upper)
+        if self.kind == 'polynomial':
+            return self.basis(values) @ self.coefficients
+        return self.table.interpolate(values[:, self.table_features])
+
+    def evaluate(self, inputs):
+        # (N, 6) force and moment at rows of model inputs
+        return self.predict(inputs) * dynamic_pressure(inputs)[:, None]
+
+    def __call__(self, airspeed, alpha, beta, p, q, r, surfaces, params):
+        columns = [airspeed, alpha, beta, p, q, r, params['density']] + [surfaces[name] for name in aero_controls]
+        inputs = np.column_stack(np.broadcast_arrays(*[np.atleast_1d(np.asarray(column, dtype=float)) for column in columns]))
+        FM = self.evaluate(inputs)
+        return FM[:, :3], FM[:, 3:]
+
+    def fingerprint(self):
+        # sha256 of the fitted model (kind, envelope, feature bounds and terms or table), e.g. for trim cache keys
+        digest = hashlib.sha256()
+        digest.update(json.dumps([self.kind, self.envelope], sort_keys=True).encode())
+        arrays = [self.lower, self.upper]
+        if self.kind == 'polynomial':
+            arrays += [self.exponents, self.coefficients]
+        else:
+            arrays += self.grid_axes + [self.values]
+        for array in arrays:
+            array = np.ascontiguousarray(array)
+            digest.update(str(array.shape).encode())
+            digest.update(array.tobytes())
+        return digest.hexdigest()
+
+    def save(self, path):
+        # single compressed .npz file, read back with AerodynamicsSurrogate.load
+        arrays = {
+            'version': SURROGATE_VERSION,
+            'kind': self.kind,
+            'features': np.array(features),
+            'envelope': json.dumps(self.envelope),
+            'lower': self.lower,
+            'upper': self.upper,
+            'error_max': self.error_max,
+            'error_rms': self.error_rms,
+        }
+        if self.kind == 'polynomial':
+            arrays.update({'exponents': self.exponents.astype(np.int8), 'coefficients': self.coefficients})
+        else:
+            arrays.update({'grid_axes': np.concatenate(self.grid_axes), 'grid_shape': self.values.shape[:-1], 'values': self.values})
+        np.savez_compressed(path, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            if int(data['version']) != SURROGATE_VERSION or list(data['features']) != features:
+                raise ValueError(f"{path} is not a surrogate of this version of the aerodynamics interface")
+            kind = str(data['kind'])
+            arrays = {}
+            if kind == 'polynomial':
+                arrays = {'exponents': data['exponents'], 'coefficients': data['coefficients']}
+            else:
+                arrays = {'grid_axes': np.split(data['grid_axes'], np.cumsum(data['grid_shape'])[:-1]), 'values': data['values']}
+            return cls(kind, json.loads(str(data['envelope'])), data['lower'], data['upper'],
+                       error_max=data['error_max'], error_rms=data['error_rms'], **arrays)
+
+def fit_surrogate(envelope=None, kind='polynomial', degree=3, n_samples=4000, grid=None, n_validation=1000, params=None,
+                  max_workers=None, seed=0):
+    """
+    Sample the aerodynamics model over an envelope and fit a surrogate of it.
+
+    Inputs:
+    envelope: dict, optional
+        (low, high) of model inputs, overriding default_envelope
+    kind: str
+        'polynomial': least-squares polynomial of total `degree` fitted to n_samples random points;
+        'table': multilinear table sampled at the points of `grid`
+    grid: dict, optional
+        Number of table points along features, overriding default_grid
+    n_validation: int
+        Random points, independent of the fit, that measure the error bounds
+    params, max_workers:
+        see sample_model
+
+    Returns:
+    AerodynamicsSurrogate
+    """
+    envelope = {**default_envelope, **(envelope or {})}
+    lower, upper = feature_bounds(envelope)
+    validation = sample_inputs(envelope, n_validation, seed + 1)
+
+    if kind == 'polynomial':
+        inputs = np.concatenate((sample_inputs(envelope, n_samples, seed), validation))
+    elif kind == 'table':
+        grid = {**default_grid, **(grid or {})}
+        grid_axes = [np.linspace(lo, hi, grid[name]) if grid[name] > 1 else np.array([(lo + hi) / 2])
+                     for name, lo, hi in zip(features, lower, upper)]
+        nodes = np.stack(np.meshgrid(*grid_axes, indexing='ij'), axis=-1).reshape(-1, len(features))
+        inputs = np.concatenate((feature_inputs(nodes), validation))
+    else:
+        raise ValueError(f"Unknown surrogate kind '{kind}'")
+
+    FM = sample_model(inputs, params, max_workers)
+    targets = FM / dynamic_pressure(inputs)[:, None]
+    fitted = targets[:-n_validation or None]
+
+    if kind == 'polynomial':
+        surrogate = AerodynamicsSurrogate(kind, envelope, lower, upper, exponents=polynomial_exponents(upper > lower, degree))
+        basis = surrogate.basis(input_features(inputs[:len(fitted)]))
+        coefficients = np.linalg.lstsq(basis, fitted, rcond=None)[0]
+        # terms at the roundoff level of an output are dropped, so exact properties of the model
+        # (no side force without sideslip, ...) hold exactly for the surrogate too
+        scale = np.abs(coefficients).max(axis=0, initial=0.0)
+        surrogate.coefficients = np.where(np.abs(coefficients) > 1e-9 * scale, coefficients, 0.0)
+    else:
+        values = fitted.reshape([len(axis) for axis in grid_axes] + [6])
+        surrogate = AerodynamicsSurrogate(kind, envelope, lower, upper, grid_axes=grid_axes, values=values)
+
+    if n_validation:
+        error = surrogate.predict(validation) - targets[len(fitted):]
+        surrogate.error_max = np.abs(error).max(axis=0)
+        surrogate.error_rms = np.sqrt((error**2).mean(axis=0))
+    return surrogate
+
+def error_statistics(FM, reference):
+    # largest and RMS norm of the force and moment errors, also relative to the RMS norm of the reference
+    statistics = {'samples': len(FM)}
+    for name, columns in (('force', slice(0, 3)), ('moment', slice(3, 6))):
+        error = np.linalg.norm(FM[:, columns] - reference[:, columns], axis=1)
+        scale = np.sqrt((np.linalg.norm(reference[:, columns], axis=1)**2).mean())
+        rms = np.sqrt((error**2).mean())
+        statistics.update({f'{name}_max': float(error.max()), f'{name}_rms': float(rms),
+                           f'{name}_relative_rms': float(rms / scale) if scale > 0 else 0.0})
+    return statistics
+
+def accuracy_report(surrogate, params=None, regions=None, n_samples=2000, max_workers=None, seed=2):
+    """
+    Accuracy of a surrogate against the original model, over its envelope and by region.
+
+    Inputs:
+    surrogate: AerodynamicsSurrogate
+    params: dict, optional
+        Parameters with the original model (see sample_model)
+    regions: dict, optional
+        Number of equal bins along model inputs, {'alpha': 4, 'airspeed': 3, 'elevator': 3} by default
+
+    Returns:
+    dict
+        'overall' error statistics (N and N*m: largest and RMS error norm, RMS relative to the
+        model) and, for every region input, a list of the statistics of each bin with its 'range'
+    """
+    regions = {'alpha': 4, 'airspeed': 3, 'elevator': 3} if regions is None else regions
+    inputs = sample_inputs(surrogate.envelope, n_samples, seed)
+    reference = sample_model(inputs, params, max_workers)
+    FM = surrogate.evaluate(inputs)
+
+    report = {'overall': error_statistics(FM, reference), 'regions': {}}
+    for name, n_bins in regions.items():
+        column = inputs[:, model_inputs.index(name)]
+        edges = np.linspace(*surrogate.envelope[name], n_bins + 1)
+        bins = np.clip(np.searchsorted(edges, column, side='right') - 1, 0, n_bins - 1)
+        report['regions'][name] = [{'range': (float(edges[k]), float(edges[k + 1])), **error_statistics(FM[bins == k], reference[bins == k])}
+                                   for k in range(n_bins) if np.any(bins == k)]
+    return report
+
+def format_report(report):
+    # one line per region: force and moment RMS (relative) and largest errors
+    def line(label, statistics):
+        return (f"{label:<28}{statistics['samples']:>7}  force {statistics['force_rms']:10.4g} N ({statistics['force_relative_rms']:.2%}) max {statistics['force_max']:10.4g}"
+                f"  moment {statistics['moment_rms']:10.4g} N*m ({statistics['moment_relative_rms']:.2%}) max {statistics['moment_max']:10.4g}")
+    lines = [line('overall', report['overall'])]
+    for name, bins in report['regions'].items():
+        lines += [line(f"{name} [{row['range'][0]:.4g}, {row['range'][1]:.4g}]", row) for row in bins]
+    return '\n'.join(lines)
+
+def surrogate_parameters(surrogate, params=None):
+    """
+    Vehicle parameters that evaluate the aerodynamics with a surrogate instead of the original model.
+
+    Inputs:
+    surrogate: AerodynamicsSurrogate or str
+        The surrogate, or the path of a saved one
+    params: dict, optional
+        Defaults to configuration.parameters
+
+    Returns:
+    dict
+        A copy of params with the surrogate as 'aerodynamics_model' (to pass to build_vehicle)
+    """
+    from . import configuration
+
+    if isinstance(surrogate, (str, os.PathLike)):
+        surrogate = AerodynamicsSurrogate.load(surrogate)
+    params = configuration.parameters if params is None else params
+    return {**params, 'aerodynamics_model': surrogate}
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Fit a surrogate of the aerodynamics model and report its accuracy")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    fit_parser = subparsers.add_parser('fit', help="sample the model, fit and save a surrogate")
+    fit_parser.add_argument('path', help="output file (.npz)")
+    fit_parser.add_argument('--kind', choices=['polynomial', 'table'], default='polynomial')
+    fit_parser.add_argument('--degree', type=int, default=3, help="polynomial degree")
+    fit_parser.add_argument('--samples', type=int, default=4000, help="polynomial fit samples")
+    fit_parser.add_argument('--envelope', default=None, help="JSON {input: [low, high]} overriding the default envelope")
+    fit_parser.add_argument('--grid', default=None, help="JSON {feature: points} overriding the default table grid")
+    report_parser = subparsers.add_parser('report', help="accuracy of a saved surrogate against the model")
+    report_parser.add_argument('path', help="surrogate file (.npz)")
+    for subparser in (fit_parser, report_parser):
+        subparser.add_argument('--workers', type=int, default=None, help="sampling processes (default: all cores)")
+    args = parser.parse_args()
+
+    if args.command == 'fit':
+        surrogate = fit_surrogate(json.loads(args.envelope) if args.envelope else None, args.kind, args.degree, args.samples,
+                                  json.loads(args.grid) if args.grid else None, max_workers=args.workers)
+        surrogate.save(args.path)
+        print(f"error bounds (force/qbar in m^2, moment/qbar in m^3): max {np.array2string(surrogate.error_max, precision=3)}, "
+              f"rms {np.array2string(surrogate.error_rms, precision=3)}")
+    else:
+        surrogate = AerodynamicsSurrogate.load(args.path)
+    print(format_report(accuracy_report(surrogate, max_workers=args.workers)))
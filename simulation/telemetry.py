@@ -0,0 +1,181 @@
+import json
+import os
+import re
+import numpy as np
+
+# Bump when the telemetry layout changes
+TELEMETRY_VERSION = 1
+TELEMETRY_GROUPS = ('time', 'states', 'inputs', 'outputs')
+
+# Units of the vehicle signals (looked up by name, with patterns for indexed signals)
+signal_units = {
+    'time': 's',
+    'x': 'm', 'y': 'm', 'z': 'm',
+    'u': 'm/s', 'v': 'm/s', 'w': 'm/s', 'airspeed': 'm/s',
+    'qw': '-', 'qx': '-', 'qy': '-', 'qz': '-', 'q0': '-', 'q1': '-', 'q2': '-', 'q3': '-',
+    'p': 'rad/s', 'q': 'rad/s', 'r': 'rad/s',
+    'psi': 'rad', 'theta': 'rad', 'phi': 'rad', 'alpha': 'rad', 'beta': 'rad',
+    'elevator': 'rad', 'ailerons': 'rad', 'throttle': '-',
+    'density': 'kg/m^3', 'mach': '-',
+}
+signal_unit_patterns = [
+    (r'^F[xyz](_|$)', 'N'),
+    (r'^M[xyz](_|$)', 'N*m'),
+    (r'^engine\[\d+\]$', '-'),
+]
+
+def units_of(name):
+    if name in signal_units:
+        return signal_units[name]
+    for pattern, unit in signal_unit_patterns:
+        if re.match(pattern, name):
+            return unit
+    return ''
+
+class TelemetryWriter:
+    """
+    Stream time, states, inputs and outputs to disk in fixed-size chunks.
+
+    Every signal is one column file of raw values appended at each flush, so memory stays bounded
+    by the chunk size and any signal can be memory-mapped on its own afterwards. The metadata
+    (signal names, units, dtype and the number of rows written) is rewritten at every flush, so
+    a run that stops early is still readable.
+
+    Inputs:
+    path: str
+        Telemetry directory
+    signals: dict
+        Signal names of each group: 'states', 'inputs', 'outputs' ('time' is always recorded)
+    units: dict, optional
+        Units by signal name, defaults to units_of
+    """
+    def __init__(self, path, signals, units=None, chunk_size=1024, dtype=np.float64):
+        self.path = path
+        self.signals = {'time': ['time'], **{group: list(signals.get(group, [])) for group in TELEMETRY_GROUPS[1:]}}
+        units = {} if units is None else units
+        self.units = {group: [units.get(name, units_of(name)) for name in names] for group, names in self.signals.items()}
+        self.dtype = np.dtype(dtype)
+        self.chunk_size = chunk_size
+        self.length = 0
+
+        self.buffers = {group: np.empty((chunk_size, len(names)), dtype=self.dtype) for group, names in self.signals.items()}
+        self.filled = 0
+        self.files = {}
+        for group, names in self.signals.items():
+            os.makedirs(os.path.join(path, group), exist_ok=True)
+            self.files[group] = [open(os.path.join(path, group, f'{i:04d}.bin'), 'wb') for i in range(len(names))]
+        self.write_metadata()
+
+    def append(self, t, states=(), inputs=(), outputs=()):
+        # Record one time point; the chunk is flushed to disk when it is full
+        row = self.filled
+        self.buffers['time'][row, 0] = t
+        self.buffers['states'][row] = states
+        self.buffers['inputs'][row] = inputs
+        self.buffers['outputs'][row] = outputs
+        self.filled += 1
+        if self.filled == self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        for group, columns in self.files.items():
+            buffer = self.buffers[group][:self.filled]
+            for i, f in enumerate(columns):
+                f.write(np.ascontiguousarray(buffer[:, i]).tobytes())
+                f.flush()
+        self.length += self.filled
+        self.filled = 0
+        self.write_metadata()
+
+    def write_metadata(self):
+        metadata = {
+            'version': TELEMETRY_VERSION,
+            'dtype': self.dtype.str,
+            'length': self.length,
+            'signals': self.signals,
+            'units': self.units,
+        }
+        tmp = os.path.join(self.path, 'metadata.json.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(metadata, f)
+        os.replace(tmp, os.path.join(self.path, 'metadata.json'))
+
+    def close(self):
+        self.flush()
+        for columns in self.files.values():
+            for f in columns:
+                f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class Telemetry:
+    """
+    Lazily read a telemetry directory written by TelemetryWriter.
+
+    Signals are memory-mapped on access: `telemetry['airspeed']` maps a single column file.
+    `time`, `outputs`/`output_labels` and `states`/`state_labels` mirror the attributes of a
+    simulation result, so plotting.signal and plot_mission accept a Telemetry too.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'metadata.json')) as f:
+            metadata = json.load(f)
+        if metadata['version'] != TELEMETRY_VERSION:
+            raise ValueError(f"Unsupported telemetry version {metadata['version']}")
+        self.dtype = np.dtype(metadata['dtype'])
+        self.length = metadata['length']
+        self.signals = metadata['signals']
+        self.units = {group: dict(zip(self.signals[group], units)) for group, units in metadata['units'].items()}
+
+    def column(self, group, name):
+        # Memory-mapped column of one signal
+        index = self.signals[group].index(name)
+        if self.length == 0:
+            return np.empty(0, dtype=self.dtype)
+        return np.memmap(os.path.join(self.path, group, f'{index:04d}.bin'), dtype=self.dtype, mode='r', shape=(self.length,))
+
+    def group(self, group):
+        # (n_signals, length) array of a whole group, read into memory
+        return np.array([self.column(group, name) for name in self.signals[group]]).reshape(-1, self.length)
+
+    def __getitem__(self, name):
+        # outputs take precedence over states and inputs of the same name
+        for group in ('outputs', 'states', 'inputs', 'time'):
+            if name in self.signals[group]:
+                return self.column(group, name)
+        raise KeyError(name)
+
+    def __len__(self):
+        return self.length
+
+    @property
+    def time(self):
+        return self.column('time', 'time')
+
+    @property
+    def states(self):
+        return self.group('states')
+
+    @property
+    def inputs(self):
+        return self.group('inputs')
+
+    @property
+    def outputs(self):
+        return self.group('outputs')
+
+    @property
+    def state_labels(self):
+        return self.signals['states']
+
+    @property
+    def input_labels(self):
+        return self.signals['inputs']
+
+    @property
+    def output_labels(self):
+        return self.signals['outputs']
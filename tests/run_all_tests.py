@@ -1,8 +1,24 @@
 import unittest
 
 # Import test modules
-from test_calcs import TestCalcAeroOutputs
-from test_utilities import TestInterpolator
+from test_calcs import TestCalcAeroOutputs, TestBatchCalcs, TestQuaternion, TestAtmosphere, TestPropulsion, TestAerodynamics
+from test_utilities import TestInterpolator, TestTableCache
+from test_vehicle import TestVehicle
+from test_fused import TestFused
+from test_trim import TestTrim
+from test_linearize import TestLinearize
+from test_integrators import TestIntegrators
+from test_telemetry import TestTelemetry
+from test_environment import TestEnvironment
+from test_mass import TestMass
+from test_ground import TestGround
+from test_profiling import TestProfiling
+from test_benchmarks import TestBenchmarks
+from test_surrogate import TestSurrogate
+from test_jacobian import TestJacobian
+from test_scheduler import TestScheduler
+from test_actuators import TestActuators
+from test_runner import TestRunner
 
 # Initialize a test suite
 loader = unittest.TestLoader()
@@ -10,7 +26,29 @@ suite = unittest.TestSuite()
 
 # Add tests to the suite
 suite.addTests(loader.loadTestsFromTestCase(TestCalcAeroOutputs))
+suite.addTests(loader.loadTestsFromTestCase(TestBatchCalcs))
+suite.addTests(loader.loadTestsFromTestCase(TestQuaternion))
+suite.addTests(loader.loadTestsFromTestCase(TestAtmosphere))
+suite.addTests(loader.loadTestsFromTestCase(TestPropulsion))
+suite.addTests(loader.loadTestsFromTestCase(TestAerodynamics))
 suite.addTests(loader.loadTestsFromTestCase(TestInterpolator))
+suite.addTests(loader.loadTestsFromTestCase(TestTableCache))
+suite.addTests(loader.loadTestsFromTestCase(TestVehicle))
+suite.addTests(loader.loadTestsFromTestCase(TestFused))
+suite.addTests(loader.loadTestsFromTestCase(TestTrim))
+suite.addTests(loader.loadTestsFromTestCase(TestLinearize))
+suite.addTests(loader.loadTestsFromTestCase(TestIntegrators))
+suite.addTests(loader.loadTestsFromTestCase(TestTelemetry))
+suite.addTests(loader.loadTestsFromTestCase(TestEnvironment))
+suite.addTests(loader.loadTestsFromTestCase(TestMass))
+suite.addTests(loader.loadTestsFromTestCase(TestGround))
+suite.addTests(loader.loadTestsFromTestCase(TestProfiling))
+suite.addTests(loader.loadTestsFromTestCase(TestBenchmarks))
+suite.addTests(loader.loadTestsFromTestCase(TestSurrogate))
+suite.addTests(loader.loadTestsFromTestCase(TestJacobian))
+suite.addTests(loader.loadTestsFromTestCase(TestScheduler))
+suite.addTests(loader.loadTestsFromTestCase(TestActuators))
+suite.addTests(loader.loadTestsFromTestCase(TestRunner))
 
 # Run the test suite
 runner = unittest.TextTestRunner(verbosity=2)
@@ -0,0 +1,127 @@
+import unittest
+import numpy as np
+
+from simulation.batch import batch_dispersions, batch_dynamics_outputs
+from simulation.integrators import simulate
+from simulation.jacobian import vehicle_sparsity
+from simulation.models.actuators import Actuator, actuator_dynamics, actuator_set, actuator_states, limit_function
+from simulation.models.vehicle import build_vehicle
+from simulation.runner import run_scenario
+from analysis.trim import solve_trim
+from benchmarks.suite import trimmed_point
+from tests.test_vehicle import vehicle_configuration
+
+def actuator_configuration():
+    # rate-limited elevator with backlash, ailerons without
+    config = vehicle_configuration()
+    config['actuators'] = [
+        Actuator('elevator', 40.0, 0.7, (-0.1, 0.1), 0.5, backlash=0.01),
+        Actuator('ailerons', 30.0, 0.6, (-0.3, 0.3), 2.0),
+    ]
+    return config
+
+def step_inputs(T):
+    # elevator step beyond its stop, back through the play, and an aileron step
+    U = np.zeros((3, len(T)))
+    U[0, (T >= 0.1) & (T < 0.5)] = 0.3
+    U[0, T >= 0.5] = -0.05
+    U[1, T >= 0.2] = 0.1
+    U[2] = 0.5
+    return U
+
+class TestActuators(unittest.TestCase):
+    def test_states_and_steady_state(self):
+        config = actuator_configuration()
+        vehicle = build_vehicle(config, fused=True)
+        self.assertEqual(vehicle.nstates, 13 + 1 + 5)
+        self.assertEqual(vehicle.state_labels[14:], ['actuator[elevator]', 'actuator[ailerons]', 'actuator_rate[elevator]',
+                                                     'actuator_rate[ailerons]', 'surface[elevator]'])
+        # steady states hold the clipped commands
+        x = actuator_states([0.2, -0.1], config)
+        self.assertTrue(np.allclose(x, [0.1, -0.1, 0, 0, 0.1]))
+        self.assertTrue(np.allclose(actuator_dynamics(x, np.array([0.2, -0.1]), actuator_set(config)), 0))
+        with self.assertRaises(ValueError):
+            Actuator('rudder', 40.0)
+
+    def test_trimmed_initial_states(self):
+        # the runner and the benchmarks start the actuators at the trimmed elevator, like the mission
+        config = vehicle_configuration()
+        config['actuators'] = [Actuator('elevator', 40.0, 0.7, (-0.5, 0.5), 0.5, backlash=0.01)]
+        vehicle = build_vehicle(config, fused=True)
+        trim_condition = solve_trim(vehicle, {'airspeed': 30, 'altitude': 0})
+        x, _ = trimmed_point(vehicle)
+        self.assertEqual(len(x), vehicle.nstates)
+        self.assertTrue(np.allclose(x[14:], actuator_states([trim_condition[2], 0.0], config)))
+        self.assertNotEqual(trim_condition[2], 0.0)
+        scenario = {'airspeed': 30, 'altitude': 0, 'elevator_offset': 0.01}
+        result = run_scenario(vehicle, scenario, trim_condition, np.array([0.0, 0.1]), np.random.default_rng(0))
+        self.assertTrue(np.allclose(result.states[14:, 0], actuator_states([trim_condition[2] + 0.01, 0.0], config)))
+
+    def test_actuators_in_every_vehicle_path(self):
+        config = actuator_configuration()
+        x = np.concatenate(([0, 0, -1000, 30, 0.5, 1, 1, 0, 0, 0, 0.02, -0.01, 0.03, 0.5], [0.08, -0.05, 0.7, -1.0, 0.074]))
+        u = np.array([0.05, 0.1, 0.5])
+        vehicle = build_vehicle(config)
+        vehicle_fused = build_vehicle(config, fused=True)
+        self.assertTrue(np.allclose(vehicle_fused.dynamics(0, x, u), vehicle.dynamics(0, x, u)))
+        self.assertTrue(np.allclose(vehicle_fused.output(0, x, u), vehicle.output(0, x, u)))
+        Xdot, Y = batch_dynamics_outputs(0, x[None], u[None], config, batch_dispersions(1, config))
+        self.assertTrue(np.allclose(Xdot[0], vehicle_fused.dynamics(0, x, u)))
+        self.assertTrue(np.allclose(Y[0], vehicle_fused.output(0, x, u)))
+
+        # the surfaces reach the aerodynamics as deflections, not as commands
+        deflected = vehicle_fused.dynamics(0, x, u)
+        x[14] = 0.0
+        self.assertFalse(np.allclose(vehicle_fused.dynamics(0, x, u)[3:6], deflected[3:6]))
+        self.assertTrue(np.all(vehicle_sparsity(config)[3:6, [14, 15, 18]]))
+        self.assertFalse(np.any(vehicle_sparsity(config)[3:6, [16, 17]]))
+
+    def test_limits_and_backlash(self):
+        config = actuator_configuration()
+        vehicle = build_vehicle(config, fused=True)
+        T = np.linspace(0, 1, 101)
+        x0 = np.concatenate(([0, 0, -1000, 30, 0, 0, 1, 0, 0, 0, 0, 0, 0, 0.5], actuator_states([0, 0], config)))
+        states = simulate(vehicle, T, x0, step_inputs(T), method='rk45', rtol=1e-8, atol=1e-10).states
+        elevator, surface = states[14], states[18]
+
+        # the elevator moves at its rate limit towards its stop, and its rate state does not wind up
+        # far beyond the limit meanwhile
+        slope = np.diff(elevator) / np.diff(T)
+        self.assertLessEqual(np.abs(slope).max(), 0.5 + 1e-9)
+        self.assertTrue(np.isclose(slope[12:26], 0.5).all())
+        self.assertLess(np.abs(states[16]).max(), 0.6)
+        self.assertTrue(np.isclose(elevator[50], 0.1, atol=1e-4))
+
+        # the surface is left on the edge of the play at the overshoot of the actuator (up to the
+        # lag of the surface state at the reversal), within the stops
+        deflection = np.clip(np.clip(surface, elevator - 0.005, elevator + 0.005), -0.1, 0.1)
+        self.assertGreater(elevator.max(), 0.1)
+        self.assertTrue(np.all(deflection[36:51] == deflection[36]))
+        self.assertTrue(np.isclose(deflection[36], elevator.max() - 0.005, atol=2e-5))
+        self.assertTrue(np.isclose(deflection[-1], elevator.min() + 0.005, atol=2e-5))
+        self.assertTrue(np.isclose(elevator[-1], -0.05, atol=1e-4))
+        self.assertTrue(np.isclose(states[15, -1], 0.1, atol=1e-4))
+
+    def test_limits_are_events(self):
+        # limit crossings are located: fewer rejected steps than stepping over them, same result
+        config = actuator_configuration()
+        vehicle = build_vehicle(config, fused=True)
+        T = np.linspace(0, 1, 101)
+        x0 = np.concatenate(([0, 0, -1000, 30, 0, 0, 1, 0, 0, 0, 0, 0, 0, 0.5], actuator_states([0, 0], config)))
+        U = step_inputs(T)
+        reference = simulate(vehicle, T, x0, U, method='rk45', rtol=1e-11, atol=1e-13).states
+        self.assertTrue(np.any(limit_function(config)(0, reference[:, 15]) > 0))
+
+        located, stepped = {}, {}
+        result = simulate(vehicle, T, x0, U, method='rk45', rtol=1e-8, atol=1e-10, stats=located).states
+        simulate(vehicle, T, x0, U, method='rk45', rtol=1e-8, atol=1e-10, contact=lambda t, x: np.zeros(0), stats=stepped)
+        self.assertGreater(located['events'], 0)
+        self.assertLess(located['rejected'], stepped['rejected'] / 2)
+        self.assertTrue(np.allclose(result, reference, rtol=0, atol=1e-6))
+
+        # the stiff solvers stop at the limits as well, without chattering on them
+        for method in ('radau', 'bdf'):
+            stats = {}
+            states = simulate(vehicle, T, x0, U, method=method, rtol=1e-8, atol=1e-10, stats=stats).states
+            self.assertGreater(stats['events'], 0)
+            self.assertTrue(np.allclose(states, reference, rtol=0, atol=1e-6))
@@ -0,0 +1,31 @@
+import unittest
+
+from benchmarks.suite import compare, result, run_benchmarks
+
+def results(**values):
+    # time benchmarks are named t_*, throughputs anything else
+    return {'results': {name: result(value, 's' if name.startswith('t_') else '1/s', not name.startswith('t_')) for name, value in values.items()}}
+
+class TestBenchmarks(unittest.TestCase):
+    def test_compare_directions(self):
+        baseline = results(t_mission=1.0, rhs=1000.0, t_removed=1.0)
+        comparison = compare(results(t_mission=1.2, rhs=800.0, t_new=1.0), baseline, threshold=0.1)
+        self.assertEqual(set(comparison), {'t_mission', 'rhs'})
+        self.assertAlmostEqual(comparison['t_mission']['slowdown'], 1.2)
+        self.assertAlmostEqual(comparison['rhs']['slowdown'], 1.25)
+        self.assertTrue(comparison['t_mission']['regressed'] and comparison['rhs']['regressed'])
+        # faster, or slower within the threshold, is not a regression
+        comparison = compare(results(t_mission=0.5, rhs=950.0), baseline, threshold=0.1)
+        self.assertFalse(any(row['regressed'] for row in comparison.values()))
+        # per-benchmark thresholds
+        comparison = compare(results(t_mission=1.2), baseline, threshold=0.1, thresholds={'t_mission': 0.3})
+        self.assertFalse(comparison['t_mission']['regressed'])
+
+    def test_run_interpolation(self):
+        run = run_benchmarks(['interpolation'], repeat=1)
+        self.assertEqual(set(run['results']), {'interpolate_single', 'interpolate_batch'})
+        self.assertTrue(all(row['value'] > 0 for row in run['results'].values()))
+        self.assertFalse(any(row['regressed'] for row in compare(run, run).values()))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,7 +2,14 @@ import unittest
 import numpy as np
 from scipy.spatial.transform import Rotation as R
 
+from simulation.models.aerodynamics import AerodynamicsMemo, calc_aerodynamics_batch, calc_aerodynamics_outputs, vectorized_aerodynamics
 from simulation.models.airdata import airdata
+from simulation.models.atmosphere import atmosphere, isa
+from simulation.models.engines import Thruster, ThrustMap
+from simulation.models.gravity import calc_gravity_outputs, gravity_body
+from simulation.models.propulsion import calc_propulsion_batch, calc_propulsion_dynamics, engine_states, propulsion_forces_moments
+from utilities.quaternion import quat_to_dcm, quat_to_euler_zyx
+from tests.test_vehicle import linear_aerodynamics_model, vehicle_configuration
 
 class TestCalcAeroOutputs(unittest.TestCase):
     def test_zero_velocity(self):
@@ -51,5 +58,218 @@ class TestCalcAeroOutputs(unittest.TestCase):
         self.assertAlmostEqual(alpha, -0.46787239, places=5)
         self.assertAlmostEqual(beta, -0.9034154, places=5)
 
+class TestBatchCalcs(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.V_body = rng.normal(20, 5, (10, 3))
+        self.V_wind_NED = rng.normal(0, 3, (10, 3))
+        self.quaternions = np.roll(R.random(10, random_state=1).as_quat(), 1, axis=1) # real part first
+
+    def test_airdata_batch_matches_scalar(self):
+        airspeed, alpha, beta, Va_body = airdata(self.V_body, self.V_wind_NED, self.quaternions)
+        for n in range(10):
+            expected = airdata(self.V_body[n], self.V_wind_NED[n], self.quaternions[n])
+            self.assertAlmostEqual(airspeed[n], expected[0])
+            self.assertAlmostEqual(alpha[n], expected[1])
+            self.assertAlmostEqual(beta[n], expected[2])
+            self.assertTrue(np.allclose(Va_body[n], expected[3]))
+
+    def test_airdata_batch_zero_velocity(self):
+        airspeed, alpha, beta, Va_body = airdata(np.zeros((2, 3)), np.zeros(3), self.quaternions[:2])
+        self.assertTrue(np.allclose(airspeed, 0))
+        self.assertTrue(np.allclose(beta, 0))
+
+    def test_gravity_batch_matches_scalar(self):
+        mass = np.linspace(900, 1100, 10)
+        gravity_force = gravity_body(quat_to_dcm(self.quaternions), mass)
+        for n in range(10):
+            expected = calc_gravity_outputs(0, None, self.quaternions[n], {'mass': mass[n]})
+            self.assertTrue(np.allclose(gravity_force[n], expected))
+
+    def test_simulate_batch_matches_single_vehicles(self):
+        # batched RK4 with mass, inertia and thrust dispersions equals one rk4 run per dispersed vehicle,
+        # whatever the chunk size
+        import copy
+        from simulation.batch import simulate_batch
+        from simulation.integrators import simulate
+        from simulation.models.vehicle import build_vehicle
+
+        config = vehicle_configuration()
+        T = np.linspace(0, 2, 21)
+        mass = config['mass'] * np.array([0.9, 1.0, 1.2])
+        inertia = config['inertia'] * np.array([0.8, 1.0, 1.1])[:, None, None]
+        thrust_scale = np.array([1.1, 0.9, 1.0])
+        X0 = np.tile(np.concatenate(([0, 0, -500, 30, 0, 1.5], [1, 0, 0, 0], [0, 0.02, 0], [0.6])), (3, 1))
+        X0[1, 10] = 0.05
+        U = np.array([[0.02, 0.0, 0.6], [0.0, 0.01, 0.7], [-0.03, 0.0, 0.5]])
+        dispersions = {'mass': mass, 'inertia': inertia, 'thrust_scale': thrust_scale}
+        time, states = simulate_batch(X0, T, U, config, dispersions, substeps=2, chunk_size=4)
+        self.assertEqual(states.shape, (len(T), 3, 14))
+        self.assertTrue(np.array_equal(states, simulate_batch(X0, T, U, config, dispersions, substeps=2, chunk_size=100)[1]))
+
+        for n in range(3):
+            thrusters = [copy.copy(thruster) for thruster in config['thrusters']]
+            for thruster in thrusters:
+                thruster.max_thrust *= thrust_scale[n]
+            vehicle = build_vehicle({**config, 'mass': mass[n], 'inertia': inertia[n], 'thrusters': thrusters}, fused=True)
+            expected = simulate(vehicle, T, X0[n], U[n], method='rk4', substeps=2).states
+            self.assertTrue(np.allclose(states[:, n].T, expected, rtol=1e-9, atol=1e-9))
+
+    def test_gravity_pitched(self):
+        pitch = np.radians(30)
+        quaternion = np.array([np.cos(pitch/2), 0, np.sin(pitch/2), 0])
+        gravity_force = calc_gravity_outputs(0, None, quaternion, {'mass': 999})
+        weight = 999 * 9.81
+        self.assertTrue(np.allclose(gravity_force, [-weight*np.sin(pitch), 0, weight*np.cos(pitch)]))
+
+class TestQuaternion(unittest.TestCase):
+    def setUp(self):
+        self.rotations = R.random(20, random_state=2)
+        self.quaternions = np.roll(self.rotations.as_quat(), 1, axis=1) # real part first
+
+    def test_dcm_matches_rotation(self):
+        self.assertTrue(np.allclose(quat_to_dcm(self.quaternions), self.rotations.as_matrix()))
+        self.assertTrue(np.allclose(quat_to_dcm(2*self.quaternions[0]), self.rotations[0].as_matrix()))
+
+    def test_euler_matches_rotation(self):
+        self.assertTrue(np.allclose(quat_to_euler_zyx(self.quaternions), self.rotations.as_euler('zyx')))
+
+class TestAtmosphere(unittest.TestCase):
+    def test_isa_reference_values(self):
+        density, pressure, temperature, speed_of_sound = isa(np.array([0, 11000, 20000]))
+        self.assertTrue(np.allclose(density, [1.225, 0.36392, 0.088035], rtol=1e-4))
+        self.assertTrue(np.allclose(pressure, [101325, 22632, 5474.9], rtol=1e-4))
+        self.assertTrue(np.allclose(temperature, [288.15, 216.65, 216.65]))
+        self.assertTrue(np.allclose(speed_of_sound[0], 340.294, rtol=1e-5))
+
+    def test_table_matches_formulas(self):
+        altitude = np.random.default_rng(0).uniform(-500, 31000, 1000)
+        self.assertTrue(np.allclose(atmosphere(altitude), isa(altitude), rtol=1e-5))
+        self.assertTrue(np.allclose(atmosphere(altitude[3]), [column[3] for column in atmosphere(altitude)]))
+        # clamped above the table
+        self.assertTrue(np.allclose(atmosphere(40000.0), atmosphere(32000.0)))
+
+class TestPropulsion(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(3)
+        rotations = R.random(12, random_state=3)
+        self.params = {'thrusters': [Thruster(f'rotor{i}', rng.uniform(-5, 5, 3), rotations[i], rng.uniform(0.05, 0.5), rng.uniform(100, 1000)) for i in range(12)]}
+        self.x = rng.uniform(0, 1, 12)
+        self.r_cg = np.array([0.3, -0.1, 0.2])
+
+    def test_mixing_matches_per_thruster_sum(self):
+        force, moment = np.zeros(3), np.zeros(3)
+        for state, thruster in zip(self.x, self.params['thrusters']):
+            thrust = thruster.max_thrust * state * thruster.thrust_direction
+            force += thrust
+            moment += np.cross(thruster.position - self.r_cg, thrust)
+        F, M = propulsion_forces_moments(self.x, [0.5], 30.0, 1.2, np.zeros(3), self.r_cg, self.params)
+        self.assertTrue(np.allclose(F, force))
+        self.assertTrue(np.allclose(M, moment))
+
+    def test_shared_throttle_and_batch(self):
+        # u = airspeed, density, p, q, r, throttle
+        xdot = calc_propulsion_dynamics(0, self.x, np.array([30.0, 1.2, 0, 0, 0, 0.5]), self.params)
+        time_constant = np.array([thruster.time_constant for thruster in self.params['thrusters']])
+        self.assertTrue(np.allclose(xdot, (0.5 - self.x) / time_constant))
+
+        X = np.vstack((self.x, self.x[::-1]))
+        r_cg = np.vstack((self.r_cg, np.zeros(3)))
+        Xdot, F, M = calc_propulsion_batch(X, np.full((2, 1), 0.5), np.full(2, 30.0), np.full(2, 1.2), np.zeros((2, 3)), self.params, np.array([1.0, 2.0]), r_cg)
+        self.assertTrue(np.allclose(Xdot[0], xdot))
+        for i, scale in enumerate([1.0, 2.0]):
+            F_i, M_i = propulsion_forces_moments(X[i], [0.5], 30.0, 1.2, np.zeros(3), r_cg[i], self.params)
+            self.assertTrue(np.allclose(F[i], scale * F_i))
+            self.assertTrue(np.allclose(M[i], scale * M_i))
+
+    def test_thrust_map(self):
+        # thrust and torque trilinear in the grid variables, so the interpolation is exact
+        engine, airspeed, density = np.linspace(0, 1, 5), np.array([0, 20, 60]), np.array([0.4, 1.3])
+        E, V, rho = np.meshgrid(engine, airspeed, density, indexing='ij')
+        thrust_map = ThrustMap(engine, airspeed, density, 2000 * E * (1 - V / 100) * rho, 80 * E * rho)
+        params = {'thrusters': [Thruster('mapped', np.array([1.0, 2, 0]), R.identity(), 0.2, 0.0, thrust_map=thrust_map, spin=-1),
+                                Thruster('linear', np.array([-3.0, 0, 0]), R.from_euler('y', 90, degrees=True), 0.2, 500.0)]}
+        x = np.array([0.35, 0.6])
+        F, M = propulsion_forces_moments(x, [0.5], 33.0, 1.1, np.zeros(3), np.zeros(3), params)
+
+        thrust = 2000 * 0.35 * (1 - 0.33) * 1.1
+        direction = params['thrusters'][1].thrust_direction
+        self.assertTrue(np.allclose(F, [thrust, 0, 0] + 300 * direction))
+        # spin -1 about +x: the shaft torque reacts on the vehicle about +x
+        expected = np.cross([1.0, 2, 0], [thrust, 0, 0]) + np.cross([-3.0, 0, 0], 300 * direction) + [80 * 0.35 * 1.1, 0, 0]
+        self.assertTrue(np.allclose(M, expected))
+
+        # one batched lookup for many vehicles matches the single-vehicle evaluation
+        X = np.array([x, [0.9, 0.1], [1.2, 0.0]])
+        _, F_batch, M_batch = calc_propulsion_batch(X, np.full((3, 1), 0.5), np.array([33.0, 5.0, 70.0]), np.array([1.1, 0.5, 1.3]), np.zeros((3, 3)), params, np.ones(3), np.zeros(3))
+        for i, (V_i, rho_i) in enumerate([(33.0, 1.1), (5.0, 0.5), (70.0, 1.3)]):
+            F_i, M_i = propulsion_forces_moments(X[i], [0.5], V_i, rho_i, np.zeros(3), np.zeros(3), params)
+            self.assertTrue(np.allclose(F_batch[i], F_i))
+            self.assertTrue(np.allclose(M_batch[i], M_i))
+
+    def test_rotor_dynamics(self):
+        params = {'thrusters': [Thruster('rotor', np.zeros(3), R.identity(), 0.1, 100.0, rotor_inertia=0.5, max_speed=400.0)]}
+        speed = engine_states(0.5, params)
+        self.assertTrue(np.allclose(speed, [200.0]))
+        self.assertTrue(np.allclose(calc_propulsion_dynamics(0, speed, np.array([30.0, 1.2, 0, 0, 0, 0.5]), params), 0))
+
+        # steady rotor spinning about +x while pitching: gyroscopic moment -omega x h about +z
+        q = 0.3
+        _, M = propulsion_forces_moments(speed, [0.5], 30.0, 1.2, np.array([0, q, 0]), np.zeros(3), params)
+        self.assertTrue(np.allclose(M, [0, 0, q * 0.5 * 200.0]))
+
+        # spinning up reacts on the vehicle about -x
+        _, M = propulsion_forces_moments(speed, [1.0], 30.0, 1.2, np.zeros(3), np.zeros(3), params)
+        self.assertTrue(np.allclose(M, [-0.5 * (400.0 - 200.0) / 0.1, 0, 0]))
+
+@vectorized_aerodynamics
+def vectorized_linear_aerodynamics_model(airspeed, alpha, beta, p, q, r, surfaces, params):
+    F, M = zip(*[linear_aerodynamics_model(*args, {'elevator': e, 'ailerons': a}, {**params, 'density': d}) for *args, e, a, d in
+                 zip(airspeed, alpha, beta, p, q, r, surfaces['elevator'], surfaces['ailerons'], np.broadcast_to(params['density'], np.shape(airspeed)))])
+    return np.array(F), np.array(M)
+
+class TestAerodynamics(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(4)
+        self.params = {'S': 200.0}
+        self.airspeed, self.alpha, self.beta = rng.uniform(20, 40, 5), rng.uniform(-0.1, 0.2, 5), rng.uniform(-0.1, 0.1, 5)
+        self.omega, self.density, self.surfaces = rng.uniform(-0.1, 0.1, (5, 3)), rng.uniform(0.9, 1.2, 5), rng.uniform(-0.2, 0.2, (5, 2))
+
+    def evaluate(self, model):
+        params = {**self.params, 'aerodynamics_model': model}
+        batch = calc_aerodynamics_batch(self.airspeed, self.alpha, self.beta, self.omega, self.density, self.surfaces, params)
+        single = [calc_aerodynamics_outputs(0, None, np.concatenate(([self.airspeed[i], self.alpha[i], self.beta[i]], self.omega[i], [self.density[i]], self.surfaces[i])), params)
+                  for i in range(5)]
+        return batch, single
+
+    def test_scalar_and_vectorized_models_agree(self):
+        (F, M), single = self.evaluate(linear_aerodynamics_model)
+        (F_vectorized, M_vectorized), single_vectorized = self.evaluate(vectorized_linear_aerodynamics_model)
+        self.assertTrue(np.allclose(F, F_vectorized) and np.allclose(M, M_vectorized))
+        self.assertTrue(np.allclose([f for f, _ in single], F) and np.allclose([m for _, m in single_vectorized], M))
+
+    def test_memo(self):
+        memo = AerodynamicsMemo(linear_aerodynamics_model, maxsize=8)
+        (F, M), _ = self.evaluate(linear_aerodynamics_model)
+        (F_memo, M_memo), _ = self.evaluate(memo)
+        self.assertTrue(np.allclose(F, F_memo) and np.allclose(M, M_memo))
+        # the single evaluations repeat the batch points
+        self.assertEqual((memo.hits, memo.misses), (5, 5))
+
+        # least recently used entries are dropped beyond maxsize
+        small = AerodynamicsMemo(linear_aerodynamics_model, maxsize=3)
+        self.evaluate(small)
+        self.assertEqual(len(memo.entries), 5)
+        self.assertEqual(len(small.entries), 3)
+
+        # a coarse quantum merges nearby points
+        coarse = AerodynamicsMemo(linear_aerodynamics_model, quantum=1e-3)
+        params = {**self.params, 'aerodynamics_model': coarse}
+        inputs = np.concatenate(([30.0, 0.05, 0.0, 0, 0, 0, 1.2], [0.0, 0.0]))
+        first = calc_aerodynamics_outputs(0, None, inputs, params)
+        second = calc_aerodynamics_outputs(0, None, inputs + 1e-5, params)
+        self.assertTrue(np.array_equal(first[0], second[0]))
+        self.assertEqual(coarse.hits, 1)
+
 if __name__ == '__main__':
     unittest.main(verbosity=2)
@@ -0,0 +1,60 @@
+import unittest
+import numpy as np
+
+from simulation.models.environment import Environment, Turbulence, discrete_gust
+from simulation.models.vehicle import build_vehicle
+from simulation.batch import batch_dynamics, batch_dispersions
+from tests.test_vehicle import vehicle_configuration
+
+class TestEnvironment(unittest.TestCase):
+    def setUp(self):
+        self.x = np.concatenate(([1, 2, -3, 30, 1, 2], [0.9, 0.1, 0.2, 0.05], [0.01, -0.02, 0.03, 0.4]))
+        self.u = np.array([0.05, -0.02, 0.6])
+
+    def test_discrete_gust(self):
+        gust = discrete_gust(np.array([0, 0.5, 1.0, 1.5, 3]), [0, 0, 2], 0.5, 1)
+        self.assertTrue(np.allclose(gust[:, 2], [0, 0, 2, 0, 0]))
+        self.assertTrue(np.allclose(gust[:, :2], 0))
+
+    def test_turbulence_intensity(self):
+        intensity = np.array([1.5, 1.5, 1.0])
+        for model in ('dryden', 'von_karman'):
+            turbulence = Turbulence(2000, 0.05, 30, intensity, model=model, n_series=8, seed=1)
+            self.assertEqual(turbulence.series.shape, (8, 40001, 3))
+            self.assertTrue(np.allclose(turbulence.series.std(axis=(0, 1)), intensity, rtol=0.1), model)
+
+    def test_turbulence_is_seeded_and_interpolated(self):
+        a = Turbulence(10, 0.1, 30, 1.0, seed=2)
+        b = Turbulence(10, 0.1, 30, 1.0, seed=2)
+        self.assertTrue(np.array_equal(a.series, b.series))
+        self.assertTrue(np.allclose(a.sample(0.25), 0.5 * (a.series[2] + a.series[3])))
+        self.assertTrue(np.allclose(a.sample(100), a.series[-1]))
+
+    def test_wind_in_every_vehicle_path(self):
+        config = vehicle_configuration()
+        config['environment'] = Environment([2, 1, 0], [{'amplitude': [0, 0, 3], 'start': 0.5, 'duration': 1}],
+                                            Turbulence(10, 0.05, 30, 1.0, seed=3))
+        vehicle = build_vehicle(config)
+        vehicle_fused = build_vehicle(config, fused=True)
+        still_air = build_vehicle(vehicle_configuration(), fused=True)
+        dispersed = batch_dispersions(1, config)
+        for t in (0.2, 1.0, 3.7):
+            xdot = vehicle_fused.dynamics(t, self.x, self.u)
+            self.assertTrue(np.allclose(vehicle.dynamics(t, self.x, self.u), xdot))
+            self.assertTrue(np.allclose(vehicle.output(t, self.x, self.u), vehicle_fused.output(t, self.x, self.u)))
+            self.assertTrue(np.allclose(batch_dynamics(t, self.x[None], self.u[None], config, dispersed)[0], xdot))
+            self.assertFalse(np.allclose(still_air.dynamics(t, self.x, self.u), xdot))
+
+    def test_turbulence_per_batch_vehicle(self):
+        config = vehicle_configuration()
+        config['environment'] = Environment(turbulence=Turbulence(10, 0.05, 30, 1.0, n_series=4, seed=4))
+        X = np.tile(self.x, (4, 1))
+        Xdot = batch_dynamics(1.0, X, np.tile(self.u, (4, 1)), config, batch_dispersions(4, config))
+        self.assertEqual(len(np.unique(Xdot[:, 3])), 4)
+        # a single vehicle cannot take several sequences
+        for fused in (False, True):
+            with self.assertRaises(ValueError):
+                build_vehicle(config, fused=fused)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+import unittest
+import numpy as np
+
+from simulation import configuration
+from simulation.integrators import simulate
+from simulation.models.vehicle import build_vehicle
+from tests.test_vehicle import vehicle_configuration
+
+def random_states(n, seed=0):
+    # non-trivial states: attitude, body rates, sideslip, climb and engine states away from zero
+    rng = np.random.default_rng(seed)
+    quaternions = rng.normal(size=(n, 4))
+    quaternions /= np.linalg.norm(quaternions, axis=1, keepdims=True)
+    velocity = np.column_stack((rng.uniform(20, 40, n), rng.normal(0, 2, n), rng.normal(0, 3, n)))
+    return np.column_stack((rng.normal(0, 100, (n, 2)), rng.uniform(-1500, -10, n), velocity, quaternions,
+                            rng.normal(0, 0.1, (n, 3)), rng.uniform(0, 1, n)))
+
+class TestFused(unittest.TestCase):
+    def test_fused_matches_interconnect(self):
+        # the fused right-hand side and outputs equal the interconnect's, for the mission's default
+        # configuration and the test vehicle
+        rng = np.random.default_rng(1)
+        for config in (configuration.parameters, vehicle_configuration()):
+            vehicle = build_vehicle(config)
+            vehicle_fused = build_vehicle(config, fused=True)
+            self.assertEqual(vehicle_fused.nstates, vehicle.nstates)
+            self.assertEqual(vehicle_fused.output_labels, vehicle.output_labels)
+            for x in random_states(5):
+                u = np.array([rng.uniform(-0.1, 0.1), rng.uniform(-0.1, 0.1), rng.uniform(0.2, 1.0)])
+                self.assertTrue(np.allclose(vehicle_fused.dynamics(0, x, u), vehicle.dynamics(0, x, u), rtol=1e-10, atol=1e-10))
+                self.assertTrue(np.allclose(vehicle_fused.output(0, x, u), vehicle.output(0, x, u), rtol=1e-10, atol=1e-10))
+
+    def test_fused_trajectory(self):
+        # a short flight of the default configuration is the same with either vehicle
+        T = np.linspace(0, 1, 11)
+        x0 = random_states(1, seed=2)[0]
+        U = np.array([0.02, -0.01, 0.7])
+        states = simulate(build_vehicle(configuration.parameters), T, x0, U, method='rk4', substeps=4).states
+        states_fused = simulate(build_vehicle(configuration.parameters, fused=True), T, x0, U, method='rk4', substeps=4).states
+        self.assertTrue(np.allclose(states_fused, states, rtol=1e-9, atol=1e-9))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import unittest
+import numpy as np
+
+from simulation.batch import batch_dispersions, batch_dynamics_outputs
+from simulation.integrators import simulate
+from simulation.models.ground import GearLeg, contact_function, ground_forces_moments
+from simulation.models.vehicle import build_vehicle
+from tests.test_vehicle import vehicle_configuration
+
+def no_aerodynamics_model(airspeed, alpha, beta, p, q, r, surfaces, params):
+    return np.zeros(3), np.zeros(3)
+
+def gear_configuration(aerodynamics=True):
+    # tricycle gear around the c.g. (x = -48.8), legs 2 m below the datum
+    config = vehicle_configuration()
+    config['landing_gear'] = [
+        GearLeg('nose', np.array([-40.8, 0, 2.0]), 4e5, 4e4),
+        GearLeg('left', np.array([-52.8, -3, 2.0]), 4e5, 4e4),
+        GearLeg('right', np.array([-52.8, 3, 2.0]), 4e5, 4e4),
+    ]
+    if not aerodynamics:
+        config['aerodynamics_model'] = no_aerodynamics_model
+    return config
+
+def level_state(z, velocity=(0, 0, 0)):
+    return np.concatenate(([0, 0, z], velocity, [1, 0, 0, 0], [0, 0, 0], [0]))
+
+class TestGround(unittest.TestCase):
+    def test_no_force_above_ground(self):
+        config = gear_configuration()
+        F, M = ground_forces_moments(level_state(-3.0), np.eye(3), config['r_cg'], config)
+        self.assertTrue(np.allclose(F, 0) and np.allclose(M, 0))
+        self.assertTrue(np.all(contact_function(config)(0, level_state(-3.0)) < 0))
+
+    def test_spring_and_friction(self):
+        config = gear_configuration()
+        # every leg compressed by 0.1 m and sliding forward at 5 m/s
+        F, M = ground_forces_moments(level_state(-1.9, (5, 0, 0)), np.eye(3), config['r_cg'], config)
+        normal = 3 * 4e5 * 0.1
+        self.assertTrue(np.isclose(F[2], -normal))
+        self.assertTrue(np.isclose(F[0], -0.02 * normal * 5 / np.sqrt(25 + 0.1**2)))
+        self.assertTrue(np.isclose(F[1], 0))
+        # the normal forces balance about the c.g.; friction 2 m below it pitches the nose down
+        self.assertTrue(np.allclose(M, [0, 2 * F[0], 0]))
+
+    def test_ground_in_every_vehicle_path(self):
+        config = gear_configuration()
+        x = level_state(-1.95, (10, 0.5, 0.2))
+        x[10:13] = [0.02, -0.01, 0.03]
+        u = np.array([0.0, 0.0, 0.3])
+        vehicle = build_vehicle(config)
+        vehicle_fused = build_vehicle(config, fused=True)
+        self.assertTrue(np.allclose(vehicle_fused.dynamics(0, x, u), vehicle.dynamics(0, x, u)))
+        self.assertTrue(np.allclose(vehicle_fused.output(0, x, u), vehicle.output(0, x, u)))
+        Xdot, Y = batch_dynamics_outputs(0, x[None], u[None], config, batch_dispersions(1, config))
+        self.assertTrue(np.allclose(Xdot[0], vehicle_fused.dynamics(0, x, u)))
+        self.assertTrue(np.allclose(Y[0], vehicle_fused.output(0, x, u)))
+        self.assertLess(vehicle_fused.output(0, x, u)[vehicle_fused.output_labels.index('Fz_ground')], 0)
+
+    def test_drop_settles_on_gear(self):
+        # free fall of 0.5 m onto the gear, then damped oscillation to the static compression
+        from scipy.integrate import solve_ivp
+        config = gear_configuration(aerodynamics=False)
+        vehicle = build_vehicle(config, fused=True)
+        T = np.linspace(0, 4, 17)
+        U = np.zeros(3)
+        result = simulate(vehicle, T, level_state(-2.5), U, method='rk45', rtol=1e-8, atol=1e-10, contact_max_step=0.01)
+
+        self.assertLess(T[1], np.sqrt(2 * 0.5 / 9.81)) # airborne before touchdown
+        self.assertTrue(np.isclose(result.states[2, 1], -2.5 + 0.5 * 9.81 * T[1]**2))
+        static = config['mass'] * 9.81 / (3 * 4e5)
+        self.assertTrue(np.isclose(result.states[2, -1], -2.0 + static, atol=1e-6))
+
+        # touchdown is located exactly: matches a reference restarted at the touchdown found by solve_ivp
+        contact = contact_function(config)
+        touchdown = lambda t, x: contact(t, x).max()
+        touchdown.terminal = True
+        f = lambda t, x: vehicle.dynamics(t, x, U)
+        airborne = solve_ivp(f, (0, 1), level_state(-2.5), method='DOP853', events=touchdown, rtol=1e-10, atol=1e-12)
+        landed = solve_ivp(f, (airborne.t[-1], 1), airborne.y[:, -1], method='DOP853', t_eval=T[2:5], rtol=1e-10, atol=1e-12)
+        self.assertTrue(np.allclose(result.states[:6, 2:5], landed.y[:6], atol=2e-6))
+
+if __name__ == '__main__':
+    unittest.main()
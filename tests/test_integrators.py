@@ -0,0 +1,80 @@
+import unittest
+import numpy as np
+
+from simulation.integrators import simulate, hold_segments
+from simulation.mission import run_mission
+from simulation.models.fused import fused_output_function
+from simulation.models.vehicle import build_vehicle, vehicle_outputs
+from tests.test_vehicle import linear_aerodynamics_model, vehicle_configuration
+
+def first_order_system():
+    import control as ct
+
+    # xdot = -x + u, y = [x, 2x]
+    return ct.nlsys(lambda t, x, u, params: -x + u, lambda t, x, u, params: np.concatenate((x, 2 * x)),
+                    states=['x'], inputs=['u'], outputs=['y', 'y2'], name='first_order')
+
+class TestIntegrators(unittest.TestCase):
+    def test_zero_order_hold(self):
+        system = first_order_system()
+        T = np.linspace(0, 2, 41)
+        U = np.where(T < 1, 1.0, 0.0)[None, :]
+        expected = np.where(T <= 1, 1 - np.exp(-T), (1 - np.exp(-1)) * np.exp(-(T - 1)))
+        for method in ('rk4', 'rk45'):
+            result = simulate(system, T, [0.0], U, method=method)
+            self.assertTrue(np.allclose(result.states[0], expected, atol=1e-6), method)
+            self.assertTrue(np.allclose(result.outputs[1], 2 * expected, atol=1e-6), method)
+
+    def test_selected_outputs(self):
+        result = simulate(first_order_system(), np.linspace(0, 1, 11), [1.0], 0.0, method='rk45', outputs=['y2'])
+        self.assertEqual(result.output_labels, ['y2'])
+        self.assertEqual(result.outputs.shape, (11,))
+
+    def test_decimation(self):
+        result = simulate(first_order_system(), np.linspace(0, 1, 11), [1.0], 0.0, decimation=5)
+        self.assertTrue(np.allclose(result.time, [0, 0.5, 1]))
+        self.assertTrue(np.allclose(result.states[0], np.exp(-result.time), atol=1e-6))
+
+    def test_fused_output_selection(self):
+        config = vehicle_configuration()
+        vehicle = build_vehicle(config, fused=True)
+        x = np.concatenate(([1, 2, -3, 30, 1, 2], [0.9, 0.1, 0.2, 0.05], [0.01, -0.02, 0.03, 0.4]))
+        u = np.array([0.05, -0.02, 0.6])
+        full = vehicle.output(0, x, u)
+        for outputs in (['x', 'y', 'z', 'airspeed'], ['phi', 'Fz_grav'], ['My', 'qw', 'beta'], vehicle_outputs[::-1]):
+            selected = fused_output_function(outputs)(0, x, u, config)
+            self.assertTrue(np.allclose(selected, full[[vehicle_outputs.index(name) for name in outputs]]), outputs)
+        with self.assertRaises(ValueError):
+            fused_output_function(['altitude'])
+
+        # a single force block evaluates that source alone
+        calls = []
+        def counted_model(*args):
+            calls.append(args)
+            return linear_aerodynamics_model(*args)
+        counted = {**config, 'aerodynamics_model': counted_model}
+        for outputs in (['Fx_grav'], ['Fz_prop', 'My_prop'], ['Fz_ground']):
+            selected = fused_output_function(outputs)(0, x, u, counted)
+            self.assertTrue(np.allclose(selected, full[[vehicle_outputs.index(name) for name in outputs]]), outputs)
+        self.assertEqual(len(calls), 0)
+        fused_output_function(['Mx_aero'])(0, x, u, counted)
+        fused_output_function(['Fz'])(0, x, u, counted)
+        self.assertEqual(len(calls), 2)
+
+    def test_hold_segments(self):
+        U = np.array([[0, 0, 1, 1, 1, 2]])
+        self.assertEqual(hold_segments(U), [(0, 2), (2, 5)])
+
+    def test_mission_matches_solve_ivp(self):
+        config = vehicle_configuration()
+        reference = run_mission(time=5, config=config)
+        for method in ('rk4', 'rk45'):
+            result = run_mission(time=5, config=config, method=method)
+            self.assertTrue(np.allclose(result.states, reference.states, rtol=1e-4, atol=1e-3), method)
+
+        result = run_mission(time=5, config=config, method='rk45', outputs=['x', 'z', 'airspeed'], decimation=10)
+        self.assertEqual(result.outputs.shape, (3, 6))
+        self.assertTrue(np.allclose(result.outputs[2], reference.outputs[reference.output_labels.index('airspeed'), ::10], rtol=1e-4))
+
+if __name__ == '__main__':
+    unittest.main()
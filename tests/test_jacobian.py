@@ -0,0 +1,86 @@
+import unittest
+import numpy as np
+
+from simulation.integrators import simulate
+from simulation.jacobian import JacobianProvider, color_columns, vehicle_sparsity
+from simulation.models.engines import Thruster, horizontal_engine
+from simulation.models.environment import Environment
+from simulation.models.vehicle import build_vehicle
+from tests.test_ground import gear_configuration, level_state
+
+def twin_engine_configuration(time_constant):
+    config = gear_configuration()
+    config['thrusters'] = [Thruster('left', np.array([-50.0, -1, 0.2]), horizontal_engine, time_constant, 15000.0),
+                           Thruster('right', np.array([-50.0, 1, 0.2]), horizontal_engine, 2 * time_constant, 15000.0)]
+    return config
+
+def dense_jacobian(f, x, step=1e-6):
+    # central differences of every column
+    return np.column_stack([(f(x + step * e) - f(x - step * e)) / (2 * step) for e in np.eye(len(x))])
+
+class TestJacobian(unittest.TestCase):
+    def test_coloring(self):
+        sparsity = vehicle_sparsity(twin_engine_configuration(0.5))
+        groups = color_columns(sparsity)
+        self.assertEqual(sorted(np.concatenate(groups)), list(range(2, 15))) # the horizontal position has no effect
+        for group in groups:
+            self.assertTrue(np.all(sparsity[:, group].sum(axis=1) <= 1))
+        # block-diagonal pattern: independent blocks share groups
+        block = np.kron(np.eye(4, dtype=bool), sparsity)
+        self.assertEqual(len(color_columns(block)), len(groups))
+
+    def test_matches_dense_jacobian(self):
+        # gear in contact, wind and two engines: every nonzero is inside the pattern
+        config = twin_engine_configuration(0.5)
+        config['environment'] = Environment(wind_NED=(3, -2, 0.5))
+        vehicle = build_vehicle(config, fused=True)
+        x = np.concatenate((level_state(-1.9, (10, 0.5, 0.2))[:13], [0.4, 0.6]))
+        x[10:13] = [0.02, -0.01, 0.03]
+        u = np.array([0.05, -0.02, 0.6])
+        f = lambda t, x: vehicle.dynamics(t, x, u)
+        provider = JacobianProvider(f, vehicle_sparsity(config))
+        J = provider(0.0, x)
+        reference = dense_jacobian(lambda x: f(0.0, x), x)
+        self.assertTrue(np.all(reference[~vehicle_sparsity(config)] == 0))
+        self.assertTrue(np.allclose(J, reference, rtol=1e-5, atol=1e-4 * np.abs(reference).max()))
+        self.assertEqual(provider.evaluations, len(color_columns(vehicle_sparsity(config))) + 1)
+
+        # handed out again once after a restart, recomputed after an invalidation
+        provider.restart()
+        self.assertIs(provider(0.0, x), J)
+        self.assertIsNot(provider(0.0, x), J)
+        provider.restart()
+        provider.invalidate()
+        self.assertEqual(provider.computed, 2)
+        provider(0.0, x)
+        self.assertEqual(provider.computed, 3)
+
+    def test_stiff_engines(self):
+        config = twin_engine_configuration(2e-4)
+        config['landing_gear'] = []
+        vehicle = build_vehicle(config, fused=True)
+        x0 = np.concatenate(([0, 0, -1000, 30, 0, 2], [1, 0, 0, 0], [0, 0, 0], [0.3, 0.3]))
+        T = np.linspace(0, 0.5, 11)
+        U = np.tile([[0.0], [0.0], [0.5]], len(T))
+        U[0] = 0.02 * np.sin(5 * T) # a new input every interval
+        reference_stats, stats = {}, {}
+        reference = simulate(vehicle, T, x0, U, method='rk45', rtol=1e-6, atol=1e-8, stats=reference_stats)
+        for method in ('radau', 'bdf'):
+            result = simulate(vehicle, T, x0, U, method=method, rtol=1e-6, atol=1e-8, stats=stats)
+            self.assertTrue(np.allclose(result.states, reference.states, rtol=1e-4, atol=1e-4))
+            self.assertLess(stats['evaluations'], reference_stats['evaluations'] / 3)
+            self.assertGreater(stats['jacobians_reused'], 0)
+
+    def test_contact_events(self):
+        # drop onto the gear: the implicit methods stop at touchdown and settle at the static compression
+        config = gear_configuration(aerodynamics=False)
+        vehicle = build_vehicle(config, fused=True)
+        T = np.linspace(0, 4, 17)
+        stats = {}
+        result = simulate(vehicle, T, level_state(-2.5), np.zeros(3), method='radau', rtol=1e-6, atol=1e-8, stats=stats)
+        reference = simulate(vehicle, T, level_state(-2.5), np.zeros(3), method='rk45', rtol=1e-8, atol=1e-10)
+        self.assertEqual(stats['events'], 1) # the three legs touch down together
+        self.assertTrue(np.allclose(result.states[:6], reference.states[:6], atol=1e-4))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+
+from simulation.models.vehicle import build_vehicle
+from analysis.linearize import linearize_batch, linearize_envelope, save_linear_models, load_linear_models
+from analysis.trim import TrimCache
+from tests.test_vehicle import vehicle_configuration
+
+class TestLinearize(unittest.TestCase):
+    def setUp(self):
+        self.config = vehicle_configuration()
+        self.vehicle = build_vehicle(self.config, fused=True)
+
+    def test_matches_control_linearize(self):
+        import control as ct
+
+        models = linearize_envelope([30], [0], self.config)
+        x_eq, u_eq = models['x_eq'][0], models['u_eq'][0]
+        expected = ct.linearize(self.vehicle, x_eq, u_eq)
+        # ct.linearize uses forward differences, so compare relative to the largest entry
+        for name, matrix in zip('ABCD', (expected.A, expected.B, expected.C, expected.D)):
+            self.assertTrue(np.allclose(models[name][0], matrix, rtol=1e-4, atol=1e-5 * np.abs(matrix).max()), name)
+
+    def test_stacked_points(self):
+        models = linearize_envelope([28, 32], [0, 100], self.config, cache=TrimCache())
+        n, m, p = self.vehicle.nstates, self.vehicle.ninputs, self.vehicle.noutputs
+        self.assertEqual(models['A'].shape, (4, n, n))
+        self.assertEqual(models['D'].shape, (4, p, m))
+        # each point of the stack is the linearization of that point alone
+        A, B, C, D = linearize_batch(models['x_eq'][3], models['u_eq'][3], self.config)
+        self.assertTrue(np.allclose(A[0], models['A'][3]))
+        self.assertTrue(np.allclose(D[0], models['D'][3]))
+
+    def test_save_round_trip(self):
+        models = linearize_envelope([30], [0], self.config)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'linear_models.npz')
+            save_linear_models(path, models)
+            loaded = load_linear_models(path)
+            # single precision only on request
+            save_linear_models(path, models, np.float32)
+            single = load_linear_models(path)
+        self.assertEqual(loaded['A'].dtype, np.float64)
+        for key in ('A', 'B', 'C', 'D'):
+            self.assertTrue(np.array_equal(loaded[key], models[key]))
+        self.assertEqual(single['A'].dtype, np.float32)
+        self.assertTrue(np.allclose(single['B'], models['B'], rtol=1e-6))
+        self.assertEqual(list(loaded['outputs']), list(models['outputs']))
+
+if __name__ == '__main__':
+    unittest.main()
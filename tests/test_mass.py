@@ -0,0 +1,85 @@
+import unittest
+import numpy as np
+import pandas as pd
+
+from simulation.models.mass import MassTable, mass_properties, fuel_rate
+from simulation.models.rigid_body import dynamics_rotation
+from simulation.models.vehicle import build_vehicle
+from simulation.batch import batch_dynamics, batch_dispersions
+from simulation.mission import run_mission
+from utilities.interpolation import Interpolator
+from tests.test_vehicle import vehicle_configuration
+
+def mass_table():
+    # fuel level (kg) -> mass, c.g. and inertia of a vehicle burning 2000 kg of fuel
+    fuel = np.array([0, 1000, 2000])
+    return MassTable(Interpolator(1, dataframe=pd.DataFrame({
+        'fuel': fuel,
+        'mass': 10800 + fuel,
+        'cg_x': -48.8 - 0.0005 * fuel, 'cg_y': 0.0, 'cg_z': 0.01 * np.ones(3),
+        'Ixx': 100000 + 10 * fuel, 'Iyy': 5000 + 0.3 * fuel, 'Izz': 15000 + 1.1 * fuel,
+        'Ixy': 0.0, 'Ixz': 200 + 0.1 * fuel, 'Iyz': 0.0,
+    })))
+
+class TestMass(unittest.TestCase):
+    def setUp(self):
+        self.config = {**vehicle_configuration(), 'mass_table': mass_table(), 'fuel_flow': 2.0}
+        self.x = np.concatenate(([1, 2, -3, 30, 1, 2], [0.9, 0.1, 0.2, 0.05], [0.01, -0.02, 0.03, 0.4], [1500]))
+        self.u = np.array([0.05, -0.02, 0.6])
+
+    def test_table_interpolates_inverse_inertia(self):
+        table = self.config['mass_table']
+        mass, r_cg, inertia, inertia_inv = table(np.array([0, 1000, 1500]))
+        self.assertTrue(np.allclose(mass, [10800, 11800, 12300]))
+        self.assertTrue(np.allclose(r_cg[:, 0], [-48.8, -49.3, -49.55]))
+        # exact at the table rows, close in between
+        self.assertTrue(np.allclose(inertia_inv[:2], np.linalg.inv(inertia[:2])))
+        self.assertTrue(np.allclose(inertia_inv[2], np.linalg.inv(inertia[2]), rtol=1e-3))
+        # clamped to the table
+        self.assertTrue(np.allclose(table(-10)[0], 10800))
+
+    def test_constant_mass_properties(self):
+        config = vehicle_configuration()
+        mass, r_cg, inertia, inertia_inv = mass_properties(None, config)
+        self.assertEqual(mass, config['mass'])
+        self.assertIs(mass_properties(None, config)[3], inertia_inv) # inverted once
+        self.assertTrue(np.allclose(inertia_inv @ inertia, np.eye(3)))
+
+    def test_rotation_dynamics(self):
+        config = {'mass': 1, 'r_cg': np.zeros(3), 'inertia': np.array([[10.0, 0, -2], [0, 20, 0], [-2, 0, 30]])}
+        omega, moment = np.array([0.3, -0.2, 0.5]), np.array([1.0, 2, 3])
+        J = config['inertia']
+        expected = np.linalg.solve(J, moment - np.cross(omega, J @ omega))
+        self.assertTrue(np.allclose(dynamics_rotation(0, omega, moment, config), expected))
+
+    def test_fuel_burn(self):
+        self.assertTrue(np.allclose(fuel_rate(np.array([1500, 0]), np.array([[0.5], [0.5]]), self.config), [-1, 0]))
+        # a mass table without fuel burn would freeze the mass properties
+        for fuel_flow in ({}, {'fuel_flow': 0.0}):
+            config = {**vehicle_configuration(), 'mass_table': self.config['mass_table'], **fuel_flow}
+            with self.assertRaises(ValueError):
+                build_vehicle(config, fused=True)
+            with self.assertRaises(ValueError):
+                batch_dispersions(1, config)
+
+    def test_fuel_state_in_every_vehicle_path(self):
+        vehicle = build_vehicle(self.config)
+        vehicle_fused = build_vehicle(self.config, fused=True)
+        self.assertEqual(vehicle_fused.state_labels[-1], 'fuel')
+        self.assertTrue(vehicle.state_labels[-1].endswith('fuel'))
+        self.assertEqual(vehicle_fused.nstates, vehicle.nstates)
+        xdot = vehicle_fused.dynamics(0, self.x, self.u)
+        self.assertTrue(np.isclose(xdot[-1], -2.0 * 0.6))
+        self.assertTrue(np.allclose(vehicle.dynamics(0, self.x, self.u), xdot))
+        self.assertTrue(np.allclose(vehicle.output(0, self.x, self.u), vehicle_fused.output(0, self.x, self.u)))
+        Xdot = batch_dynamics(0, self.x[None], self.u[None], self.config, batch_dispersions(1, self.config))
+        self.assertTrue(np.allclose(Xdot[0], xdot))
+
+    def test_mission_burns_fuel(self):
+        result = run_mission(initial_condition={'airspeed': 30, 'altitude': 0, 'fuel': 1500}, time=5, config=self.config, method='rk4')
+        fuel = result.states[-1]
+        throttle = result.inputs[-1, 0]
+        self.assertTrue(np.allclose(fuel, 1500 - 2.0 * throttle * result.time))
+
+if __name__ == '__main__':
+    unittest.main()
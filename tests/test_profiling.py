@@ -0,0 +1,77 @@
+import json
+import os
+import tempfile
+import unittest
+import numpy as np
+
+from simulation.integrators import simulate
+from simulation.mission import run_mission
+from simulation.models import fused
+from simulation.models.vehicle import build_vehicle
+from simulation.profiling import profile
+from tests.test_vehicle import vehicle_configuration
+
+def level_flight(vehicle):
+    x0 = np.zeros(vehicle.nstates)
+    x0[3] = 30
+    x0[6] = 1
+    return x0
+
+class TestProfiling(unittest.TestCase):
+    def test_interconnect_subsystems(self):
+        vehicle = build_vehicle(vehicle_configuration())
+        x0 = level_flight(vehicle)
+        with profile(vehicle) as profiler:
+            vehicle.dynamics(0, x0, [0, 0, 0.5])
+        functions = profiler.report()['functions']
+        self.assertEqual(functions['vehicle.update']['calls'], 1)
+        self.assertIn('aerodynamics.output', functions)
+        self.assertIn('rigid_body.update', functions)
+        # subsystem calls are nested under the vehicle evaluation
+        self.assertTrue(any(key.startswith('vehicle.update;') for key in profiler.stacks))
+        # the wrappers are removed after the block
+        self.assertNotIn('_rhs', vehicle.__dict__)
+        self.assertNotIn('_out', vehicle.syslist[0].__dict__)
+
+    def test_fused_components_and_solver(self):
+        vehicle = build_vehicle(vehicle_configuration(), fused=True)
+        other = build_vehicle(vehicle_configuration(), fused=True)
+        original = fused.calc_aerodynamics_outputs
+        T = np.linspace(0, 1, 11)
+        with profile(vehicle) as profiler:
+            # only the profiled vehicle is instrumented, not the fused module or other vehicles
+            self.assertIs(fused.calc_aerodynamics_outputs, original)
+            other.dynamics(0, level_flight(other), [0, 0, 0.5])
+            simulate(vehicle, T, level_flight(vehicle), [0, 0, 0.5], method='rk4', stats=profiler.solver)
+        report = profiler.report()
+        self.assertIs(vehicle.outfcn, fused.fused_outputs)
+        self.assertEqual(report['solver']['method'], 'rk4')
+        self.assertEqual(report['solver']['steps'], 10)
+        self.assertEqual(report['functions']['vehicle.update']['calls'], report['solver']['evaluations'])
+        # the fused models run in every dynamics evaluation and in the outputs at every time point
+        self.assertEqual(report['functions']['aerodynamics']['calls'], report['solver']['evaluations'] + len(T))
+        stats = report['functions']['vehicle.update']
+        self.assertTrue(stats['p50'] <= stats['p99'] <= stats['max'])
+
+    def test_solve_ivp_warns(self):
+        # the default solve_ivp path has no solver statistics to report
+        with tempfile.TemporaryDirectory() as tmp:
+            with self.assertWarns(UserWarning):
+                run_mission(time=0.2, config=vehicle_configuration(), profile=os.path.join(tmp, 'profile.json'))
+
+    def test_write_report(self):
+        vehicle = build_vehicle(vehicle_configuration(), fused=True)
+        with profile(vehicle) as profiler:
+            vehicle.dynamics(0, level_flight(vehicle), [0, 0, 0.5])
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'profile.json')
+            profiler.write(path)
+            with open(path) as f:
+                self.assertIn('vehicle.update', json.load(f)['functions'])
+            with open(os.path.join(tmp, 'profile.folded')) as f:
+                lines = f.read().splitlines()
+        self.assertTrue(all(line.rsplit(' ', 1)[1].isdigit() for line in lines))
+        self.assertIn('vehicle.update;aerodynamics', [line.rsplit(' ', 1)[0] for line in lines])
+
+if __name__ == '__main__':
+    unittest.main()
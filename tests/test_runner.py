@@ -0,0 +1,41 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+
+from simulation.runner import merge_shards, run_scenarios, scenario_grid, scenario_seed
+
+class TestRunner(unittest.TestCase):
+    def test_results_independent_of_workers(self):
+        scenarios = scenario_grid(airspeed=[28, 32], alpha_offset=[0.0, 0.01])
+        for scenario in scenarios:
+            scenario['state_noise'] = {'w': 0.1, 'q': 0.01}
+        with tempfile.TemporaryDirectory() as tmp:
+            # a shard left over from an earlier run in the same directory is not merged
+            np.savez(os.path.join(tmp, 'shard_0099.npz'), index=np.array([99]))
+            serial = run_scenarios(scenarios, os.path.join(tmp, 'serial'), time=1, seed=3, max_workers=1)
+            parallel = run_scenarios(scenarios, tmp, time=1, seed=3, max_workers=2)
+            self.assertTrue(os.path.exists(os.path.join(tmp, 'shard_0099.npz')))
+            self.assertTrue(os.path.exists(os.path.join(tmp, 'results.npz')))
+
+        self.assertTrue(np.array_equal(parallel['index'], np.arange(4)))
+        self.assertEqual(parallel['states'].shape[:2], (4, 14))
+        for key in ('index', 'time', 'states', 'outputs', 'inputs', 'trim'):
+            self.assertTrue(np.array_equal(serial[key], parallel[key]))
+
+        # the noise is drawn from the scenario's own seed (in state name order: q, then w)
+        for index in range(4):
+            draws = np.random.default_rng(scenario_seed(3, index)).standard_normal(2)
+            self.assertTrue(np.isclose(parallel['states'][index, 11, 0], 0.01 * draws[0]))
+        self.assertTrue(np.allclose(parallel['trim'][0], parallel['trim'][1]))
+        self.assertNotEqual(parallel['states'][0, 5, 0], parallel['states'][1, 5, 0])
+
+    def test_empty(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            with self.assertRaises(ValueError):
+                run_scenarios([], tmp)
+            with self.assertRaises(ValueError):
+                merge_shards([], tmp)
+
+if __name__ == '__main__':
+    unittest.main()
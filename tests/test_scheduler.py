@@ -0,0 +1,79 @@
+import unittest
+import numpy as np
+
+from simulation.integrators import simulate
+from simulation.models.vehicle import build_vehicle
+from simulation.scheduler import DiscreteTask, Scheduler, simulate_closed_loop
+from tests.test_vehicle import vehicle_configuration
+
+def cruise_state():
+    return np.concatenate(([0, 0, -1000, 30, 0, 2], [1, 0, 0, 0], [0, 0, 0], [0.5]))
+
+class TestScheduler(unittest.TestCase):
+    def setUp(self):
+        self.vehicle = build_vehicle(vehicle_configuration(), fused=True)
+
+    def test_tick_and_validation(self):
+        imu = DiscreteTask('imu', 1/400, lambda t, x, u, params: u, ['q'], ['q_sensed'])
+        guidance = DiscreteTask('guidance', 1/50, lambda t, x, u, params: u, ['q_sensed'], ['elevator'], offset=1/400)
+        scheduler = Scheduler([imu, guidance], self.vehicle, [0.1, 0, 0.5])
+        self.assertEqual(float(scheduler.tick), 1/400)
+        self.assertEqual(scheduler.periods, [1, 8])
+        self.assertEqual(scheduler.offsets, [0, 1])
+        self.assertEqual(scheduler.signals, ['elevator', 'ailerons', 'throttle', 'q_sensed'])
+        with self.assertRaises(ValueError):
+            Scheduler([imu, DiscreteTask('other', 1/100, lambda t, x, u, params: u, ['q'], ['q_sensed'])], self.vehicle)
+        with self.assertRaises(ValueError):
+            Scheduler([DiscreteTask('bad', 1/100, lambda t, x, u, params: u, ['no_such_signal'], ['x'])], self.vehicle)
+
+    def test_tasks_run_at_their_rates_only(self):
+        # tasks run at their ticks only, never inside the integrator stages, and hold their outputs
+        runs = {'imu': [], 'pitch': []}
+        def imu(t, x, u, params):
+            runs['imu'].append(t)
+            return u
+        def pitch(t, x, u, params):
+            runs['pitch'].append(t)
+            return [0.05 + 0.5 * u[0] + 0.1 * x[0]]
+        tasks = [DiscreteTask('imu', 1/400, imu, ['q', 'theta'], ['q_sensed', 'theta_sensed']),
+                 DiscreteTask('pitch', 1/50, pitch, ['q_sensed', 'theta_sensed'], ['elevator'],
+                              update=lambda t, x, u, params: x + (u[1] - 0.05) / 50, initial_state=[0.0])]
+        T = np.linspace(0, 0.5, 11)
+        stats = {}
+        result = simulate_closed_loop(self.vehicle, T, cruise_state(), tasks, U0=[0.05, 0, 0.5], method='rk45', stats=stats)
+        self.assertEqual(len(runs['imu']), 201)
+        self.assertEqual(len(runs['pitch']), 26)
+        self.assertTrue(np.allclose(np.array(runs['pitch']) * 50, np.round(np.array(runs['pitch']) * 50)))
+        self.assertEqual(stats['task_runs'], 227)
+        self.assertGreater(stats['evaluations'], stats['task_runs'])
+        # the recorded elevator is the command of the last controller run (T is on the 50 Hz grid)
+        q_sensed = result.outputs[result.output_labels.index('q_sensed')]
+        self.assertTrue(np.all(np.abs(result.inputs[0, 1:] - 0.05 - 0.5 * q_sensed[1:]) < 0.1 * 0.5))
+        self.assertEqual(result.output_labels[-2:], ['q_sensed', 'theta_sensed'])
+
+    def test_matches_open_loop_schedule(self):
+        # a task replaying an input schedule gives the open-loop response with the same zero-order hold
+        T = np.linspace(0, 1, 21)
+        elevator = 0.05 + 0.02 * np.sin(4 * T)
+        schedule = DiscreteTask('schedule', 0.05, lambda t, x, u, params: [np.interp(t, T, elevator)], [], ['elevator'])
+        U = np.vstack((elevator, np.zeros_like(T), np.full_like(T, 0.5)))
+        open_loop = simulate(self.vehicle, T, cruise_state(), U, method='rk4', substeps=2)
+        closed_loop = simulate_closed_loop(self.vehicle, T, cruise_state(), [schedule], U0=U[:, 0], method='rk4', substeps=2)
+        self.assertTrue(np.allclose(closed_loop.states, open_loop.states, rtol=1e-12, atol=1e-12))
+        self.assertTrue(np.allclose(closed_loop.inputs, U))
+
+    def test_discrete_system_task(self):
+        import control as ct
+        # discrete integrator of the pitch rate at 100 Hz, as a ct.nlsys
+        integrator = ct.nlsys(lambda t, x, u, params: x + 0.01 * u, lambda t, x, u, params: x, dt=0.01,
+                              inputs=['q'], outputs=['q_integral'], states=1, name='integrator')
+        T = np.linspace(0, 0.2, 21)
+        result = simulate_closed_loop(self.vehicle, T, cruise_state(), [DiscreteTask.from_system(integrator)], U0=[0.05, 0, 0.5],
+                                      outputs=['q'])
+        q, integral = result.outputs
+        # the output published at every run is the state before its update: the sum of the earlier samples
+        self.assertTrue(np.allclose(integral, 0.01 * np.concatenate(([0], np.cumsum(q[:-1])))))
+        self.assertNotEqual(integral[-1], 0)
+
+if __name__ == '__main__':
+    unittest.main()
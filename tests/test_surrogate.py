@@ -0,0 +1,75 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+
+from simulation.models.vehicle import build_vehicle
+from simulation.surrogate import (AerodynamicsSurrogate, accuracy_report, evaluate_model, fit_surrogate, sample_inputs,
+                                  sample_model, surrogate_parameters)
+from tests.test_vehicle import vehicle_configuration
+
+# small envelope around the test vehicle's flight condition
+envelope = {'airspeed': (25, 35), 'alpha': (-0.05, 0.2), 'beta': (-0.1, 0.1), 'p': (-0.2, 0.2), 'q': (-0.2, 0.2), 'r': (-0.2, 0.2),
+            'density': (1.1, 1.23), 'elevator': (-0.3, 0.3), 'ailerons': (-0.3, 0.3)}
+
+class TestSurrogate(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.config = vehicle_configuration()
+        cls.polynomial = fit_surrogate(envelope, degree=4, n_samples=1500, n_validation=300, params=cls.config, max_workers=1)
+
+    def test_process_pool_sampling(self):
+        inputs = sample_inputs(envelope, 50)
+        self.assertTrue(np.allclose(sample_model(inputs, self.config, max_workers=2, chunk_size=20), evaluate_model(self.config, inputs)))
+
+    def test_polynomial_accuracy(self):
+        report = accuracy_report(self.polynomial, self.config, regions={'alpha': 2}, n_samples=500, max_workers=1)
+        self.assertLess(report['overall']['force_relative_rms'], 1e-4)
+        self.assertLess(report['overall']['moment_relative_rms'], 1e-4)
+        self.assertEqual([row['range'] for row in report['regions']['alpha']], [(-0.05, 0.075), (0.075, 0.2)])
+        self.assertEqual(sum(row['samples'] for row in report['regions']['alpha']), 500)
+        self.assertTrue(np.all(self.polynomial.error_max >= self.polynomial.error_rms))
+        # no side force without sideslip, exactly
+        F, M = self.polynomial(np.array([30.0]), np.array([0.1]), np.array([0.0]), *np.zeros((3, 1)),
+                               {'elevator': np.array([0.1]), 'ailerons': np.array([0.0])}, {'density': 1.2})
+        self.assertEqual(F[0, 1], 0.0)
+
+    def test_table_saved_and_loaded(self):
+        grid = {'alpha': 9, 'beta': 3, 'p_hat': 2, 'q_hat': 2, 'r_hat': 2, 'elevator': 3, 'ailerons': 3, 'airspeed': 2}
+        table = fit_surrogate(envelope, kind='table', grid=grid, n_validation=200, params=self.config, max_workers=1)
+        inputs = sample_inputs(envelope, 100, seed=5)
+        reference = evaluate_model(self.config, inputs)
+        self.assertLess(np.abs(table.evaluate(inputs) - reference).max(), 0.01 * np.abs(reference).max())
+        with tempfile.TemporaryDirectory() as tmp:
+            for surrogate in (table, self.polynomial):
+                path = os.path.join(tmp, f'{surrogate.kind}.npz')
+                surrogate.save(path)
+                loaded = AerodynamicsSurrogate.load(path)
+                self.assertEqual(loaded.envelope, surrogate.envelope)
+                self.assertTrue(np.array_equal(loaded.evaluate(inputs), surrogate.evaluate(inputs)))
+                self.assertTrue(np.array_equal(loaded.error_max, surrogate.error_max))
+                self.assertEqual(loaded.fingerprint(), surrogate.fingerprint())
+
+    def test_trim_cache_keys(self):
+        # surrogates of a different fit (coefficients, degree or kind) never share trim solutions
+        from analysis.trim import TrimCache
+        other = AerodynamicsSurrogate('polynomial', envelope, self.polynomial.lower, self.polynomial.upper,
+                                      exponents=self.polynomial.exponents, coefficients=self.polynomial.coefficients * 1.01)
+        quadratic = fit_surrogate(envelope, degree=2, n_samples=300, n_validation=50, params=self.config, max_workers=1)
+        condition = {'airspeed': 30, 'altitude': 0}
+        keys = {TrimCache.key(condition, surrogate_parameters(surrogate, self.config)) for surrogate in (self.polynomial, other, quadratic)}
+        self.assertEqual(len(keys), 3)
+        same = AerodynamicsSurrogate('polynomial', envelope, self.polynomial.lower, self.polynomial.upper,
+                                     exponents=self.polynomial.exponents, coefficients=self.polynomial.coefficients.copy())
+        self.assertIn(TrimCache.key(condition, surrogate_parameters(same, self.config)), keys)
+
+    def test_vehicle_with_surrogate(self):
+        x = np.concatenate(([0, 0, -100, 30, 0.5, 2], [1, 0, 0, 0], [0.01, -0.02, 0.03], [0.4]))
+        u = np.array([0.05, -0.02, 0.6])
+        vehicle = build_vehicle(self.config, fused=True)
+        vehicle_surrogate = build_vehicle(surrogate_parameters(self.polynomial, self.config), fused=True)
+        self.assertIs(vehicle_surrogate.params['aerodynamics_model'], self.polynomial)
+        self.assertTrue(np.allclose(vehicle_surrogate.dynamics(0, x, u), vehicle.dynamics(0, x, u), rtol=1e-4, atol=1e-6))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+
+from simulation.telemetry import TelemetryWriter, Telemetry, units_of
+from simulation.mission import run_mission
+from tests.test_vehicle import vehicle_configuration
+
+class TestTelemetry(unittest.TestCase):
+    def test_chunked_round_trip(self):
+        signals = {'states': ['x', 'u'], 'inputs': ['throttle'], 'outputs': ['airspeed', 'Fx_aero', 'engine[0]']}
+        data = np.random.default_rng(0).standard_normal((10, 6))
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'run')
+            with TelemetryWriter(path, signals, chunk_size=4) as writer:
+                for k, row in enumerate(data):
+                    writer.append(0.1 * k, row[:2], row[2:3], row[3:])
+                    if k == 5:
+                        # two chunks are on disk before the run ends
+                        self.assertEqual(len(Telemetry(path)), 4)
+
+            telemetry = Telemetry(path)
+            self.assertEqual(len(telemetry), 10)
+            self.assertIsInstance(telemetry['airspeed'], np.memmap)
+            self.assertTrue(np.allclose(telemetry.time, 0.1 * np.arange(10)))
+            self.assertTrue(np.allclose(telemetry.states, data[:, :2].T))
+            self.assertTrue(np.allclose(telemetry['Fx_aero'], data[:, 4]))
+            self.assertEqual(telemetry.output_labels, signals['outputs'])
+            self.assertEqual(telemetry.units['outputs'], {'airspeed': 'm/s', 'Fx_aero': 'N', 'engine[0]': '-'})
+
+    def test_units(self):
+        self.assertEqual(units_of('Mz'), 'N*m')
+        self.assertEqual(units_of('theta'), 'rad')
+        self.assertEqual(units_of('unknown'), '')
+
+    def test_mission_telemetry(self):
+        config = vehicle_configuration()
+        reference = run_mission(time=2, config=config, method='rk4')
+        with tempfile.TemporaryDirectory() as tmp:
+            telemetry = run_mission(time=2, config=config, method='rk4', telemetry=os.path.join(tmp, 'mission'))
+            self.assertIsInstance(telemetry, Telemetry)
+            self.assertTrue(np.allclose(telemetry.outputs, reference.outputs))
+            self.assertTrue(np.allclose(telemetry.states, reference.states))
+
+if __name__ == '__main__':
+    unittest.main()
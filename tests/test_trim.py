@@ -0,0 +1,79 @@
+import os
+import tempfile
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from simulation.models.actuators import Actuator
+from simulation.models.environment import Environment
+from simulation.models.vehicle import build_vehicle
+from analysis.trim import solve_trim, trim_residuals, trim_sweep, TrimCache
+from tests.test_ground import gear_configuration
+from tests.test_vehicle import vehicle_configuration
+
+def put_trims(path, airspeeds):
+    # worker process writing its own entries to a shared cache file
+    cache = TrimCache(path)
+    for airspeed in airspeeds:
+        cache.put({'airspeed': airspeed, 'altitude': 0}, vehicle_configuration(), [airspeed, 0, 0])
+
+class TestTrim(unittest.TestCase):
+    def setUp(self):
+        self.vehicle = build_vehicle(vehicle_configuration(), fused=True)
+        self.initial_condition = {'airspeed': 30, 'altitude': 0}
+
+    def test_trim_residuals_vanish(self):
+        trim = solve_trim(self.vehicle, self.initial_condition)
+        self.assertTrue(np.allclose(trim_residuals(self.vehicle, self.initial_condition, trim), 0, atol=1e-8))
+
+    def test_cache_round_trip(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'trim_cache.json')
+            trim = solve_trim(self.vehicle, self.initial_condition, cache=TrimCache(path))
+            cache = TrimCache(path)
+            self.assertTrue(np.allclose(cache.get(self.initial_condition, self.vehicle.params), trim))
+            # a different mass configuration is a different key
+            self.assertIsNone(cache.get(self.initial_condition, {**self.vehicle.params, 'mass': 1000}))
+
+    def test_cache_key_covers_configuration(self):
+        # the airframe geometry, wind, actuators and landing gear change the trim, so they change the key
+        params = self.vehicle.params
+        variants = [
+            params,
+            {**params, 'S': 400.0},
+            {**params, 'b': 40.0},
+            {**params, 'b': 45.0},
+            {**params, 'mass': 13000},
+            {**params, 'environment': Environment(wind_NED=[5, 0, 0])},
+            {**params, 'actuators': [Actuator('elevator', 40.0, position_limits=(-0.1, 0.1))]},
+            {**params, 'actuators': [Actuator('elevator', 40.0, position_limits=(-0.2, 0.2))]},
+            gear_configuration(),
+            {**gear_configuration(), 'ground_altitude': 10.0},
+        ]
+        keys = {TrimCache.key(self.initial_condition, variant) for variant in variants}
+        self.assertEqual(len(keys), len(variants))
+        self.assertIn(TrimCache.key(self.initial_condition, {**params, 'environment': Environment()}), keys)
+        self.assertIn(TrimCache.key(self.initial_condition, {**params, 'S': 200}), keys)
+
+    def test_concurrent_puts(self):
+        # processes sharing a cache file keep every entry
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'trim_cache.json')
+            with ProcessPoolExecutor(max_workers=4) as executor:
+                futures = [executor.submit(put_trims, path, range(20 + k, 100, 4)) for k in range(4)]
+                for future in futures:
+                    future.result()
+            cache = TrimCache(path)
+            self.assertEqual(len(cache.solutions), 80)
+            self.assertTrue(np.allclose(cache.get({'airspeed': 57, 'altitude': 0}, vehicle_configuration()), [57, 0, 0]))
+
+    def test_sweep_matches_single_trims(self):
+        airspeeds = [28, 32]
+        trims = trim_sweep(self.vehicle, airspeeds, [0])
+        self.assertEqual(trims.shape, (1, 2, 3))
+        for j, airspeed in enumerate(airspeeds):
+            expected = solve_trim(self.vehicle, {'airspeed': airspeed, 'altitude': 0})
+            self.assertTrue(np.allclose(trims[0, j], expected, atol=1e-6))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,11 @@
+import os
+import tempfile
+import numpy as np
 import pandas as pd
 import unittest
 
 from utilities.interpolation import Interpolator
+from utilities.tables import table_cache_path
 
 class TestInterpolator(unittest.TestCase):
     def setUp(self):
@@ -21,29 +25,97 @@ class TestInterpolator(unittest.TestCase):
         input_value = (2, 2, 2)  # Known point
         expected_output = [22, 32]  # Corresponding outputs for y1 and y2
         result = self.interpolator.interpolate(input_value)
-        self.assertEqual(result, expected_output)
+        self.assertTrue(np.allclose(result, expected_output))
 
     def test_intermediate_point(self):
         # Test interpolation at an intermediate point
         input_value = (1.5, 1.5, 1.5)  # Intermediate point
         expected_output = [15.875, 25.875]  # Expected interpolated outputs for y1 and y2
         result = self.interpolator.interpolate(input_value)
-        self.assertEqual(result, expected_output)
+        self.assertTrue(np.allclose(result, expected_output))
 
     def test_interpolation_edge_case(self):
         # Test interpolation at the boundary of the data
         input_value = (1, 1, 1)  # Boundary point
         expected_output = [10, 20]  # Known outputs for y1 and y2
         result = self.interpolator.interpolate(input_value)
-        self.assertEqual(result, expected_output)
+        self.assertTrue(np.allclose(result, expected_output))
 
     def test_interpolation_out_of_bounds(self):
         # Test interpolation outside the grid range
         input_value = (4, 4, 4)  # Out of bounds
         with self.assertRaises(ValueError):
-            self.interpolator.interpolate(input_value)
+            self.interpolator.interpolate(input_value, clamp=False)
+
+    def test_interpolation_clamped(self):
+        # Points outside the grid are clamped to the boundary by default
+        result = self.interpolator.interpolate((4, 4, 0))
+        self.assertTrue(np.allclose(result, [20, 30]))
+
+    def test_batch_interpolation(self):
+        # A batch of points returns one row per point
+        input_values = np.array([(2, 2, 2), (1.5, 1.5, 1.5), (1, 1, 1)])
+        result = self.interpolator.interpolate(input_values)
+        self.assertEqual(result.shape, (3, 2))
+        self.assertTrue(np.allclose(result, [[22, 32], [15.875, 25.875], [10, 20]]))
+
+    def test_one_dimensional_batch(self):
+        # on a 1-D table an (M,) array is a batch of M points, a scalar or (M, 1) array as usual
+        table = Interpolator.from_grid([np.array([0.0, 1.0, 2.0])], np.array([[0.0, 10.0], [1.0, 20.0], [4.0, 40.0]]))
+        result = table.interpolate(np.array([0.5, 1.5, 2.0]))
+        self.assertEqual(result.shape, (3, 2))
+        self.assertTrue(np.allclose(result, [[0.5, 15], [2.5, 30], [4, 40]]))
+        self.assertTrue(np.allclose(table.interpolate(np.array([[0.5], [1.5]])), result[:2]))
+        self.assertEqual(table.interpolate(0.5).shape, (2,))
+        self.assertEqual(table.interpolate([0.5]).shape, (2,))
+
+    def test_from_grid_matches_table(self):
+        # The same table given as grid axes and an array of values
+        values = self.interpolator.dependent_vars.reshape(3, 2, 2, 2)
+        interpolator = Interpolator.from_grid(self.interpolator.grid_axes, values)
+        points = np.array([(2, 2, 2), (1.5, 1.5, 1.5), (2.7, 1.2, 1.9)])
+        self.assertTrue(np.allclose(interpolator.interpolate(points), self.interpolator.interpolate(points)))
 
     # TODO: write test over a plotted table data to verify visually
 
+class TestTableCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.data_file = os.path.join(self.tmp.name, 'table.csv')
+        # rows deliberately out of grid order
+        self.df = pd.DataFrame({
+            'x1': [2, 1, 2, 1],
+            'x2': [1, 1, 2, 2],
+            'y1': [3, 1, 4, 2],
+            'y2': [30, 10, 40, 20],
+        })
+        self.df.to_csv(self.data_file, index=False)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_cache_written_and_memory_mapped(self):
+        first = Interpolator(2, data_file=self.data_file)
+        self.assertTrue(os.path.isdir(table_cache_path(self.data_file, 2)))
+        second = Interpolator(2, data_file=self.data_file)
+        self.assertIsInstance(second.dependent_vars, np.memmap)
+        self.assertTrue(np.allclose(first.interpolate((1.5, 1.5)), [2.5, 25]))
+        self.assertTrue(np.allclose(second.interpolate((1.5, 1.5)), [2.5, 25]))
+        self.assertEqual(second.columns, ['x1', 'x2', 'y1', 'y2'])
+
+    def test_cache_invalidated_by_content(self):
+        Interpolator(2, data_file=self.data_file)
+        path = table_cache_path(self.data_file, 2)
+        self.df['y1'] = self.df['y1'] * 2
+        self.df.to_csv(self.data_file, index=False)
+        self.assertNotEqual(table_cache_path(self.data_file, 2), path)
+        self.assertTrue(np.allclose(Interpolator(2, data_file=self.data_file).interpolate((2, 2)), [8, 40]))
+
+    def test_matches_uncached(self):
+        cached = Interpolator(2, data_file=self.data_file)
+        uncached = Interpolator(2, data_file=self.data_file, cache=False)
+        points = np.array([(1, 1), (1.25, 1.75), (2, 2)])
+        self.assertTrue(np.allclose(cached.interpolate(points), uncached.interpolate(points)))
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,67 @@
+import os
+import subprocess
+import sys
+import unittest
+import numpy as np
+
+from simulation.models.vehicle import build_vehicle, vehicle_outputs, _vehicle_cache as vehicle_cache
+from simulation.models.engines import Thruster, horizontal_engine
+
+def linear_aerodynamics_model(airspeed, alpha, beta, p, q, r, surfaces, params):
+    # simple linear coefficients, enough to exercise every force and moment channel
+    qbar = 0.5 * params['density'] * airspeed**2
+    CL = 0.5 + 5.0 * alpha + 0.4 * surfaces['elevator']
+    CD = 0.03 + 0.05 * CL**2
+    F = qbar * params['S'] * np.array([-CD * np.cos(alpha) + CL * np.sin(alpha), -0.5 * beta, -CD * np.sin(alpha) - CL * np.cos(alpha)])
+    M = qbar * params['S'] * np.array([0.2 * surfaces['ailerons'] - 0.1 * p, 0.05 - 0.2 * alpha - 0.3 * surfaces['elevator'] - 0.5 * q, 0.1 * beta - 0.2 * r])
+    return F, M
+
+def vehicle_configuration():
+    return {
+        'S': 200.0,
+        'thrusters': [Thruster('pusher', np.array([-50.0, 0, 0.2]), horizontal_engine, 0.5, 30000.0)],
+        'aerodynamics_model': linear_aerodynamics_model,
+        'r_ref_propulsion': np.zeros(3),
+        'r_cg': np.array([-48.8, 0, 0]),
+        'mass': 12800,
+        'inertia': [[118800, 0, 0], [0, 5690, 0], [0, 0, 17200]],
+    }
+
+class TestVehicle(unittest.TestCase):
+    def setUp(self):
+        self.config = vehicle_configuration()
+        quaternion = np.array([1, 0.1, 0.2, 0.05]) / np.linalg.norm([1, 0.1, 0.2, 0.05])
+        self.x = np.concatenate(([1, 2, -3, 30, 1, 2], quaternion, [0.01, -0.02, 0.03, 0.4]))
+        self.u = np.array([0.05, -0.02, 0.6])
+
+    def test_build_vehicle_is_cached(self):
+        vehicle = build_vehicle(self.config)
+        self.assertIs(build_vehicle(self.config), vehicle)
+        self.assertIsNot(build_vehicle(self.config, fused=True), vehicle)
+        self.assertIsNot(build_vehicle(vehicle_configuration()), vehicle)
+        # a replaced entry rebuilds the vehicle, and the cache only keeps the most recently used
+        self.config['S'] = 400.0
+        self.assertIsNot(build_vehicle(self.config), vehicle)
+        self.assertEqual(build_vehicle(self.config).params['S'], 400.0)
+        for _ in range(20):
+            build_vehicle({**self.config})
+        self.assertLessEqual(len(vehicle_cache.entries), vehicle_cache.maxsize)
+
+    def test_fused_matches_interconnect(self):
+        vehicle = build_vehicle(self.config)
+        vehicle_fused = build_vehicle(self.config, fused=True)
+        self.assertEqual(vehicle_fused.output_labels, vehicle.output_labels)
+        self.assertEqual(vehicle_fused.noutputs, len(vehicle_outputs))
+        self.assertTrue(np.allclose(vehicle_fused.dynamics(0, self.x, self.u), vehicle.dynamics(0, self.x, self.u)))
+        self.assertTrue(np.allclose(vehicle_fused.output(0, self.x, self.u), vehicle.output(0, self.x, self.u)))
+
+    def test_import_has_no_side_effects(self):
+        # importing the vehicle and mission modules must not import python-control, pandas or matplotlib
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        code = ("import sys, simulation.models.vehicle, simulation.mission; "
+                "print(any(name in sys.modules for name in ('control', 'pandas', 'matplotlib')))")
+        output = subprocess.run([sys.executable, '-c', code], cwd=root, capture_output=True, text=True, check=True)
+        self.assertEqual(output.stdout.strip(), 'False')
+
+if __name__ == '__main__':
+    unittest.main()
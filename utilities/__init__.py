@@ -1 +1,3 @@
 from .interpolation import Interpolator
+
+from .tables import load_table
@@ -1,34 +1,94 @@
-import pandas as pd
-from scipy.interpolate import RegularGridInterpolator
+import itertools
+import numpy as np
+
+from .tables import load_table, table_from_dataframe
 
 
 class Interpolator:
-    def __init__(self, n_independent_vars, data_file=None, dataframe=None):
+    """
+    Multilinear interpolation of every dependent column of a regular grid table at once.
+
+    The first n_independent_vars columns of the table are the grid coordinates of a full regular
+    grid and the remaining columns are the dependent variables. CSV tables are loaded through the
+    binary table cache (see utilities.tables) unless cache=False.
+    """
+    def __init__(self, n_independent_vars, data_file=None, dataframe=None, cache=True):
+        self.n_independent_vars = n_independent_vars
         if data_file is not None:
-            self.df = pd.read_csv(data_file)
+            self.grid_axes, self.dependent_vars, self.columns = load_table(data_file, n_independent_vars, cache=cache)
         elif dataframe is not None:
-            self.df = dataframe
-        self.n_independent_vars = n_independent_vars
-        self.independent_vars = self.df.iloc[:, :self.n_independent_vars].values
-        self.dependent_vars = self.df.iloc[:, self.n_independent_vars:].values
-        self.grid_axes = [sorted(set(self.independent_vars[:, i])) for i in range(self.n_independent_vars)]
-        self.interpolators = [
-            RegularGridInterpolator(self.grid_axes, self.dependent_vars[:, i].reshape([len(ax) for ax in self.grid_axes]))
-            for i in range(self.dependent_vars.shape[1])
-        ]
-
-    def interpolate(self, *args, clamp=True):
-        if not isinstance(args, list):
-            args = [args]
-        
+            self.grid_axes, self.dependent_vars, self.columns = table_from_dataframe(dataframe, n_independent_vars)
+        self._build()
+
+    @classmethod
+    def from_grid(cls, grid_axes, values, columns=None):
+        """
+        Interpolator of values already laid out on a regular grid.
+
+        Inputs:
+        grid_axes: list of 1-D array-like
+            Increasing coordinates of each axis
+        values: np.array
+            (len(axis_0), ..., len(axis_n-1), n_dependent_vars) dependent variables at the grid points
+        """
+        interpolator = cls.__new__(cls)
+        interpolator.n_independent_vars = len(grid_axes)
+        interpolator.grid_axes = [np.asarray(axis, dtype=float) for axis in grid_axes]
+        values = np.asarray(values, dtype=float)
+        interpolator.dependent_vars = np.ascontiguousarray(values.reshape(-1, values.shape[-1]))
+        interpolator.columns = columns
+        interpolator._build()
+        return interpolator
+
+    def _build(self):
+        # Precompute the grid bounds and the flat-index offsets of the 2^n cell corners
+        shape = [len(axis) for axis in self.grid_axes]
+        self.lower_bounds = np.array([axis[0] for axis in self.grid_axes])
+        self.upper_bounds = np.array([axis[-1] for axis in self.grid_axes])
+
+        strides = np.cumprod([1] + shape[:0:-1])[::-1]
+        steps = np.where(np.array(shape) > 1, strides, 0) # a single-point axis has no upper neighbour
+        self._corners = np.array(list(itertools.product([0, 1], repeat=self.n_independent_vars)), dtype=bool)
+        self._corner_offsets = self._corners.astype(int) @ steps
+        self._strides = strides
+
+    def interpolate(self, points, clamp=True):
+        """
+        Interpolate all dependent variables.
+
+        Inputs:
+        points: (n_independent_vars,) or (M, n_independent_vars) array-like
+            A single query point or a batch of M points. For 1-D tables a scalar is a single point
+            and an (M,) array with M > 1 a batch
+        clamp: bool
+            Clamp the points to the grid boundaries; otherwise points outside the grid raise a ValueError
+
+        Returns:
+        np.array
+            (n_dependent_vars,) for a single point, (M, n_dependent_vars) for a batch
+        """
+        points = np.asarray(points, dtype=float)
+        single = points.ndim < 2 and not (self.n_independent_vars == 1 and points.size > 1)
+        points = points.reshape(1 if single else -1, self.n_independent_vars)
+
         if clamp:
-            # Clamp the input args to the grid boundaries
-            lookup_args = []
-            for i, arg in enumerate(args):
-                min_val = min(self.grid_axes[i])
-                max_val = max(self.grid_axes[i])
-                lookup_args.append(max(min(arg, max_val), min_val))
-        else:
-            lookup_args = args
-        
-        return [interp(lookup_args).item() for interp in self.interpolators]
\ No newline at end of file
+            points = np.clip(points, self.lower_bounds, self.upper_bounds)
+        elif np.any(points < self.lower_bounds) or np.any(points > self.upper_bounds):
+            raise ValueError("Interpolation point is outside the grid")
+
+        base = np.zeros(len(points), dtype=int)
+        weights = np.empty((len(points), self.n_independent_vars))
+        for i, axis in enumerate(self.grid_axes):
+            if len(axis) == 1:
+                weights[:, i] = 0
+                continue
+            index = np.clip(np.searchsorted(axis, points[:, i], side='right') - 1, 0, len(axis) - 2)
+            weights[:, i] = (points[:, i] - axis[index]) / (axis[index + 1] - axis[index])
+            base += index * self._strides[i]
+
+        # weight of each cell corner: product over axes of w (upper neighbour) or 1 - w (lower neighbour)
+        corner_weights = np.where(self._corners[None], weights[:, None, :], 1 - weights[:, None, :]).prod(axis=2)
+        corner_values = self.dependent_vars[base[:, None] + self._corner_offsets[None]]
+        result = np.einsum('mc,mcj->mj', corner_weights, corner_values)
+
+        return result[0] if single else result
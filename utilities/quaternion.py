@@ -0,0 +1,60 @@
+import numpy as np
+
+# Quaternions are scalar-first (w, x, y, z) and express a body-frame vector in the NED frame.
+# Every function accepts a single quaternion/vector or a batch stacked along the leading axes.
+
+def quat_normalize(quat):
+    quat = np.asarray(quat, dtype=float)
+    return quat / np.linalg.norm(quat, axis=-1, keepdims=True)
+
+def quat_to_dcm(quat):
+    """
+    Direction cosine matrix from body to NED: v_NED = dcm @ v_body
+
+    Inputs:
+    quat: (..., 4) np.array
+        Quaternion (real part first), need not be normalized (zero norm is not allowed)
+
+    Returns:
+    (..., 3, 3) np.array
+    """
+    quat = np.asarray(quat, dtype=float)
+    w, x, y, z = quat[..., 0], quat[..., 1], quat[..., 2], quat[..., 3]
+    s = 2 / (w*w + x*x + y*y + z*z) # normalizes the quaternion implicitly
+
+    dcm = np.empty(quat.shape[:-1] + (3, 3))
+    dcm[..., 0, 0] = 1 - s*(y*y + z*z)
+    dcm[..., 0, 1] = s*(x*y - w*z)
+    dcm[..., 0, 2] = s*(x*z + w*y)
+    dcm[..., 1, 0] = s*(x*y + w*z)
+    dcm[..., 1, 1] = 1 - s*(x*x + z*z)
+    dcm[..., 1, 2] = s*(y*z - w*x)
+    dcm[..., 2, 0] = s*(x*z - w*y)
+    dcm[..., 2, 1] = s*(y*z + w*x)
+    dcm[..., 2, 2] = 1 - s*(x*x + y*y)
+    return dcm
+
+def rotate_body_to_NED(dcm, vector):
+    # express a body-frame vector in the NED frame
+    return np.einsum('...ij,...j->...i', dcm, vector)
+
+def rotate_NED_to_body(dcm, vector):
+    # express an NED-frame vector in the body frame (transpose of the DCM)
+    return np.einsum('...ji,...j->...i', dcm, vector)
+
+def dcm_to_euler_zyx(dcm):
+    """
+    'zyx' Euler angles (psi, theta, phi) of a body-to-NED DCM, same convention as
+    scipy's Rotation.as_euler('zyx'): dcm = Rx(phi) @ Ry(theta) @ Rz(psi)
+
+    Returns:
+    (..., 3) np.array
+        psi, theta, phi
+    """
+    psi = np.arctan2(-dcm[..., 0, 1], dcm[..., 0, 0])
+    theta = np.arcsin(np.clip(dcm[..., 0, 2], -1, 1))
+    phi = np.arctan2(-dcm[..., 1, 2], dcm[..., 2, 2])
+    return np.stack((psi, theta, phi), axis=-1)
+
+def quat_to_euler_zyx(quat):
+    return dcm_to_euler_zyx(quat_to_dcm(quat))
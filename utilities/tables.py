@@ -0,0 +1,92 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+
+# Bump when the cache layout changes so stale caches are never read
+TABLE_CACHE_VERSION = 1
+TABLE_CACHE_DIR = '.table_cache'
+
+def table_from_dataframe(dataframe, n_independent_vars):
+    """
+    Split a gridded table into grid axes and a dependent-variable array.
+
+    The rows are sorted into grid order (last independent variable varying fastest) so the
+    dependent variables can be addressed by flat grid index.
+
+    Returns:
+    tuple
+        grid_axes (list of 1-D arrays), dependent_vars (n_grid_points x n_dependent), column names
+    """
+    independent_vars = dataframe.iloc[:, :n_independent_vars].values.astype(float)
+    dependent_vars = dataframe.iloc[:, n_independent_vars:].values.astype(float)
+    grid_axes = [np.unique(independent_vars[:, i]) for i in range(n_independent_vars)]
+
+    if len(dependent_vars) != np.prod([len(axis) for axis in grid_axes]):
+        raise ValueError("Table does not define a full regular grid")
+
+    order = np.lexsort(independent_vars.T[::-1])
+    return grid_axes, np.ascontiguousarray(dependent_vars[order]), list(dataframe.columns)
+
+def table_cache_path(data_file, n_independent_vars):
+    # Cache directory next to the CSV, keyed by the layout version and the CSV content hash
+    with open(data_file, 'rb') as f:
+        digest = hashlib.sha256(f.read()).hexdigest()[:16]
+    stem = os.path.splitext(os.path.basename(data_file))[0]
+    name = f'{stem}-v{TABLE_CACHE_VERSION}-n{n_independent_vars}-{digest}'
+    return os.path.join(os.path.dirname(os.path.abspath(data_file)), TABLE_CACHE_DIR, name)
+
+def write_table_cache(path, grid_axes, dependent_vars, columns):
+    # Written to a temporary directory and renamed, so concurrent readers never see a partial cache
+    parent = os.path.dirname(path)
+    os.makedirs(parent, exist_ok=True)
+    tmp = tempfile.mkdtemp(dir=parent)
+    try:
+        for i, axis in enumerate(grid_axes):
+            np.save(os.path.join(tmp, f'axis_{i}.npy'), axis)
+        np.save(os.path.join(tmp, 'values.npy'), dependent_vars)
+        with open(os.path.join(tmp, 'columns.json'), 'w') as f:
+            json.dump(columns, f)
+        os.rename(tmp, path)
+    except OSError:
+        # another process finished first (or the directory is read-only)
+        shutil.rmtree(tmp, ignore_errors=True)
+        if not os.path.isdir(path):
+            raise
+
+def read_table_cache(path, n_independent_vars):
+    # The dependent-variable array is memory-mapped so processes share its pages
+    grid_axes = [np.load(os.path.join(path, f'axis_{i}.npy')) for i in range(n_independent_vars)]
+    dependent_vars = np.load(os.path.join(path, 'values.npy'), mmap_mode='r')
+    with open(os.path.join(path, 'columns.json')) as f:
+        columns = json.load(f)
+    return grid_axes, dependent_vars, columns
+
+def load_table(data_file, n_independent_vars, cache=True):
+    """
+    Load a gridded CSV table, going through the binary cache when possible.
+
+    The first load parses the CSV with pandas and writes the cache; later loads (from any
+    process) memory-map the cached arrays without parsing. Editing the CSV changes its hash,
+    so a new cache is built automatically.
+
+    Returns:
+    tuple
+        grid_axes, dependent_vars, column names (see table_from_dataframe)
+    """
+    path = table_cache_path(data_file, n_independent_vars) if cache else None
+    if path is not None and os.path.isdir(path):
+        return read_table_cache(path, n_independent_vars)
+
+    import pandas as pd
+    grid_axes, dependent_vars, columns = table_from_dataframe(pd.read_csv(data_file), n_independent_vars)
+
+    if path is not None:
+        try:
+            write_table_cache(path, grid_axes, dependent_vars, columns)
+            return read_table_cache(path, n_independent_vars)
+        except OSError:
+            pass # read-only data directory: use the parsed table
+    return grid_axes, dependent_vars, columns